@@ -1,6 +1,24 @@
 import os
+import re
+import sys
+import json
+import argparse
 import pandas as pd
-from datetime import datetime, timedelta
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 記錄各檔案是否已含Average欄位的清單檔，避免每次都讀檔檢查
+MANIFEST_FILE = 'average_manifest.json'
+REQUIRED_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+TX_FILE_PATTERN = re.compile(r'^TX_(\d{8})_1K\.csv$')
+
+def average_series(close, volume):
+    """
+    以累積和計算每一分鐘的累積均價，回傳Series（不修改原資料）
+    """
+    cumulative_volume = volume.cumsum()
+    return (close * volume).cumsum() / cumulative_volume.where(cumulative_volume != 0)
 
 def calculate_average(df):
     """
@@ -9,70 +27,186 @@ def calculate_average(df):
     """
     # 計算Close*Volume的累積和
     df['Cumulative_Close_Volume'] = (df['Close'] * df['Volume']).cumsum()
-    
+
     # 計算Volume的累積和
     df['Cumulative_Volume'] = df['Volume'].cumsum()
-    
+
     # 計算均價
     df['Average'] = df['Cumulative_Close_Volume'] / df['Cumulative_Volume']
-    
+
     # 移除臨時列
     df.drop(['Cumulative_Close_Volume', 'Cumulative_Volume'], axis=1, inplace=True)
-    
+
     return df
 
-def process_files():
-    # 獲取當前目錄
-    current_dir = os.getcwd()
-    
-    # 設定日期範圍
-    end_date = datetime.now()
-    start_date = datetime(2025, 6, 1)
-    
-    # 生成所有可能的日期
-    date_list = []
-    current_date = start_date
-    while current_date <= end_date:
-        date_list.append(current_date.strftime('%Y%m%d'))
-        current_date += timedelta(days=1)
-    
-    # 處理每個日期的文件
-    for date_str in date_list:
-        filename = f"TX_{date_str}_1K.csv"
-        filepath = os.path.join(current_dir, filename)
-        
-        # 檢查文件是否存在
-        if not os.path.exists(filepath):
-            print(f"文件 {filename} 不存在，跳過...")
-            continue
-        
-        # 讀取CSV文件
-        try:
-            df = pd.read_csv(filepath)
-        except Exception as e:
-            print(f"讀取文件 {filename} 時發生錯誤: {e}")
-            continue
-        
-        # 檢查是否已有Average列
-        if 'Average' in df.columns:
-            print(f"文件 {filename} 已包含Average列，跳過...")
+def load_with_average(filepath, **read_csv_kwargs):
+    """
+    讀取K線檔案，若缺少Average欄位則於載入時即時計算（不改寫原始CSV）
+    """
+    df = pd.read_csv(filepath, **read_csv_kwargs)
+    if 'Average' not in df.columns and 'Close' in df.columns and 'Volume' in df.columns:
+        df['Average'] = average_series(df['Close'], df['Volume'])
+    return df
+
+def read_header(filepath):
+    """只讀取檔案第一行取得欄位名稱"""
+    with open(filepath, 'r', encoding='utf-8-sig') as f:
+        return f.readline().strip().split(',')
+
+def load_manifest(folder='.', filename=MANIFEST_FILE):
+    """讀取清單檔，不存在或損壞時回傳空清單"""
+    manifest_path = os.path.join(folder, filename)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"讀取清單檔 {manifest_path} 時發生錯誤: {e}，將重新建立")
+        return {}
+
+@contextmanager
+def atomic_path(path):
+    """
+    原子寫檔：提供同目錄的暫存檔路徑供寫入，區塊正常結束後以os.replace取代path，
+    中斷或發生錯誤時刪除暫存檔，path維持原狀
+    暫存檔名含程序編號（多個程序不互相覆寫）並保留副檔名（np.savez會自動補上.npz）
+    用法: with atomic_path(path) as tmp_path: np.savez(tmp_path, ...)
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp{os.path.splitext(path)[1]}"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def save_manifest(manifest, folder='.', filename=MANIFEST_FILE):
+    """以原子方式寫入清單檔"""
+    with atomic_path(os.path.join(folder, filename)) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def write_csv_atomic(df, filepath, **to_csv_kwargs):
+    """先寫入同目錄暫存檔再以os.replace取代，避免中斷時留下半個檔案"""
+    with atomic_path(filepath) as tmp_path:
+        df.to_csv(tmp_path, index=False, **to_csv_kwargs)
+
+def scan_manifest(start_date=None, end_date=None, folder='.', manifest=None):
+    """
+    依清單檔找出需要補算Average的檔案
+    :param start_date: str, 起始日期(YYYYMMDD)，None表示不限
+    :param end_date: str, 結束日期(YYYYMMDD)，None表示不限
+    :param folder: str, 資料存放目錄
+    :param manifest: dict, 已載入的清單，None時自動讀取
+    :return: (待處理檔名列表, 更新後的清單)
+    """
+    if manifest is None:
+        manifest = load_manifest(folder)
+
+    pending = []
+    for entry in os.scandir(folder):
+        match = TX_FILE_PATTERN.match(entry.name)
+        if not match or not entry.is_file():
             continue
-        
-        # 檢查必要的列是否存在
-        required_columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
-        if not all(col in df.columns for col in required_columns):
-            print(f"文件 {filename} 缺少必要列，跳過...")
+        date_str = match.group(1)
+        if (start_date and date_str < start_date) or (end_date and date_str > end_date):
             continue
-        
-        # 計算並添加Average列
-        df = calculate_average(df)
-        
-        # 保存文件
-        try:
-            df.to_csv(filepath, index=False)
-            print(f"文件 {filename} 已成功處理並保存")
-        except Exception as e:
-            print(f"保存文件 {filename} 時發生錯誤: {e}")
+
+        stat = entry.stat()
+        record = manifest.get(entry.name)
+        # 檔案未變動時直接採用清單記錄，否則只讀標題列判斷
+        if not record or record.get('mtime') != stat.st_mtime or record.get('size') != stat.st_size:
+            columns = read_header(entry.path)
+            record = {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'has_average': 'Average' in columns,
+                'complete': all(col in columns for col in REQUIRED_COLUMNS),
+            }
+            manifest[entry.name] = record
+
+        if record['complete'] and not record['has_average']:
+            pending.append(entry.name)
+
+    return sorted(pending), manifest
+
+def backfill_file(filepath):
+    """
+    補算單一檔案的Average欄位（可重複執行）
+    :return: (檔名, 是否已寫入, 訊息)
+    """
+    filename = os.path.basename(filepath)
+    try:
+        df = pd.read_csv(filepath)
+    except Exception as e:
+        return filename, False, f"讀取文件 {filename} 時發生錯誤: {e}"
+
+    # 其他程序可能已處理過，重新確認以保持冪等
+    if 'Average' in df.columns:
+        return filename, False, f"文件 {filename} 已包含Average列，跳過..."
+
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        return filename, False, f"文件 {filename} 缺少必要列，跳過..."
+
+    df = calculate_average(df)
+
+    try:
+        write_csv_atomic(df, filepath)
+    except Exception as e:
+        return filename, False, f"保存文件 {filename} 時發生錯誤: {e}"
+    return filename, True, f"文件 {filename} 已成功處理並保存"
+
+def backfill_averages(start_date=None, end_date=None, folder='.', workers=None):
+    """
+    以多程序平行補算日期範圍內缺少Average的檔案
+    :param workers: int, 程序數，None表示使用CPU核心數
+    :return: list, 已寫入的檔名
+    """
+    pending, manifest = scan_manifest(start_date, end_date, folder)
+    if not pending:
+        print("沒有需要補算Average的文件")
+        save_manifest(manifest, folder)
+        return []
+
+    print(f"共有 {len(pending)} 個文件需要補算Average")
+    written = []
+    paths = [os.path.join(folder, name) for name in pending]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(backfill_file, path) for path in paths]
+        for future in as_completed(futures):
+            filename, ok, message = future.result()
+            print(message)
+            if ok:
+                written.append(filename)
+
+    # 寫入後的檔案重新記錄狀態
+    for filename in written:
+        stat = os.stat(os.path.join(folder, filename))
+        manifest[filename] = {
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'has_average': True,
+            'complete': True,
+        }
+    save_manifest(manifest, folder)
+    return sorted(written)
+
+def process_files():
+    # 從2025-06-01起補算至今日
+    start_date = datetime(2025, 6, 1).strftime('%Y%m%d')
+    end_date = datetime.now().strftime('%Y%m%d')
+    backfill_averages(start_date, end_date, os.getcwd())
 
 if __name__ == "__main__":
-    process_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='平行補算TX_YYYYMMDD_1K.csv的Average欄位')
+    parser.add_argument('--start', help='起始日期(YYYYMMDD)，預設不限')
+    parser.add_argument('--end', help='結束日期(YYYYMMDD)，預設不限')
+    parser.add_argument('--folder', default=os.getcwd(), help='資料存放目錄')
+    parser.add_argument('--workers', type=int, default=None, help='程序數，預設為CPU核心數')
+    args = parser.parse_args()
+
+    if len(sys.argv) == 1:
+        process_files()
+    else:
+        backfill_averages(args.start, args.end, args.folder, args.workers)
@@ -0,0 +1,477 @@
+import io
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import importlib.util
+import contextlib
+import subprocess
+import tempfile
+
+# 圖表與回放都以離屏方式繪製，必須在載入pyplot與建立QApplication之前指定
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from Average import atomic_path
+from DataLoader import DATE_FORMAT, day_path, list_days
+
+# 每次執行的結果依序附加到歷史檔；基準檔為某一次執行的結果，供之後的執行比較
+BENCHMARK_HISTORY = 'benchmark_history.json'
+BENCHMARK_BASELINE = 'benchmark_baseline.json'
+# 測試資料：以固定亂數種子產生的合成交易日，天數與種子相同時內容完全相同
+FIXTURE_DAYS = 60
+FIXTURE_SEED = 0
+FIXTURE_START = '2024-01-02'
+FIXTURE_MANIFEST = 'benchmark_fixture.json'
+# 修改合成資料的產生方式時遞增，讓既有的測試資料目錄重新產生
+FIXTURE_VERSION = 1
+SESSION_START = '08:46'
+SESSION_BARS = 300
+# 測試資料目錄中由各模組產生的衍生檔，重新產生測試資料時一併刪除
+DERIVED_FILES = ['similarity_cache.npz', 'similarity_index.npz', 'feature_panel.npz',
+                 'segment_probability_analysis.csv', 'segment_detailed_dates.csv', 'replay_journal.db']
+# 每個項目先執行WARMUP次（不計時），再計時REPEAT次取中位數
+REPEAT = 5
+WARMUP = 1
+# 中位數比基準慢超過這個比例視為效能退化
+REGRESSION_THRESHOLD = 0.2
+# KReplay每次計時播放的K棒數；NewData圖表的解析度
+REPLAY_FRAMES = 60
+CHART_DPI = 100
+
+class BenchmarkSkipped(Exception):
+    """環境缺少受測項目需要的套件或顯示器"""
+
+def make_day(rng, date, open_price):
+    """
+    以隨機漫步產生一個交易日的1分K（含均價線與strength/largeorder/score指標）
+    :return: DataFrame, TX_YYYYMMDD_1K.csv的欄位格式
+    """
+    close = open_price + np.cumsum(rng.normal(rng.normal(0, 0.5), 8, SESSION_BARS))
+    open_ = np.r_[open_price, close[:-1]]
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 4, SESSION_BARS))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 4, SESSION_BARS))
+    volume = rng.integers(50, 1500, SESSION_BARS)
+    volume[0] *= 3
+    times = pd.date_range(f"{date:%Y-%m-%d} {SESSION_START}", periods=SESSION_BARS, freq='min')
+    return pd.DataFrame({
+        'Date': times.strftime(DATE_FORMAT),
+        'Open': open_.round(),
+        'High': high.round(),
+        'Low': low.round(),
+        'Close': close.round(),
+        'Volume': volume,
+        'strength': np.cumsum(rng.normal(0, 10, SESSION_BARS)).round(),
+        'largeorder': np.cumsum(rng.normal(0, 20, SESSION_BARS)).round(),
+        'score': rng.integers(-20, 21, SESSION_BARS).astype('float64'),
+        'Average': (np.cumsum(close * volume) / np.cumsum(volume)).round(),
+    })
+
+def make_fixture(folder, days=FIXTURE_DAYS, seed=FIXTURE_SEED):
+    """
+    在folder產生days個合成交易日；目錄中已有相同設定的測試資料時直接沿用
+    :return: list, 交易日(YYYYMMDD)
+    """
+    spec = {'version': FIXTURE_VERSION, 'days': days, 'seed': seed}
+    manifest_path = os.path.join(folder, FIXTURE_MANIFEST)
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    elif list_days(folder):
+        raise ValueError(f"{folder} 中已有交易日資料但不是測試資料目錄，請指定其他目錄")
+
+    dates = [d.strftime('%Y%m%d') for d in pd.bdate_range(FIXTURE_START, periods=days)]
+    if manifest is not None and manifest['spec'] == spec and \
+            all(os.path.exists(day_path(d, folder)) for d in dates):
+        return dates
+
+    for name in [f"TX_{d}_1K.csv" for d in (manifest or {}).get('dates', [])] + DERIVED_FILES:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+    rng = np.random.default_rng(seed)
+    price = 17000.0
+    for date_str in dates:
+        df = make_day(rng, pd.Timestamp(date_str), price)
+        df.to_csv(day_path(date_str, folder), index=False)
+        price = float(df['Close'].iloc[-1]) + rng.normal(0, 30)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'spec': spec, 'dates': dates}, f)
+    return dates
+
+def quiet(func, *args, **kwargs):
+    """執行func並捨棄其輸出（受測模組會逐日印出進度）"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+@contextlib.contextmanager
+def working_directory(folder):
+    """暫時切換工作目錄（部分模組以工作目錄讀寫檔案）"""
+    previous = os.getcwd()
+    os.chdir(folder)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+class BenchmarkContext:
+    """測試資料目錄與各項目共用的準備結果（第一次用到時才建立）"""
+
+    def __init__(self, folder, dates, repeat=REPEAT, warmup=WARMUP):
+        self.folder = folder
+        self.dates = dates
+        self.repeat = repeat
+        self.warmup = warmup
+        self._cache = {}
+
+    def measure(self, run, per=1, before=None):
+        """
+        計時執行run
+        :param per: int, 每次執行包含的單位數（畫格、查詢數），結果換算為每單位的毫秒
+        :param before: 每次執行前呼叫、不計時的準備函數
+        :return: dict, median_ms/min_ms/max_ms/runs
+        """
+        times = []
+        for i in range(self.warmup + self.repeat):
+            if before is not None:
+                before()
+            gc.collect()
+            started = time.perf_counter()
+            run()
+            elapsed = (time.perf_counter() - started) * 1000 / per
+            if i >= self.warmup:
+                times.append(elapsed)
+        return {'median_ms': float(np.median(times)), 'min_ms': float(min(times)),
+                'max_ms': float(max(times)), 'runs': len(times)}
+
+    def cached(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def strategy_data(self):
+        import strategy
+        return self.cached('strategy_data', lambda: quiet(
+            strategy.load_data, self.dates[0], self.dates[-1], self.folder))
+
+    def daily_results(self):
+        import strategy
+        return self.cached('daily_results', lambda: quiet(
+            strategy.scan_conditions, self.strategy_data(), None, strategy.DAILY_CONFIG)[1])
+
+    def segment_files(self):
+        """分段機率與詳細日期檔（advisor、dash與特徵表的資料來源）"""
+        import strategy
+        def build():
+            quiet(strategy.analyze_segment_probability, self.daily_results(), self.folder)
+            return (os.path.join(self.folder, 'segment_probability_analysis.csv'),
+                    os.path.join(self.folder, 'segment_detailed_dates.csv'))
+        return self.cached('segment_files', build)
+
+    def first_segment(self):
+        """最常見的開盤時段分類與變動，作為查詢條件"""
+        def build():
+            detailed = pd.read_csv(self.segment_files()[1])
+            return detailed.groupby(['first_trade_class', 'first_trade_change']).size().idxmax()
+        return self.cached('first_segment', build)
+
+    def archive(self):
+        from Similarity import load_archive
+        return self.cached('archive', lambda: quiet(load_archive, self.folder))
+
+def bench_load_days(ctx):
+    from DataLoader import load_days
+    return ctx.measure(lambda: load_days(ctx.dates[0], ctx.dates[-1], ctx.folder))
+
+def bench_scan_daily(ctx):
+    import strategy
+    data = ctx.strategy_data()
+    return ctx.measure(lambda: quiet(strategy.scan_conditions, data, None, strategy.DAILY_CONFIG))
+
+def bench_scan_intraday(ctx):
+    import strategy
+    data = ctx.strategy_data()
+    return ctx.measure(lambda: quiet(strategy.scan_conditions, data, strategy.INTRADAY_CONFIG, None))
+
+def bench_segment_probability(ctx):
+    import strategy
+    daily_results = ctx.daily_results()
+    return ctx.measure(lambda: quiet(strategy.analyze_segment_probability, daily_results, ctx.folder))
+
+def bench_similarity_features(ctx):
+    from practice import load_all_features, load_data, calculate_similarity
+    target, history = load_data(ctx.dates[-1], load_all_features(ctx.folder))
+    def run():
+        scores = [(date, calculate_similarity(target, features)[0]) for date, features in history.items()]
+        sorted(scores, key=lambda x: x[1], reverse=True)
+    return ctx.measure(run)
+
+def bench_similarity_dtw(ctx):
+    from Similarity import dtw_search
+    archive = ctx.archive()
+    return ctx.measure(lambda: dtw_search(archive, ctx.dates[-1], folder=ctx.folder))
+
+def bench_similarity_lsh(ctx):
+    from SimilarityIndex import SimilarityIndex
+    index = SimilarityIndex(ctx.folder)
+    index.update(ctx.archive())
+    # 單次查詢太快，每次計時查詢所有交易日，結果為每次查詢的毫秒
+    return ctx.measure(lambda: [index.query(d) for d in ctx.dates], per=len(ctx.dates))
+
+def bench_panel_select(ctx):
+    from FeaturePanel import FeaturePanel
+    ctx.segment_files()
+    FeaturePanel(ctx.folder).update(ctx.archive(), verbose=False)
+    ft_class, ft_change = ctx.first_segment()
+    expr = f"first_trade_class == {ft_class!r} and first_trade_change == {ft_change!r}"
+    # 含讀取特徵表，即advisor第一次套用條件的成本
+    return ctx.measure(lambda: FeaturePanel(ctx.folder).select(expr))
+
+def bench_advisor_query(ctx):
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        raise BenchmarkSkipped(f"無法建立Tk視窗: {e}")
+    try:
+        root.withdraw()
+        import advisor
+        app = advisor.IntradayAdvisor(root)
+        app.try_load_data(advisor.read_data_files(*ctx.segment_files()), None)
+        ft_class, ft_change = ctx.first_segment()
+        app.time_var.set('9:15')
+        app.ft_class_var.set(ft_class)
+        app.ft_change_var.set(ft_change)
+        def before():
+            plt.close('all')
+            app.result_text.delete('1.0', tk.END)
+        def run():
+            app.query_probabilities()
+            root.update_idletasks()
+        return ctx.measure(run, before=before)
+    finally:
+        plt.close('all')
+        root.destroy()
+
+def bench_dash_query(ctx):
+    prob_path, detailed_path = ctx.segment_files()
+    try:
+        with working_directory(ctx.folder):
+            import dash_advisor
+    except ImportError as e:
+        raise BenchmarkSkipped(f"缺少套件: {e.name}")
+    dash_advisor.load_data_globally(prob_path, detailed_path)
+    ft_class, ft_change = ctx.first_segment()
+    def run():
+        _, chart_data = dash_advisor.query_for_915(ft_class, ft_change)
+        dash_advisor.create_charts(chart_data, f"開盤時段: {ft_class}({ft_change})")
+    return ctx.measure(run)
+
+def bench_kreplay_frame(ctx, backend='matplotlib'):
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError as e:
+        raise BenchmarkSkipped(f"缺少套件: {e.name}")
+    if backend == 'pyqtgraph' and importlib.util.find_spec('pyqtgraph') is None:
+        raise BenchmarkSkipped("缺少套件: pyqtgraph")
+    from DataLoader import load_day, capabilities, plot_frame
+    app = QApplication.instance() or QApplication([])
+    # 練習紀錄寫在工作目錄，改寫到測試資料目錄
+    with working_directory(ctx.folder):
+        import KReplay
+        player = KReplay.KLinePlayer(backend=backend)
+        try:
+            player.resize(1600, 900)
+            player.show()
+            path = day_path(ctx.dates[-1], ctx.folder)
+            loaded = load_day(path)
+            caps = capabilities(loaded)
+            player.df = plot_frame(loaded)
+            player.has_strength = caps['strength']
+            player.has_largeorder = caps['largeorder']
+            player.has_score = caps['score']
+            player.source_path = path
+            player.reset_replay_state()
+            app.processEvents()
+            frames = min(REPLAY_FRAMES, len(player.df))
+            def rewind():
+                player.seek_to(0)
+                app.processEvents()
+            def run():
+                for _ in range(frames):
+                    player.next_step()
+                    app.processEvents()
+            return ctx.measure(run, per=frames, before=rewind)
+        finally:
+            player.close()
+            app.processEvents()
+
+def bench_newdata_chart(ctx):
+    from NewData import plot_chart
+    path = day_path(ctx.dates[-1], ctx.folder)
+    with tempfile.TemporaryDirectory() as tmp:
+        chart_file = os.path.join(tmp, 'chart.png')
+        return ctx.measure(lambda: plt.close(quiet(plot_chart, path, chart_file, ctx.dates[-1], dpi=CHART_DPI)))
+
+# (名稱, 說明, 受測函數)；名稱為歷史與基準檔中的鍵，不要任意更改
+BENCHMARKS = [
+    ('load_days', '載入所有交易日（DataLoader.load_days）', bench_load_days),
+    ('scan_daily', 'strategy.scan_conditions 整日條件', bench_scan_daily),
+    ('scan_intraday', 'strategy.scan_conditions 單K棒條件', bench_scan_intraday),
+    ('segment_probability', 'strategy.analyze_segment_probability', bench_segment_probability),
+    ('similarity_features', '覆盤相似日：特徵評分排序', bench_similarity_features),
+    ('similarity_dtw', '覆盤相似日：DTW路徑形狀搜尋', bench_similarity_dtw),
+    ('similarity_lsh', '覆盤相似日：LSH索引查詢（每次查詢）', bench_similarity_lsh),
+    ('panel_select', '特徵表讀取與條件篩選', bench_panel_select),
+    ('advisor_query', 'advisor 9:15查詢（含圖表）', bench_advisor_query),
+    ('dash_query', 'dash_advisor 9:15查詢（含圖表）', bench_dash_query),
+    ('kreplay_frame', 'KReplay每畫格（matplotlib，離屏）', bench_kreplay_frame),
+    ('kreplay_frame_pyqtgraph', 'KReplay每畫格（pyqtgraph，離屏）',
+     lambda ctx: bench_kreplay_frame(ctx, 'pyqtgraph')),
+    ('newdata_chart', f'NewData.plot_chart（{CHART_DPI} dpi）', bench_newdata_chart),
+]
+
+def git_commit():
+    """目前的git版本（不在git目錄中時為None）"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(folder, days=FIXTURE_DAYS, seed=FIXTURE_SEED, repeat=REPEAT, warmup=WARMUP, only=None):
+    """
+    產生（或沿用）測試資料並執行各項目
+    :param only: list, 只執行這些名稱的項目，None為全部
+    :return: dict, 本次執行的紀錄（含環境資訊與各項目結果）
+    """
+    dates = make_fixture(folder, days, seed)
+    ctx = BenchmarkContext(folder, dates, repeat, warmup)
+    results = {}
+    for name, description, bench in BENCHMARKS:
+        if only and name not in only:
+            continue
+        try:
+            result = bench(ctx)
+            print(f"{name:<24} 中位數 {result['median_ms']:10.2f} ms  "
+                  f"最小 {result['min_ms']:10.2f} ms  {description}")
+        except BenchmarkSkipped as e:
+            result = {'skipped': str(e)}
+            print(f"{name:<24} 略過：{e}")
+        except Exception as e:
+            result = {'error': f"{type(e).__name__}: {e}"}
+            print(f"{name:<24} 失敗：{result['error']}")
+        results[name] = result
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'fixture': {'version': FIXTURE_VERSION, 'days': days, 'seed': seed},
+        'repeat': repeat,
+        'results': results,
+    }
+
+def load_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_json(path, data):
+    with atomic_path(path) as temp_path:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+def append_history(record, path=BENCHMARK_HISTORY):
+    history = load_json(path, [])
+    history.append(record)
+    save_json(path, history)
+
+def compare(record, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    以中位數比較本次與基準
+    :return: list, [(項目, 基準ms, 本次ms, 變化比例, 是否退化)]，只含兩次都有結果的項目
+    """
+    rows = []
+    for name, result in record['results'].items():
+        base = baseline['results'].get(name, {})
+        if 'median_ms' not in result or 'median_ms' not in base:
+            continue
+        change = result['median_ms'] / base['median_ms'] - 1 if base['median_ms'] > 0 else 0.0
+        rows.append((name, base['median_ms'], result['median_ms'], change, change > threshold))
+    return rows
+
+def print_comparison(rows, baseline, threshold):
+    print(f"\n與基準比較（{baseline['time']}，版本 {baseline.get('commit') or '未知'}，"
+          f"退化門檻 +{threshold:.0%}）")
+    print(f"{'項目':<22} {'基準(ms)':>12} {'本次(ms)':>12} {'變化':>8}")
+    for name, base, now, change, regressed in rows:
+        print(f"{name:<24} {base:12.2f} {now:12.2f} {change:+8.1%}{'  ← 退化' if regressed else ''}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='以固定的合成資料量測各處理階段的耗時，記錄歷史並與基準比較')
+    parser.add_argument('--days', type=int, default=FIXTURE_DAYS, help='測試資料的交易日數')
+    parser.add_argument('--seed', type=int, default=FIXTURE_SEED, help='測試資料的亂數種子')
+    parser.add_argument('--fixture', help='測試資料目錄（保留供下次沿用），預設為暫存目錄')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='每個項目計時的次數')
+    parser.add_argument('--warmup', type=int, default=WARMUP, help='每個項目計時前不計時的執行次數')
+    parser.add_argument('--only', help='只執行這些項目（以逗號分隔）')
+    parser.add_argument('--list', action='store_true', help='列出所有項目')
+    parser.add_argument('--history', default=BENCHMARK_HISTORY, help='結果歷史檔')
+    parser.add_argument('--no-history', action='store_true', help='不寫入歷史檔')
+    parser.add_argument('--baseline', default=BENCHMARK_BASELINE, help='基準檔')
+    parser.add_argument('--save-baseline', action='store_true', help='將本次結果存為基準')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='中位數比基準慢超過這個比例視為退化（0.2為20%%）')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, description, _ in BENCHMARKS:
+            print(f"{name:<24} {description}")
+        sys.exit(0)
+    only = [name.strip() for name in args.only.split(',')] if args.only else None
+    unknown = set(only or []) - {name for name, _, _ in BENCHMARKS}
+    if unknown:
+        print(f"錯誤：沒有這些項目: {', '.join(sorted(unknown))}")
+        sys.exit(2)
+
+    # 歷史與基準檔以啟動時的工作目錄為準
+    history_path, baseline_path = os.path.abspath(args.history), os.path.abspath(args.baseline)
+    if args.fixture:
+        os.makedirs(args.fixture, exist_ok=True)
+        record = run_benchmarks(os.path.abspath(args.fixture), args.days, args.seed,
+                                args.repeat, args.warmup, only)
+    else:
+        with tempfile.TemporaryDirectory() as folder:
+            record = run_benchmarks(folder, args.days, args.seed, args.repeat, args.warmup, only)
+
+    if not args.no_history:
+        append_history(record, history_path)
+        print(f"\n結果已附加至: {history_path}")
+    baseline = load_json(baseline_path)
+    regressions = []
+    if baseline is None:
+        print(f"尚無基準檔（{baseline_path}），以 --save-baseline 建立")
+    elif baseline['fixture'] != record['fixture']:
+        print(f"基準的測試資料設定 {baseline['fixture']} 與本次 {record['fixture']} 不同，不比較")
+    else:
+        rows = compare(record, baseline, args.threshold)
+        print_comparison(rows, baseline, args.threshold)
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print(f"\n效能退化: {', '.join(regressions)}")
+    if args.save_baseline:
+        save_json(baseline_path, record)
+        print(f"已將本次結果存為基準: {baseline_path}")
+    # 有退化時以非0結束，供排程或CI判斷
+    sys.exit(1 if regressions else 0)
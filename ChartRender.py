@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 批次繪圖不需要視窗，必須在載入pyplot（NewData）之前指定Agg
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from NewData import plot_chart
+from Average import load_manifest, save_manifest
+
+CHART_MANIFEST_FILE = 'chart_manifest.json'
+# 修改圖表樣式時遞增，讓所有圖表視為過期
+RENDER_VERSION = 1
+TX_FILE_PATTERN = re.compile(r'^TX_(\d{8})_1K\.csv$')
+
+def source_hash(csv_path, dpi, thumb_dpi):
+    """以來源資料內容與繪圖設定計算雜湊"""
+    digest = hashlib.sha1(f"v{RENDER_VERSION}|dpi={dpi}|thumb={thumb_dpi}|".encode())
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chart_paths(csv_path, output_folder):
+    """回傳 (圖表路徑, 縮圖路徑)"""
+    base = os.path.splitext(os.path.basename(csv_path))[0]
+    return (os.path.join(output_folder, f"{base}_chart.png"),
+            os.path.join(output_folder, f"{base}_thumb.png"))
+
+def render_one(csv_path, output_folder, dpi=300, thumb_dpi=None):
+    """
+    繪製單日圖表（於子程序中執行）
+    :return: (圖表檔名, 雜湊, 錯誤訊息或None)
+    """
+    chart_file, thumb_file = chart_paths(csv_path, output_folder)
+    date_str = TX_FILE_PATTERN.match(os.path.basename(csv_path)).group(1)
+    try:
+        digest = source_hash(csv_path, dpi, thumb_dpi)
+        fig = plot_chart(csv_path, chart_file, date_str, dpi=dpi)
+        if thumb_dpi:
+            fig.savefig(thumb_file, dpi=thumb_dpi, bbox_inches='tight')
+        plt.close(fig)
+    except Exception as e:
+        plt.close('all')
+        return os.path.basename(chart_file), None, str(e)
+    return os.path.basename(chart_file), digest, None
+
+def find_stale_charts(data_folder='.', output_folder=None, dpi=300, thumb_dpi=None,
+                      start_date=None, end_date=None, force=False):
+    """
+    找出來源資料雜湊與圖表記錄不符（或圖表不存在）的日期
+    :return: (待繪製的CSV路徑列表, 清單)
+    """
+    output_folder = output_folder or data_folder
+    manifest = load_manifest(output_folder, CHART_MANIFEST_FILE)
+    stale = []
+    for name in sorted(os.listdir(data_folder)):
+        match = TX_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        date_str = match.group(1)
+        if (start_date and date_str < start_date) or (end_date and date_str > end_date):
+            continue
+        csv_path = os.path.join(data_folder, name)
+        chart_file, thumb_file = chart_paths(csv_path, output_folder)
+        record = manifest.get(os.path.basename(chart_file))
+        up_to_date = (not force and record is not None and os.path.exists(chart_file)
+                      and (not thumb_dpi or os.path.exists(thumb_file))
+                      and record.get('hash') == source_hash(csv_path, dpi, thumb_dpi))
+        if not up_to_date:
+            stale.append(csv_path)
+    return stale, manifest
+
+def render_charts(data_folder='.', output_folder=None, dpi=300, thumb_dpi=None,
+                  workers=None, start_date=None, end_date=None, force=False):
+    """
+    以多程序批次繪製過期的圖表
+    :param thumb_dpi: int, 同時輸出 *_thumb.png 縮圖的解析度，None表示不輸出
+    :return: (成功繪製數, 失敗數)
+    """
+    output_folder = output_folder or data_folder
+    stale, manifest = find_stale_charts(data_folder, output_folder, dpi, thumb_dpi,
+                                        start_date, end_date, force)
+    if not stale:
+        print("所有圖表皆為最新，無需重新繪製")
+        return 0, 0
+
+    print(f"共有 {len(stale)} 張圖表需要繪製")
+    rendered, failed = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_one, path, output_folder, dpi, thumb_dpi) for path in stale]
+        for future in as_completed(futures):
+            chart_name, digest, error = future.result()
+            if error:
+                failed += 1
+                print(f"繪製 {chart_name} 時發生錯誤: {error}")
+                continue
+            rendered += 1
+            manifest[chart_name] = {'hash': digest, 'dpi': dpi, 'thumb_dpi': thumb_dpi}
+    save_manifest(manifest, output_folder, CHART_MANIFEST_FILE)
+    return rendered, failed
+
+def benchmark(data_folder='.', count=16, dpi=100, workers=None):
+    """量測每核心每秒可繪製的圖表數（輸出到暫存目錄，不影響既有圖表）"""
+    files = sorted(f for f in os.listdir(data_folder) if TX_FILE_PATTERN.match(f))[-count:]
+    if not files:
+        print("找不到可用於基準測試的資料")
+        return None
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    for n_workers in sorted({1, workers}):
+        with tempfile.TemporaryDirectory() as tmp:
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                list(executor.map(render_one, [os.path.join(data_folder, f) for f in files],
+                                  [tmp] * len(files), [dpi] * len(files)))
+            elapsed = time.perf_counter() - started
+        per_sec = len(files) / elapsed
+        results[n_workers] = per_sec / n_workers
+        print(f"程序數 {n_workers}: {len(files)} 張 / {elapsed:.2f} 秒 = "
+              f"{per_sec:.2f} 張/秒，每核心 {per_sec / n_workers:.2f} 張/秒")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='批次繪製TX_YYYYMMDD_1K_chart.png（無需顯示器）')
+    parser.add_argument('--folder', default='.', help='資料存放目錄')
+    parser.add_argument('--output', default=None, help='圖表輸出目錄，預設與資料相同')
+    parser.add_argument('--dpi', type=int, default=300, help='圖表解析度')
+    parser.add_argument('--thumb-dpi', type=int, default=None, help='同時輸出縮圖的解析度')
+    parser.add_argument('--workers', type=int, default=None, help='程序數，預設為CPU核心數')
+    parser.add_argument('--start', help='起始日期(YYYYMMDD)')
+    parser.add_argument('--end', help='結束日期(YYYYMMDD)')
+    parser.add_argument('--force', action='store_true', help='忽略雜湊記錄，全部重新繪製')
+    parser.add_argument('--benchmark', action='store_true', help='量測每核心每秒繪製張數')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.folder, dpi=args.dpi, workers=args.workers)
+        sys.exit(0)
+
+    rendered, failed = render_charts(args.folder, args.output, args.dpi, args.thumb_dpi,
+                                     args.workers, args.start, args.end, args.force)
+    print(f"繪製完成: 成功 {rendered} 張，失敗 {failed} 張")
@@ -0,0 +1,162 @@
+import time
+import numpy as np
+
+# 十字線最多每隔這麼多毫秒重畫一次（約為螢幕更新率60Hz）
+FRAME_INTERVAL_MS = 16
+LINE_STYLE = dict(color='gray', linestyle='--', alpha=0.7, linewidth=0.8)
+# 資訊框顯示的指標：(欄位, 標籤, 格式)
+INDICATOR_LABELS = [
+    ('Average', 'Avg', '{:.2f}'),
+    ('Volume', 'Vol', '{:.0f}'),
+    ('strength', 'Strength', '{:.2f}'),
+    ('largeorder', 'Largeorder', '{:.2f}'),
+    ('score', 'Score', '{:.2f}'),
+]
+
+class Crosshair:
+    """
+    以blitting繪製的十字線
+    線與資訊框只建立一次並設為animated，整張圖畫完後保存背景；滑鼠移動時只還原背景並重畫這幾個artist。
+    連續的移動事件會合併，最多每interval_ms毫秒重畫一次；x座標以searchsorted對齊最近的K棒，
+    資訊框顯示該K棒的時間、OHLC與指標
+    """
+
+    def __init__(self, fig, axes, df, x_positions=None, info_ax=None, interval_ms=FRAME_INTERVAL_MS):
+        """
+        :param axes: list, 顯示十字線的各面板（每個面板一條直線，滑鼠所在的面板另畫橫線）
+        :param df: DataFrame, load_day格式的K線，index為時間
+        :param x_positions: array, 每根K棒在圖上的x座標（遞增）；None時為0..N-1，
+                            即mplfinance預設（不顯示非交易時段）的座標
+        :param info_ax: 顯示資訊框的面板，預設為axes[0]
+        """
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.axes = list(axes)
+        self.interval = interval_ms / 1000
+        self.x_positions = (np.arange(len(df), dtype='float64') if x_positions is None
+                            else np.asarray(x_positions, dtype='float64'))
+        self.times = df.index.strftime('%H:%M').tolist()
+        self.ohlc = df[['Open', 'High', 'Low', 'Close']].to_numpy(dtype='float64')
+        self.indicators = [(label, fmt, df[col].to_numpy(dtype='float64'))
+                           for col, label, fmt in INDICATOR_LABELS
+                           if col in df.columns and not df[col].isna().all()]
+        self._bar_text = {}
+
+        x0 = self.x_positions[0] if len(self.x_positions) else 0
+        self.v_lines = [ax.axvline(x0, visible=False, animated=True, **LINE_STYLE) for ax in self.axes]
+        self.h_lines = [ax.axhline(np.mean(ax.get_ylim()), visible=False, animated=True, **LINE_STYLE)
+                        for ax in self.axes]
+        info_ax = info_ax or self.axes[0]
+        self.label = info_ax.text(0.99, 0.97, '', transform=info_ax.transAxes, ha='right', va='top',
+                                  family='monospace', fontsize=9, visible=False, animated=True,
+                                  bbox=dict(facecolor='white', alpha=0.8))
+        self.artists = self.v_lines + self.h_lines + [self.label]
+
+        self.background = None
+        self.pending = None     # 尚未畫出的最新滑鼠位置 (面板, x, y)，None為隱藏
+        self.last_frame = 0.0
+        self.timer = self.canvas.new_timer(interval=interval_ms)
+        self.timer.single_shot = True
+        self.timer.add_callback(self.render)
+        self.timer_running = False
+        self.connections = [
+            self.canvas.mpl_connect('draw_event', self.on_draw),
+            self.canvas.mpl_connect('motion_notify_event', self.on_move),
+            self.canvas.mpl_connect('figure_leave_event', self.on_leave),
+        ]
+
+    def disconnect(self):
+        for cid in self.connections:
+            self.canvas.mpl_disconnect(cid)
+        self.timer.stop()
+        for artist in self.artists:
+            artist.remove()
+
+    def nearest_bar(self, x):
+        """以searchsorted找出x座標最接近的K棒位置"""
+        xs = self.x_positions
+        i = int(np.searchsorted(xs, x))
+        if i >= len(xs):
+            return len(xs) - 1
+        if i > 0 and x - xs[i - 1] < xs[i] - x:
+            return i - 1
+        return i
+
+    def bar_text(self, i):
+        """K棒資訊（每根K棒只格式化一次）"""
+        text = self._bar_text.get(i)
+        if text is None:
+            o, h, l, c = self.ohlc[i]
+            lines = [f"O {o:.0f}  H {h:.0f}  L {l:.0f}  C {c:.0f}"]
+            values = [f"{label} {fmt.format(values[i])}" for label, fmt, values in self.indicators
+                      if not np.isnan(values[i])]
+            for start in range(0, len(values), 2):
+                lines.append('  '.join(values[start:start + 2]))
+            text = self._bar_text[i] = '\n'.join(lines)
+        return text
+
+    def on_draw(self, event):
+        """整張圖重畫（開啟、縮放、調整大小）後重新保存背景"""
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+
+    def on_move(self, event):
+        # mplfinance的面板上疊有twinx座標軸，event.inaxes可能是疊在上面的那個，改以位置判斷面板
+        self.pending = None
+        for ax in self.axes:
+            if ax.bbox.contains(event.x, event.y):
+                x, y = ax.transData.inverted().transform((event.x, event.y))
+                self.pending = (ax, x, y)
+                break
+        self.schedule()
+
+    def on_leave(self, event):
+        self.pending = None
+        self.schedule()
+
+    def schedule(self):
+        """距上次重畫已超過一個畫格時立即重畫，否則等到下一個畫格（期間的事件只保留最新的）"""
+        if self.timer_running:
+            return
+        wait = self.interval - (time.perf_counter() - self.last_frame)
+        if wait <= 0:
+            self.render()
+            return
+        self.timer.interval = max(int(wait * 1000), 1)
+        self.timer_running = True
+        self.timer.start()
+
+    def render(self):
+        self.timer_running = False
+        self.last_frame = time.perf_counter()
+        if self.background is None:
+            return
+        self.update_artists()
+        self.canvas.restore_region(self.background)
+        self._draw_artists()
+        self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+    def update_artists(self):
+        """依最新的滑鼠位置移動線與更新資訊框"""
+        if self.pending is None or not len(self.x_positions):
+            for artist in self.artists:
+                artist.set_visible(False)
+            return
+        ax, x, y = self.pending
+        i = self.nearest_bar(x)
+        bar_x = self.x_positions[i]
+        for v_line in self.v_lines:
+            v_line.set_xdata([bar_x, bar_x])
+            v_line.set_visible(True)
+        for panel, h_line in zip(self.axes, self.h_lines):
+            h_line.set_visible(panel is ax)
+            if panel is ax:
+                h_line.set_ydata([y, y])
+        self.label.set_text(f"Time {self.times[i]}  Cursor {y:.2f}\n{self.bar_text(i)}")
+        self.label.set_visible(True)
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            if artist.get_visible():
+                artist.axes.draw_artist(artist)
@@ -0,0 +1,304 @@
+import os
+import re
+import pandas as pd
+import numpy as np
+
+from Average import average_series
+
+# 所有K線資料統一的欄位與型別
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Average']
+INDICATOR_COLUMNS = ['strength', 'largeorder', 'score']
+SCHEMA_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Average'] + INDICATOR_COLUMNS
+SCHEMA_DTYPES = {col: 'float32' for col in PRICE_COLUMNS + INDICATOR_COLUMNS}
+SCHEMA_DTYPES['Volume'] = 'Int32'
+REQUIRED_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+DATE_FORMAT = '%Y/%m/%d %H:%M'
+# 總覽列最多顯示的聚合K棒數
+OVERVIEW_POINTS = 120
+# 逐筆回放時每根K棒預設的分段數
+TICK_STEPS = 10
+TX_FILE_PATTERN = re.compile(r'^TX_(\d{8})_1K\.csv$')
+
+def day_path(date_str, folder='.'):
+    """日期(YYYYMMDD) → TX_YYYYMMDD_1K.csv路徑"""
+    return os.path.join(folder, f"TX_{date_str}_1K.csv")
+
+def list_days(folder='.', start_date=None, end_date=None):
+    """列出目錄中日期範圍內的交易日(YYYYMMDD)，已排序"""
+    days = []
+    for name in os.listdir(folder):
+        match = TX_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        date_str = match.group(1)
+        if (start_date and date_str < start_date) or (end_date and date_str > end_date):
+            continue
+        days.append(date_str)
+    return sorted(days)
+
+def normalize(raw):
+    """
+    將任意版本的K線DataFrame轉為固定欄位與精簡型別
+    缺少的指標欄位補上NaN(float32)，缺少Average時以累積成交量加權即時計算
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in raw.columns]
+    if missing:
+        raise ValueError(f"數據文件中缺少必要的列: {', '.join(missing)}")
+
+    dates = pd.to_datetime(raw['Date'].astype(str), format=DATE_FORMAT, errors='coerce')
+    if dates.isna().any():
+        # Excel或其他來源的日期格式不一，改由pandas自動判斷
+        dates = pd.to_datetime(raw['Date'])
+    df = pd.DataFrame(index=pd.DatetimeIndex(dates, name='Date'))
+    derived = []
+    for col in SCHEMA_COLUMNS:
+        if col in raw.columns:
+            values = pd.to_numeric(raw[col], errors='coerce').to_numpy()
+        elif col == 'Average':
+            values = average_series(pd.to_numeric(raw['Close'], errors='coerce'),
+                                    pd.to_numeric(raw['Volume'], errors='coerce')).to_numpy()
+            derived.append(col)
+        else:
+            values = np.full(len(raw), np.nan)
+        if col == 'Volume':
+            # 先四捨五入再轉成可為空的整數型別
+            df[col] = pd.array(np.round(values), dtype='Float64').astype('Int32')
+        else:
+            df[col] = values.astype(SCHEMA_DTYPES[col])
+
+    df.attrs['capabilities'] = {
+        'average': not df['Average'].isna().all(),
+        'strength': not df['strength'].isna().all(),
+        'largeorder': not df['largeorder'].isna().all(),
+        'score': not df['score'].isna().all(),
+    }
+    df.attrs['derived'] = derived
+    return df
+
+def capabilities(df):
+    """回傳資料具備的指標，例如 {'strength': True, ...}"""
+    return df.attrs.get('capabilities', {
+        col: col in df.columns and not df[col].isna().all()
+        for col in ['Average'] + INDICATOR_COLUMNS
+    })
+
+def load_day(source, index=True):
+    """
+    讀取單日K線並回傳固定欄位格式
+    :param source: str, CSV/Excel路徑或日期(YYYYMMDD)
+    :param index: bool, True時以Date為DatetimeIndex，False時Date為一般欄位
+    :return: DataFrame, 欄位為SCHEMA_COLUMNS，attrs['capabilities']記錄可用指標
+    """
+    path = day_path(source) if re.fullmatch(r'\d{8}', str(source)) else source
+    if str(path).endswith(('.xlsx', '.xls')):
+        raw = pd.read_excel(path, dtype={'Date': str})
+    else:
+        raw = pd.read_csv(path, dtype={'Date': str})
+    df = normalize(raw)
+    if not index:
+        attrs = dict(df.attrs)
+        df = df.reset_index()
+        df.attrs.update(attrs)
+    return df
+
+def load_days(start_date, end_date, data_folder='.', index=True):
+    """
+    讀取日期範圍內所有交易日
+    :return: dict, {日期: DataFrame}
+    """
+    data_dict = {}
+    for date_str in list_days(data_folder, start_date, end_date):
+        try:
+            data_dict[date_str] = load_day(day_path(date_str, data_folder), index=index)
+        except Exception as e:
+            print(f"載入失敗 TX_{date_str}_1K.csv: {str(e)}")
+    return data_dict
+
+def build_bar_state(df):
+    """
+    預先計算每根K棒的累計狀態，讓播放器在任意位置都能以O(1)取得畫面資訊
+    :return: dict, 各鍵為與df等長的numpy陣列：
+             high/low/close/average/指標值、running_high/running_low（累計最高/最低）、
+             <指標>_min/<指標>_max（累計範圍）、<指標>_positive/<指標>_colors（正負與顏色）、
+             up（收漲）、session_minutes（距第一根K棒的分鐘數）
+    """
+    state = {
+        'high': df['High'].to_numpy(dtype='float64'),
+        'low': df['Low'].to_numpy(dtype='float64'),
+        'close': df['Close'].to_numpy(dtype='float64'),
+        'average': df['Average'].to_numpy(dtype='float64'),
+        'running_high': np.fmax.accumulate(df['High'].to_numpy(dtype='float64')),
+        'running_low': np.fmin.accumulate(df['Low'].to_numpy(dtype='float64')),
+        # K棒漲跌（成交量柱顏色）
+        'up': df['Close'].to_numpy(dtype='float64') >= df['Open'].to_numpy(dtype='float64'),
+    }
+    for col in INDICATOR_COLUMNS:
+        values = df[col].to_numpy(dtype='float64')
+        state[col] = values
+        # fmin/fmax忽略NaN，開盤前幾根缺值不影響之後的範圍
+        state[f'{col}_min'] = np.fmin.accumulate(values)
+        state[f'{col}_max'] = np.fmax.accumulate(values)
+        # 每根柱狀圖的顏色：正值紅色、負值綠色
+        state[f'{col}_positive'] = values >= 0
+        state[f'{col}_colors'] = np.where(values >= 0, 'red', 'green')
+    minutes = (df.index.hour * 60 + df.index.minute).to_numpy()
+    # 以第一根K棒為起點並取模，跨午夜的夜盤也保持遞增
+    state['session_minutes'] = (minutes - minutes[0]) % 1440 if len(minutes) else minutes
+    return state
+
+def build_overview(df, max_points=OVERVIEW_POINTS):
+    """
+    將整日K線依固定根數聚合為至多max_points段OHLC，供總覽列使用
+    :return: dict, bucket（每段根數）、starts（每段第一根K棒的位置）、time/open/high/low/close（每段），
+             bucket_high/bucket_low（每根K棒在所屬段內的累計最高/最低）與bar_close，
+             用於組出尚未走完的最後一段，避免顯示未來資料
+    """
+    n = len(df)
+    bucket = max(1, -(-n // max_points))
+    starts = np.arange(0, n, bucket)
+    high = df['High'].to_numpy(dtype='float64')
+    low = df['Low'].to_numpy(dtype='float64')
+    close = df['Close'].to_numpy(dtype='float64')
+    groups = pd.Series(np.arange(n) // bucket)
+    return {
+        'bucket': bucket,
+        'starts': starts,
+        'time': df.index[starts],
+        'open': df['Open'].to_numpy(dtype='float64')[starts],
+        'high': np.fmax.reduceat(high, starts) if n else high,
+        'low': np.fmin.reduceat(low, starts) if n else low,
+        'close': close[np.minimum(starts + bucket, n) - 1],
+        'bucket_high': pd.Series(high).groupby(groups).cummax().to_numpy(),
+        'bucket_low': pd.Series(low).groupby(groups).cummin().to_numpy(),
+        'bar_close': close,
+    }
+
+def overview_upto(overview, count):
+    """
+    截取前count根K棒對應的總覽資料，最後一段未走完時以段內累計值組成
+    :return: dict, starts/time/open/high/low/close
+    """
+    if count == 0:
+        return {key: overview[key][:0] for key in ('starts', 'time', 'open', 'high', 'low', 'close')}
+    bucket = overview['bucket']
+    complete, partial = divmod(count, bucket)
+    n = complete + (1 if partial else 0)
+    result = {key: overview[key][:n] for key in ('starts', 'time', 'open')}
+    if partial:
+        i = count - 1
+        result['high'] = np.append(overview['high'][:complete], overview['bucket_high'][i])
+        result['low'] = np.append(overview['low'][:complete], overview['bucket_low'][i])
+        result['close'] = np.append(overview['close'][:complete], overview['bar_close'][i])
+    else:
+        for key in ('high', 'low', 'close'):
+            result[key] = overview[key][:n]
+    return result
+
+def _synthetic_tick_path(o, h, l, c, steps):
+    """
+    以固定規則合成K棒內路徑：收漲 O→L→H→C，收跌 O→H→L→C，沿路徑長度等距取steps個點
+    :return: tuple, (price, step_high, step_low)，形狀皆為(n, steps)
+    """
+    up = c >= o
+    first = np.where(up, l, h)   # 先到的極值
+    second = np.where(up, h, l)  # 後到的極值
+    leg1 = np.abs(first - o)
+    leg2 = leg1 + np.abs(second - first)
+    total = leg2 + np.abs(c - second)
+    fractions = np.arange(1, steps + 1) / steps
+    s = total[:, None] * fractions              # 每個分段走到的路徑長度
+    s_prev = total[:, None] * (fractions - 1 / steps)
+    price = np.where(
+        s <= leg1[:, None], o[:, None] + np.sign(first - o)[:, None] * s,
+        np.where(s <= leg2[:, None],
+                 first[:, None] + np.sign(second - first)[:, None] * (s - leg1[:, None]),
+                 second[:, None] + np.sign(c - second)[:, None] * (s - leg2[:, None])))
+    # 台指期最小跳動點為1點，合成價格取整數
+    price = np.round(price)
+    price[:, -1] = c
+    # 分段內的高低點：前後兩個取樣點，以及期間經過的轉折點
+    prev = np.column_stack([o, price[:, :-1]])
+    crossed_first = (s_prev < leg1[:, None]) & (leg1[:, None] <= s)
+    crossed_second = (s_prev < leg2[:, None]) & (leg2[:, None] <= s)
+    step_high = np.maximum.reduce([
+        prev, price,
+        np.where(crossed_first, first[:, None], -np.inf),
+        np.where(crossed_second, second[:, None], -np.inf)])
+    step_low = np.minimum.reduce([
+        prev, price,
+        np.where(crossed_first, first[:, None], np.inf),
+        np.where(crossed_second, second[:, None], np.inf)])
+    return price, step_high, step_low
+
+def _sampled_tick_path(positions, prices, n, steps):
+    """
+    將逐筆成交依K棒分組，每根K棒等距取steps筆
+    :param positions: ndarray, 每筆成交所屬K棒的位置（已排序）
+    :return: tuple, (open, price, step_high, step_low, has_ticks)，open為每根K棒的第一筆
+    """
+    counts = np.bincount(positions, minlength=n)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    k = np.arange(1, steps + 1)
+    # 第k段取到該K棒的第ceil(k*m/steps)筆，m不足steps時部分分段不前進
+    last = -(-(k[None, :] * counts[:, None]) // steps) - 1
+    prev_last = np.column_stack([np.full(n, -1), last[:, :-1]])
+    has_ticks = counts > 0
+    first = np.full(n, np.nan)
+    price = np.full((n, steps), np.nan)
+    step_high = np.full((n, steps), np.nan)
+    step_low = np.full((n, steps), np.nan)
+    if not has_ticks.any():
+        return first, price, step_high, step_low, has_ticks
+    first[has_ticks] = prices[starts[has_ticks]]
+    absolute = np.where(has_ticks[:, None], starts[:, None] + last, 0)
+    price[has_ticks] = prices[absolute[has_ticks]]
+    # 各非空分段依序切分整個逐筆陣列，以reduceat一次求出每段高低點
+    nonempty = has_ticks[:, None] & (last > prev_last)
+    segment_starts = (starts[:, None] + prev_last + 1)[nonempty]
+    step_high[nonempty] = np.maximum.reduceat(prices, segment_starts)
+    step_low[nonempty] = np.minimum.reduceat(prices, segment_starts)
+    empty = has_ticks[:, None] & ~nonempty
+    step_high[empty] = price[empty]
+    step_low[empty] = price[empty]
+    return first, price, step_high, step_low, has_ticks
+
+def build_tick_path(df, steps=TICK_STEPS, ticks=None):
+    """
+    預先計算每根K棒內的價格路徑，供逐筆回放以O(1)取得形成中的K棒與成交價
+    有逐筆成交的K棒依實際成交等距取樣，其餘以OHLC合成（見_synthetic_tick_path）
+    :param steps: int, 每根K棒的分段數
+    :param ticks: DataFrame, 逐筆成交（欄位minute(HH:MM)/price，依時間排序），None表示全部合成
+    :return: dict, price/high/low（形狀(n, steps)：各分段的價格、K棒開始至該分段的最高/最低）、
+             step_high/step_low（前一分段至該分段之間的最高/最低，計算MAE/MFE用）、
+             open（每根K棒）、real（每根K棒是否使用逐筆成交）、steps
+    """
+    steps = max(2, int(steps))
+    o = df['Open'].to_numpy(dtype='float64')
+    h = df['High'].to_numpy(dtype='float64')
+    l = df['Low'].to_numpy(dtype='float64')
+    c = df['Close'].to_numpy(dtype='float64')
+    price, step_high, step_low = _synthetic_tick_path(o, h, l, c, steps)
+    real = np.zeros(len(df), dtype=bool)
+    if ticks is not None and not ticks.empty and len(df):
+        positions = pd.Index(df.index.strftime('%H:%M')).get_indexer(ticks['minute'])
+        matched = positions >= 0
+        order = np.argsort(positions[matched], kind='stable')
+        tick_open, tick_price, tick_high, tick_low, real = _sampled_tick_path(
+            positions[matched][order], ticks['price'].to_numpy(dtype='float64')[matched][order],
+            len(df), steps)
+        o = np.where(real, tick_open, o)
+        price[real], step_high[real], step_low[real] = tick_price[real], tick_high[real], tick_low[real]
+    return {
+        'steps': steps,
+        'open': o,
+        'price': price,
+        'high': np.maximum.accumulate(step_high, axis=1),
+        'low': np.minimum.accumulate(step_low, axis=1),
+        'step_high': step_high,
+        'step_low': step_low,
+        'real': real,
+    }
+
+def plot_frame(df):
+    """mplfinance只接受float/int欄位，繪圖前將可為空的Volume轉為float32"""
+    return df.astype({'Volume': 'float32'})
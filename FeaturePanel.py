@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+from Average import atomic_path
+from Similarity import load_archive, FEATURE_KEYS
+from ReplayJournal import SEGMENT_FILE
+
+# 以交易日為索引的特徵表，每欄一個陣列存於npz，與K線資料放在同一目錄
+FEATURE_PANEL = 'feature_panel.npz'
+SMART_MONEY_WORKBOOK = 'everyday_ver2.xlsx'
+# 籌碼工作表 → 欄位前綴（例如三大法人的「外資」欄為 inst_外資）
+SMART_MONEY_PREFIXES = {
+    "台指期換倉成本計算": 'roll',
+    "散戶多空力道": 'retail',
+    "微台多空力道": 'micro',
+    "三大法人買賣金額": 'inst',
+    "大盤多空點位": 'level',
+    "期貨大額交易人未沖銷部位": 'large',
+    "選擇權買賣權分計": 'option',
+}
+# 籌碼資料只取交易日之前（不含當日）最近的一筆；超過這麼多天沒有資料時視為缺值
+SMART_MONEY_MAX_AGE_DAYS = 10
+# 各來源的欄位群組：features為當日特徵（逐日增量），segments/smartmoney依來源檔是否變動整組重算
+GROUPS = ['features', 'segments', 'smartmoney']
+
+def file_signature(path):
+    """來源檔的(修改時間, 大小)，不存在時為None"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime, stat.st_size]
+
+def column_array(series):
+    """數值與布林欄轉為float64（缺值為NaN），其餘轉為字串（缺值為空字串）"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64').to_numpy()
+    return series.fillna('').astype(str).to_numpy(dtype='U')
+
+def parse_sheet_dates(column):
+    """籌碼工作表的日期欄，例如 '2025/05/19 (一)' 或 '2025年05月19日'"""
+    parts = column.astype(str).str.extract(r'(\d{4})\D+(\d{1,2})\D+(\d{1,2})').astype('float64')
+    parts.columns = ['year', 'month', 'day']
+    return pd.to_datetime(parts, errors='coerce')
+
+def segment_columns(segment_path, dates):
+    """
+    segment_detailed_dates.csv中各交易日的分段分類
+    :param dates: list, 交易日(YYYYMMDD)
+    :return: dict, {欄位: 與dates等長的陣列}
+    """
+    df = pd.read_csv(segment_path, dtype={'date': str})
+    df = df.drop_duplicates('date', keep='last').set_index('date')
+    # 布林欄先轉為0/1，reindex補上缺值後才不會變成object
+    flags = [col for col in df.columns if pd.api.types.is_bool_dtype(df[col])]
+    df[flags] = df[flags].astype('float64')
+    df = df.reindex(dates)
+    return {col: column_array(df[col]) for col in df.columns}
+
+def smart_money_columns(sheets, dates):
+    """
+    以as-of方式接上籌碼資料：每個交易日取該日之前（不含當日）最近一筆
+    盤前能看到的只有前一日收盤後公布的籌碼，當日的數字要收盤後才有
+    :param sheets: dict, {工作表: DataFrame}（smartmoney.update_store的結果）
+    :return: dict, {欄位: 與dates等長的陣列}；<前綴>_asof為實際採用的籌碼日期
+    """
+    sessions = pd.DataFrame({'session': pd.to_datetime(pd.Series(dates, dtype=str), format='%Y%m%d')})
+    order = np.argsort(sessions['session'].to_numpy(), kind='stable')
+    left = sessions.iloc[order]
+    columns = {}
+    for sheet, prefix in SMART_MONEY_PREFIXES.items():
+        if sheet not in sheets or '日期' not in sheets[sheet].columns:
+            continue
+        df = sheets[sheet]
+        right = pd.DataFrame({'asof': parse_sheet_dates(df['日期'])})
+        for col in df.columns:
+            if col == '日期':
+                continue
+            values = pd.to_numeric(df[col], errors='coerce')
+            if values.notna().any():
+                right[f"{prefix}_{col}"] = values.to_numpy(dtype='float64')
+        right = right.dropna(subset=['asof']).drop_duplicates('asof', keep='last').sort_values('asof')
+        merged = pd.merge_asof(left, right, left_on='session', right_on='asof', direction='backward',
+                               allow_exact_matches=False,
+                               tolerance=pd.Timedelta(days=SMART_MONEY_MAX_AGE_DAYS))
+        restore = np.empty_like(order)
+        restore[order] = np.arange(len(order))
+        merged = merged.iloc[restore]
+        columns[f"{prefix}_asof"] = column_array(merged['asof'].dt.strftime('%Y%m%d'))
+        for col in right.columns.drop('asof'):
+            columns[col] = merged[col].to_numpy(dtype='float64')
+    return columns
+
+def load_smart_money(workbook):
+    """讀取籌碼工作簿（只讀入新增的行，見smartmoney.update_store）"""
+    import smartmoney
+    smartmoney.load_heavy_modules()
+    return smartmoney.update_store(workbook)[0]
+
+class FeaturePanel:
+    """
+    以交易日為索引、結合當日特徵、分段分類與前一日籌碼的特徵表
+    每欄存為一個陣列；更新時當日特徵只寫入新增或修改的交易日，
+    分段分類與籌碼只在來源檔變動時整組重算，否則只為新交易日計算
+    """
+
+    def __init__(self, folder='.', workbook=None, segment_file=None):
+        self.folder = folder
+        self.workbook = workbook or os.path.join(folder, SMART_MONEY_WORKBOOK)
+        self.segment_path = segment_file or os.path.join(folder, SEGMENT_FILE)
+        self.dates = np.empty(0, dtype='U8')
+        self.mtimes = np.empty(0, dtype='float64')
+        self.columns = {}       # 欄位 → 陣列
+        self.groups = {group: [] for group in GROUPS}
+        self.signatures = {}
+        self._frame = None
+        panel_path = os.path.join(folder, FEATURE_PANEL)
+        if not os.path.exists(panel_path):
+            return
+        try:
+            with np.load(panel_path) as saved:
+                meta = json.loads(str(saved['meta']))
+                self.dates, self.mtimes = saved['dates'], saved['mtimes']
+                self.groups, self.signatures = meta['groups'], meta['signatures']
+                self.columns = {name: saved[f"c{i}"] for i, name in enumerate(meta['columns'])}
+        except Exception as e:
+            print(f"特徵表損壞，重新建立: {e}")
+            self.dates, self.mtimes = np.empty(0, dtype='U8'), np.empty(0, dtype='float64')
+            self.columns, self.groups, self.signatures = {}, {group: [] for group in GROUPS}, {}
+
+    def save(self):
+        names = list(self.columns)
+        meta = {'columns': names, 'groups': self.groups, 'signatures': self.signatures}
+        with atomic_path(os.path.join(self.folder, FEATURE_PANEL)) as temp_path:
+            np.savez(temp_path, dates=self.dates, mtimes=self.mtimes,
+                     meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                     **{f"c{i}": self.columns[name] for i, name in enumerate(names)})
+
+    def _set_group(self, group, columns, rows=None):
+        """
+        寫入一組欄位
+        :param rows: ndarray, 只更新這些列（其餘列保留原值，新欄位的其餘列為缺值）；None時整組取代
+        """
+        if rows is None:
+            for name in self.groups[group]:
+                self.columns.pop(name, None)
+            self.columns.update(columns)
+            self.groups[group] = list(columns)
+            return
+        for name, values in columns.items():
+            is_text = values.dtype.kind == 'U'
+            column = self.columns.get(name)
+            if column is None:
+                column = np.full(len(self.dates), '' if is_text else np.nan,
+                                 dtype=values.dtype if is_text else 'float64')
+            elif is_text and values.dtype.itemsize > column.dtype.itemsize:
+                # 字串欄的寬度不足時放寬，避免截斷
+                column = column.astype(values.dtype)
+            column[rows] = values
+            self.columns[name] = column
+        self.groups[group] = list(dict.fromkeys(self.groups[group] + list(columns)))
+
+    def update(self, archive=None, verbose=True):
+        """
+        依目前的K線、分段分類檔與籌碼工作簿更新特徵表並寫回
+        :param archive: dict, Similarity.load_archive的結果，None時自動讀取
+        :return: int, 新增或重算的交易日數
+        """
+        if archive is None:
+            archive = load_archive(self.folder)
+        new_dates, new_mtimes = archive['dates'], archive['mtimes']
+
+        # 交易日對齊：沿用既有列，已不存在的交易日移除，新交易日補在後面再依日期排序
+        old_rows = {d: i for i, d in enumerate(self.dates.tolist())}
+        source = np.array([old_rows.get(d, -1) for d in new_dates.tolist()], dtype=int)
+        kept = source >= 0
+        previous = self.mtimes[np.where(kept, source, 0)] if len(self.mtimes) else np.zeros(len(new_dates))
+        changed = ~kept | (previous != new_mtimes)
+        fresh = np.flatnonzero(~kept)
+        modified = bool(changed.any()) or int(kept.sum()) != len(self.dates)
+        for name, values in self.columns.items():
+            column = np.full(len(new_dates), '' if values.dtype.kind == 'U' else np.nan, dtype=values.dtype)
+            column[kept] = values[source[kept]]
+            self.columns[name] = column
+        self.dates, self.mtimes = new_dates.copy(), new_mtimes.copy()
+        self._frame = None
+
+        # 當日特徵：只寫入新增或修改的交易日
+        dirty = np.flatnonzero(changed)
+        if len(dirty):
+            features = archive['features'][dirty]
+            self._set_group('features', {key: features[:, k].astype('float64')
+                                         for k, key in enumerate(FEATURE_KEYS)}, dirty)
+
+        # 分段分類與籌碼：來源變動時整組重算，否則只計算新交易日
+        loaders = {'segments': (self.segment_path, lambda dates: segment_columns(self.segment_path, dates)),
+                   'smartmoney': (self.workbook,
+                                  lambda dates: smart_money_columns(load_smart_money(self.workbook), dates))}
+        for group, (path, compute) in loaders.items():
+            signature = file_signature(path)
+            if signature is None:
+                modified = modified or group in self.signatures
+                self._set_group(group, {})
+                self.signatures.pop(group, None)
+                continue
+            if signature != self.signatures.get(group):
+                self._set_group(group, compute(self.dates.tolist()))
+                modified = True
+            elif len(fresh):
+                self._set_group(group, compute(self.dates[fresh].tolist()), fresh)
+            self.signatures[group] = signature
+        if not modified:
+            return 0
+
+        order = np.argsort(self.dates, kind='stable')
+        if np.any(order != np.arange(len(order))):
+            self.dates, self.mtimes = self.dates[order], self.mtimes[order]
+            self.columns = {name: values[order] for name, values in self.columns.items()}
+        self.save()
+        if verbose and len(dirty):
+            print(f"特徵表已更新 {len(dirty)} 個交易日（共 {len(self.dates)} 日，{len(self.columns)} 欄）")
+        return len(dirty)
+
+    def frame(self):
+        """整張特徵表（DataFrame，index為交易日YYYYMMDD）"""
+        if self._frame is None:
+            self._frame = pd.DataFrame(self.columns, index=pd.Index(self.dates.tolist(), name='date'))
+        return self._frame
+
+    def select(self, expr):
+        """
+        以DataFrame.query條件篩選交易日，例如 "inst_外資 > 0 and first_trade_class == 'Up'"
+        欄名含括號等符號時以反引號括住，例如 `inst_自營商(避險)` < 0
+        :return: list, 符合條件的交易日(YYYYMMDD)
+        """
+        return self.frame().query(expr).index.tolist()
+
+def update_feature_panel(folder='.', archive=None):
+    """匯入新交易日或更新分段分類、籌碼資料後呼叫：增量更新特徵表"""
+    return FeaturePanel(folder).update(archive)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='建立（增量更新）結合當日特徵、分段分類與前一日籌碼的特徵表')
+    parser.add_argument('--folder', default='.', help='資料存放目錄')
+    parser.add_argument('--workbook', help=f'籌碼工作簿（預設為資料目錄中的{SMART_MONEY_WORKBOOK}）')
+    parser.add_argument('--segments', help=f'分段分類檔（預設為資料目錄中的{SEGMENT_FILE}）')
+    parser.add_argument('--where', help='篩選條件（pandas query語法），列出符合的交易日')
+    parser.add_argument('--columns', action='store_true', help='列出所有欄位')
+    args = parser.parse_args()
+
+    panel = FeaturePanel(args.folder, args.workbook, args.segments)
+    updated = panel.update()
+    print(f"特徵表: {len(panel.dates)} 個交易日、{len(panel.columns)} 欄，本次更新 {updated} 個交易日")
+    if args.columns:
+        for group in GROUPS:
+            print(f"{group}: {', '.join(panel.groups[group]) or '（無）'}")
+    if args.where:
+        try:
+            dates = panel.select(args.where)
+        except Exception as e:
+            print(f"篩選條件錯誤：{e}")
+            sys.exit(1)
+        print(f"符合條件的交易日 {len(dates)} 個：{', '.join(dates)}")
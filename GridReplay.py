@@ -0,0 +1,234 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import pyqtgraph as pg
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget,
+                             QPushButton, QLabel, QSpinBox, QComboBox, QMessageBox)
+from PyQt5.QtCore import QTimer
+
+from DataLoader import load_day, day_path, build_bar_state
+from PGChart import CandleItem
+
+PROBABILITY_FILE = 'segment_probability_analysis.csv'
+GRID_COLUMNS = 3
+DEFAULT_DAYS = 9
+
+def load_combinations(prob_path=PROBABILITY_FILE):
+    """
+    讀取分段組合與其日期
+    :return: DataFrame, 欄位combination/count/dates(list)，依count由大到小
+    """
+    df = pd.read_csv(prob_path, usecols=['combination', 'count', 'date_list'], dtype={'date_list': str})
+    df['dates'] = df['date_list'].fillna('').str.split(',').apply(
+        lambda items: [d.strip() for d in items if d.strip()])
+    return df.drop(columns=['date_list']).sort_values('count', ascending=False).reset_index(drop=True)
+
+class DayPanel:
+    """
+    格狀回放中的單日圖表
+    依共同的開盤後分鐘數決定顯示到第幾根K棒，K線沿用PGChart的區塊快取，只重繪新增的部分
+    """
+
+    def __init__(self, plot, date_str, df):
+        self.plot = plot
+        self.date_str = date_str
+        self.state = build_bar_state(df)
+        self.minutes = self.state['session_minutes']
+        self.open_price = float(df['Open'].iloc[0]) if len(df) else np.nan
+        self.start_minute = df.index[0].hour * 60 + df.index[0].minute if len(df) else 0
+        self.count = 0
+        self.y_range = None
+
+        self.candles = CandleItem()
+        self.candles.set_data(df[['Open', 'High', 'Low', 'Close']].to_numpy(dtype='float64'))
+        plot.addItem(self.candles)
+        self.average_line = plot.plot(pen=pg.mkPen('purple', width=1))
+        plot.setXRange(-1, max(len(df), 1), padding=0)
+        plot.setMouseEnabled(x=False, y=False)
+        plot.hideButtons()
+        plot.setTitle(date_str, size='9pt')
+
+    def show_minute(self, offset):
+        """顯示開盤後offset分鐘（含）以前的K棒；數量不變時不做任何事"""
+        count = int(np.searchsorted(self.minutes, offset, side='right'))
+        if count == self.count:
+            return
+        self.count = count
+        self.candles.set_count(count)
+        self.average_line.setData(np.arange(count), self.state['average'][:count], connect='finite')
+        if count == 0:
+            self.plot.setTitle(self.date_str, size='9pt')
+            return
+        i = count - 1
+        # y軸只依已出現的K棒縮放，不洩漏之後的高低點
+        # 高低點沒變時不重設範圍，避免座標軸每步重算刻度
+        y_range = (self.state['running_low'][i], self.state['running_high'][i])
+        if y_range != self.y_range:
+            self.y_range = y_range
+            low, high = y_range
+            padding = max((high - low) * 0.05, 1.0)
+            self.plot.setYRange(low - padding, high + padding, padding=0)
+        close = self.state['close'][i]
+        change = close - self.open_price
+        color = 'red' if change >= 0 else 'green'
+        self.plot.setTitle(f'{self.date_str}  {close:.0f} '
+                           f'<span style="color:{color}">({change:+.0f})</span>', size='9pt')
+
+class GridReplayWindow(QMainWindow):
+    """
+    多日同步回放：同一分段組合的多個交易日依開盤後分鐘數對齊，由單一計時器同步推進
+    所有日期畫在同一個GraphicsLayoutWidget中，每步只追加各圖新出現的K棒
+    """
+
+    def __init__(self, data_folder='.', prob_path=PROBABILITY_FILE, max_days=DEFAULT_DAYS,
+                 columns=GRID_COLUMNS, speed=500):
+        super().__init__()
+        self.setWindowTitle('多日同步回放')
+        self.setGeometry(100, 100, 1400, 1000)
+        self.data_folder = data_folder
+        self.max_days = max_days
+        self.columns = columns
+        self.speed = speed
+        self.panels = []
+        self.offset = -1  # 目前的開盤後分鐘數
+        self.last_offset = 0
+
+        try:
+            self.combinations = load_combinations(prob_path)
+        except Exception as e:
+            self.combinations = pd.DataFrame(columns=['combination', 'count', 'dates'])
+            print(f"讀取 {prob_path} 時發生錯誤: {e}")
+
+        self.init_ui()
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.next_step)
+
+    def init_ui(self):
+        main_widget = QWidget()
+        main_layout = QVBoxLayout()
+        control_layout = QHBoxLayout()
+
+        self.combination_box = QComboBox()
+        for _, row in self.combinations.iterrows():
+            self.combination_box.addItem(f"{row['combination']} ({row['count']})", row['combination'])
+
+        self.load_btn = QPushButton('載入')
+        self.load_btn.clicked.connect(self.load_selected)
+
+        self.days_spinbox = QSpinBox()
+        self.days_spinbox.setRange(1, 16)
+        self.days_spinbox.setValue(self.max_days)
+        self.days_spinbox.valueChanged.connect(lambda value: setattr(self, 'max_days', value))
+
+        self.play_btn = QPushButton('開始')
+        self.play_btn.clicked.connect(self.toggle_play)
+        self.step_btn = QPushButton('下一步')
+        self.step_btn.clicked.connect(self.next_step)
+
+        self.speed_spinbox = QSpinBox()
+        self.speed_spinbox.setRange(20, 5000)
+        self.speed_spinbox.setSingleStep(50)
+        self.speed_spinbox.setValue(self.speed)
+        self.speed_spinbox.valueChanged.connect(self.update_speed)
+
+        self.time_label = QLabel('--:--')
+
+        control_layout.addWidget(QLabel('分段組合:'))
+        control_layout.addWidget(self.combination_box, 1)
+        control_layout.addWidget(QLabel('天數:'))
+        control_layout.addWidget(self.days_spinbox)
+        control_layout.addWidget(self.load_btn)
+        control_layout.addWidget(self.play_btn)
+        control_layout.addWidget(self.step_btn)
+        control_layout.addWidget(QLabel('速度(ms):'))
+        control_layout.addWidget(self.speed_spinbox)
+        control_layout.addWidget(self.time_label)
+
+        self.grid = pg.GraphicsLayoutWidget()
+        self.grid.setBackground('w')
+
+        main_layout.addLayout(control_layout)
+        main_layout.addWidget(self.grid)
+        main_widget.setLayout(main_layout)
+        self.setCentralWidget(main_widget)
+
+    def load_selected(self):
+        combination = self.combination_box.currentData()
+        if combination is not None:
+            self.load_combination(combination)
+
+    def load_combination(self, combination):
+        """載入分段組合的前max_days個（有資料的）交易日"""
+        rows = self.combinations[self.combinations['combination'] == combination]
+        if rows.empty:
+            QMessageBox.warning(self, '找不到組合', f'找不到分段組合: {combination}')
+            return
+        dates = [d for d in rows['dates'].iloc[0]
+                 if os.path.exists(day_path(d, self.data_folder))][:self.max_days]
+        index = self.combination_box.findData(combination)
+        if index >= 0:
+            self.combination_box.setCurrentIndex(index)
+        self.load_days(dates)
+
+    def load_days(self, dates):
+        self.timer.stop()
+        self.play_btn.setText('開始')
+        self.grid.clear()
+        self.panels = []
+        for n, date_str in enumerate(dates):
+            try:
+                df = load_day(day_path(date_str, self.data_folder))
+            except Exception as e:
+                print(f"載入失敗 TX_{date_str}_1K.csv: {str(e)}")
+                continue
+            plot = self.grid.addPlot(row=n // self.columns, col=n % self.columns)
+            plot.showGrid(x=True, y=True, alpha=0.2)
+            self.panels.append(DayPanel(plot, date_str, df))
+        self.last_offset = max((int(p.minutes[-1]) for p in self.panels if len(p.minutes)), default=0)
+        self.offset = -1
+        self.time_label.setText('--:--')
+
+    def update_speed(self, value):
+        self.speed = value
+        if self.timer.isActive():
+            self.timer.setInterval(value)
+
+    def toggle_play(self):
+        if not self.panels:
+            return
+        if self.timer.isActive():
+            self.timer.stop()
+            self.play_btn.setText('開始')
+        else:
+            self.timer.start(self.speed)
+            self.play_btn.setText('暫停')
+
+    def next_step(self):
+        """所有日期同步前進一分鐘"""
+        if not self.panels or self.offset >= self.last_offset:
+            self.timer.stop()
+            self.play_btn.setText('開始')
+            return
+        self.offset += 1
+        for panel in self.panels:
+            panel.show_minute(self.offset)
+        minute = (self.panels[0].start_minute + self.offset) % 1440
+        self.time_label.setText(f"{minute // 60:02d}:{minute % 60:02d} (開盤後 {self.offset + 1} 分鐘)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='同一分段組合的多個交易日同步回放')
+    parser.add_argument('--combination', help='分段組合，例如 High_Up_High_Up_High_Up_H_Nl')
+    parser.add_argument('--folder', default='.', help='資料存放目錄')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='同時回放的天數')
+    parser.add_argument('--columns', type=int, default=GRID_COLUMNS, help='每列的圖表數')
+    parser.add_argument('--speed', type=int, default=500, help='播放速度(毫秒)')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    window = GridReplayWindow(args.folder, max_days=args.days, columns=args.columns, speed=args.speed)
+    if args.combination:
+        window.load_combination(args.combination)
+    window.show()
+    sys.exit(app.exec_())
@@ -25,13 +25,22 @@ def split_csv_by_date(input_file):
         output_df = group[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']]
         
         # 保存到CSV，保持所有原始格式不變
-        output_df.to_csv(output_filename, index=False)
+        content = output_df.to_csv(index=False)
+        # 內容相同時不重寫，保留修改時間，相似度快取與索引才不會重新讀取每個交易日
+        unchanged = False
+        if os.path.exists(output_filename):
+            with open(output_filename, 'r', encoding='utf-8') as f:
+                unchanged = f.read() == content
+        if not unchanged:
+            with open(output_filename, 'w', encoding='utf-8') as f:
+                f.write(content)
         
         # 檢查行數是否為300行（不含標題行）
-        with open(output_filename, 'r', encoding='utf-8') as f:
-            line_count = sum(1 for line in f) - 1  # 減去標題行
+        line_count = content.count('\n') - 1  # 減去標題行
         
-        if line_count == 300:
+        if unchanged:
+            print(f"檔案未變更: {output_filename}")
+        elif line_count == 300:
             print(f"已創建檔案: {output_filename} (行數正確: 300行)")
         else:
             print(f"警告: {output_filename} 行數不正確 (實際: {line_count}行, 預期: 300行)")
@@ -46,4 +55,11 @@ if __name__ == "__main__":
     input_file = os.path.join(download_folder, "TX00_台指近_分鐘線.csv")
 
     split_csv_by_date(input_file)
-    print("檔案分割完成！")
\ No newline at end of file
+    print("檔案分割完成！")
+
+    # 分割出的交易日加入相似交易日索引（失敗不影響分割結果）
+    try:
+        from SimilarityIndex import update_similarity_index
+        update_similarity_index('.')
+    except Exception as e:
+        print(f"更新相似度索引時發生錯誤: {e}")
\ No newline at end of file
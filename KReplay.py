@@ -1,21 +1,68 @@
+import os
 import sys
-import pandas as pd
-import numpy as np
+import importlib
+from collections import deque
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QWidget, 
                              QPushButton, QHBoxLayout, QFileDialog, QLabel, 
-                             QTextEdit, QSplitter, QMessageBox, QSpinBox)
-from PyQt5.QtCore import QTimer, Qt
-import mplfinance as mpf
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import matplotlib.dates as mdates
+                             QPlainTextEdit, QSplitter, QMessageBox, QSpinBox,
+                             QSlider, QTimeEdit, QCheckBox)
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal
 from datetime import datetime
-import matplotlib.pyplot as plt
+from ReplayJournal import ReplayJournal, SEGMENT_FILE
+from Startup import mark, run_in_background, profiling, handle_profile_flag
 
+# pandas/numpy/matplotlib/mplfinance及依賴它們的模組由load_heavy_modules載入，
+# 視窗先顯示，再於背景執行緒完成載入（見KLinePlayer.start_background_init）
+pd = np = mpf = mdates = Figure = FigureCanvas = None
+default_ingest = BAR_COLUMNS = read_raw_ticks = raw_csv_path = None
+load_day = capabilities = plot_frame = build_bar_state = build_overview = overview_upto = None
+build_tick_path = None
+
+# 交易記錄視窗最多保留的行數，完整內容寫入練習紀錄
+LOG_CAPACITY = 1000
+# 交易記錄每隔多久（毫秒）合併寫入一次，約一個畫面
+LOG_FLUSH_MS = 16
+# 交易結果在視窗中只列出最近幾筆，完整清單見匯出
+RESULT_TRADES_SHOWN = 20
+# 逐筆模式預設每根K棒的分段數
+TICK_STEPS = 10
+
+def load_heavy_modules(backend='matplotlib'):
+    """載入繪圖與資料處理模組並設為本模組的全域名稱，重複呼叫不會重新載入"""
+    global pd, np, mpf, mdates, Figure, FigureCanvas, default_ingest, BAR_COLUMNS
+    global read_raw_ticks, raw_csv_path
+    global load_day, capabilities, plot_frame, build_bar_state, build_overview, overview_upto
+    global build_tick_path
+    import pandas as pd
+    import numpy as np
+    import mplfinance as mpf
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+    from LiveIngest import default_ingest, BAR_COLUMNS
+    from NewData import read_raw_ticks, raw_csv_path
+    from DataLoader import (load_day, capabilities, plot_frame, build_bar_state,
+                            build_overview, overview_upto, build_tick_path)
+    if backend == 'pyqtgraph':
+        importlib.import_module('PGChart')  # 預先載入pyqtgraph，建立圖表時不再等待
 
 class KLinePlayer(QMainWindow):
-    def __init__(self):
+    # 即時匯入執行緒送來的K棒，經由signal轉到GUI執行緒處理
+    live_bar_received = pyqtSignal(object, bool)
+    # 背景初始化完成（參數為錯誤，成功時為None）
+    startup_finished = pyqtSignal(object)
+
+    def __init__(self, backend='matplotlib', log_capacity=LOG_CAPACITY, background_init=False):
+        """
+        :param background_init: bool, True時先顯示視窗，較重的模組在背景載入完成後才建立圖表；
+                                False時於建構時同步載入（供其他程式直接使用）
+        """
         super().__init__()
+        self.log_capacity = log_capacity
+        self._log_pending = []  # 尚未顯示的交易記錄
+        self.backend = backend  # 'matplotlib' 或 'pyqtgraph'
+        self.pg_chart = None
+        self.chart_ready = False
         self.setWindowTitle('股票K線模擬交易訓練軟體 (含強度指標)')
         self.setGeometry(100, 100, 1200, 1000)  # 增加高度以容納新指標
         
@@ -27,12 +74,52 @@ class KLinePlayer(QMainWindow):
         self.has_strength = False  # 是否有強度指標
         self.has_largeorder = False  # 是否有強度指標
         self.has_score = False  # 是否有分數指標
+        self.live_ingest = None  # 即時模式的匯入程序
+        self.bar_state = None  # 每根K棒的累計狀態（build_bar_state）
+        self.overview = None  # 整日降採樣OHLC（build_overview）
+        self.viewport_bars = 0  # 只顯示最後N根K棒，0表示全部
+        self.show_overview = False  # 是否顯示總覽列
+        self.ax_overview = None
+        # 逐筆模式：每根K棒分成tick_steps段播放，下單以當下路徑價格成交
+        self.tick_mode = False
+        self.tick_steps = TICK_STEPS
+        self.tick_path = None  # 整日K棒內價格路徑（build_tick_path）
+        self.raw_ticks = None  # 群益RAW逐筆成交，載入後快取
+        self.sub_step = None  # 形成中K棒（第current_idx根）目前的分段，None表示已完成
         
         # 交易相關變量
         self.trades = []
-        self.positions = []
         self.trade_history = []
+        # 持倉與權益狀態需要numpy，於finish_startup中初始化
         
+        # 練習紀錄（SQLite，背景批次寫入）
+        self.journal = ReplayJournal()
+        self.journal.start()
+        self.session_id = None
+        self.session_date = None
+        self.source_path = None
+        
+        self.init_ui()
+        self.live_bar_received.connect(self.on_live_bar)
+        self.startup_finished.connect(self.finish_startup)
+        if background_init:
+            # 等事件迴圈開始（視窗已顯示）後才開始載入
+            QTimer.singleShot(0, self.start_background_init)
+        else:
+            load_heavy_modules(self.backend)
+            self.finish_startup(None)
+
+    def start_background_init(self):
+        mark('first_window')
+        run_in_background(lambda: load_heavy_modules(self.backend),
+                          lambda result, error: self.startup_finished.emit(error))
+
+    def finish_startup(self, error):
+        """模組載入完成後（GUI執行緒）建立圖表與樣式，並啟用載入按鈕"""
+        if error is not None:
+            self.chart_placeholder.setText(f"載入繪圖模組失敗: {error}")
+            self.log_trade(f"\n[啟動錯誤] {str(error)}")
+            return
         # 自定義樣式
         self.style = mpf.make_marketcolors(
             up='red', down='green',
@@ -42,8 +129,32 @@ class KLinePlayer(QMainWindow):
             ohlc='i'
         )
         self.mp_style = mpf.make_mpf_style(marketcolors=self.style)
+        self.reset_pnl_state()
         
-        self.init_ui()
+        chart_widget = self.create_chart_widget()
+        self.top_layout.replaceWidget(self.chart_placeholder, chart_widget)
+        self.chart_placeholder.deleteLater()
+        self.chart_ready = True
+        self.load_btn.setEnabled(True)
+        self.live_btn.setEnabled(True)
+        self.calc_avg_btn.setEnabled(True)
+        mark('ready')
+        if profiling():
+            QTimer.singleShot(0, self.close)
+
+    def create_chart_widget(self):
+        # K線圖區域 - 增加一個軸用於顯示強度指標
+        if self.backend == 'pyqtgraph':
+            # pyqtgraph後端：預先配置圖形項目，播放時只追加K棒
+            from PGChart import PGChartWidget
+            self.pg_chart = PGChartWidget()
+            self.pg_chart.set_viewport(self.viewport_bars)
+            self.pg_chart.set_overview_visible(self.show_overview)
+            return self.pg_chart
+        self.figure = Figure(figsize=(12, 8))
+        self.canvas = FigureCanvas(self.figure)
+        self.build_axes()
+        return self.canvas
         
     def init_ui(self):
         main_widget = QWidget()
@@ -59,16 +170,27 @@ class KLinePlayer(QMainWindow):
         control_panel = QWidget()
         control_layout = QHBoxLayout()
         
+        # 以下三個按鈕在繪圖模組載入完成後才啟用
         self.load_btn = QPushButton('載入K線數據')
         self.load_btn.clicked.connect(self.load_data)
+        self.load_btn.setEnabled(False)
+        
+        self.live_btn = QPushButton('即時模式')
+        self.live_btn.clicked.connect(self.toggle_live_mode)
+        self.live_btn.setEnabled(False)
         
         self.calc_avg_btn = QPushButton('計算均價')
         self.calc_avg_btn.clicked.connect(self.calculate_average_price)
+        self.calc_avg_btn.setEnabled(False)
         
         self.play_btn = QPushButton('開始')
         self.play_btn.clicked.connect(self.toggle_play)
         self.play_btn.setEnabled(False)
         
+        self.back_btn = QPushButton('上一步')
+        self.back_btn.clicked.connect(self.step_back)
+        self.back_btn.setEnabled(False)
+        
         self.step_btn = QPushButton('下一步')
         self.step_btn.clicked.connect(self.next_step)
         self.step_btn.setEnabled(False)
@@ -85,6 +207,12 @@ class KLinePlayer(QMainWindow):
         self.result_btn.clicked.connect(self.show_results)
         self.result_btn.setEnabled(False)
         
+        self.stats_btn = QPushButton('練習統計')
+        self.stats_btn.clicked.connect(self.show_journal_stats)
+        
+        self.export_btn = QPushButton('匯出記錄')
+        self.export_btn.clicked.connect(self.export_log)
+        
         # 速度調整控制
         self.speed_label = QLabel('速度(ms):')
         self.speed_spinbox = QSpinBox()
@@ -93,39 +221,103 @@ class KLinePlayer(QMainWindow):
         self.speed_spinbox.setSingleStep(100)  # 每次增減100毫秒
         self.speed_spinbox.valueChanged.connect(self.update_speed)
         
+        # 視窗模式：只繪製最後N根K棒，繪圖成本與交易時段長度無關
+        self.viewport_label = QLabel('視窗K棒:')
+        self.viewport_spinbox = QSpinBox()
+        self.viewport_spinbox.setRange(0, 5000)
+        self.viewport_spinbox.setSingleStep(30)
+        self.viewport_spinbox.setSpecialValueText('全部')
+        self.viewport_spinbox.setValue(self.viewport_bars)
+        self.viewport_spinbox.valueChanged.connect(self.update_viewport)
+        
+        self.overview_check = QCheckBox('總覽')
+        self.overview_check.toggled.connect(self.toggle_overview)
+        
         control_layout.addWidget(self.load_btn)
+        control_layout.addWidget(self.live_btn)
         control_layout.addWidget(self.calc_avg_btn)
         control_layout.addWidget(self.play_btn)
+        control_layout.addWidget(self.back_btn)
         control_layout.addWidget(self.step_btn)
         control_layout.addWidget(self.buy_btn)
         control_layout.addWidget(self.sell_btn)
         control_layout.addWidget(self.result_btn)
+        control_layout.addWidget(self.stats_btn)
+        control_layout.addWidget(self.export_btn)
         control_layout.addWidget(self.speed_label)
         control_layout.addWidget(self.speed_spinbox)
+        control_layout.addWidget(self.viewport_label)
+        control_layout.addWidget(self.viewport_spinbox)
+        control_layout.addWidget(self.overview_check)
         control_layout.addStretch()
         
         control_panel.setLayout(control_layout)
         
-        # K線圖區域 - 增加一個軸用於顯示強度指標
-        self.figure = Figure(figsize=(12, 8))
-        self.canvas = FigureCanvas(self.figure)
+        # 時間軸：拖曳預覽時間，放開後跳至該K棒；或直接輸入時間跳轉
+        seek_panel = QWidget()
+        seek_layout = QHBoxLayout()
+        seek_layout.setContentsMargins(0, 0, 0, 0)
         
-        # 創建子圖佈局 (K線:成交量:指標1:指標2:指標3)
-        self.ax1 = self.figure.add_subplot(8, 1, (1, 4))  # K線圖
-        self.ax2 = self.figure.add_subplot(8, 1, 5, sharex=self.ax1)  # 成交量
-        self.ax3 = self.figure.add_subplot(8, 1, 6, sharex=self.ax1)  # 強度指標
-        self.ax4 = self.figure.add_subplot(8, 1, 7, sharex=self.ax1)  # 大單指標
-        self.ax5 = self.figure.add_subplot(8, 1, 8, sharex=self.ax1)  # 分數指標
+        self.timeline_slider = QSlider(Qt.Horizontal)
+        self.timeline_slider.setRange(0, 0)
+        self.timeline_slider.valueChanged.connect(self.on_timeline_changed)
+        self.timeline_slider.sliderReleased.connect(self.on_timeline_released)
+        self.timeline_slider.setEnabled(False)
+        
+        self.timeline_label = QLabel('--:--')
+        self.timeline_label.setMinimumWidth(130)
+        
+        self.jump_time_edit = QTimeEdit()
+        self.jump_time_edit.setDisplayFormat('HH:mm')
+        self.jump_time_edit.setEnabled(False)
+        
+        self.jump_btn = QPushButton('跳至')
+        self.jump_btn.clicked.connect(self.jump_to_time)
+        self.jump_btn.setEnabled(False)
+        
+        # 逐筆模式：K棒內依價格路徑逐段形成
+        self.tick_check = QCheckBox('逐筆')
+        self.tick_check.toggled.connect(self.toggle_tick_mode)
+        self.tick_steps_label = QLabel('每根分段:')
+        self.tick_steps_spinbox = QSpinBox()
+        self.tick_steps_spinbox.setRange(2, 60)
+        self.tick_steps_spinbox.setValue(self.tick_steps)
+        self.tick_steps_spinbox.valueChanged.connect(self.update_tick_steps)
+        
+        seek_layout.addWidget(self.timeline_slider, 1)
+        seek_layout.addWidget(self.timeline_label)
+        seek_layout.addWidget(self.jump_time_edit)
+        seek_layout.addWidget(self.jump_btn)
+        seek_layout.addWidget(self.tick_check)
+        seek_layout.addWidget(self.tick_steps_label)
+        seek_layout.addWidget(self.tick_steps_spinbox)
+        seek_panel.setLayout(seek_layout)
+        
+        # 圖表在模組載入完成後由finish_startup替換
+        self.chart_placeholder = QLabel('載入繪圖模組中...')
+        self.chart_placeholder.setAlignment(Qt.AlignCenter)
         
         # 添加到上部佈局
         top_layout.addWidget(control_panel)
-        top_layout.addWidget(self.canvas)
+        top_layout.addWidget(seek_panel)
+        
+        # 即時損益（持倉、未實現/已實現、MAE/MFE）
+        self.pnl_label = QLabel('')
+        top_layout.addWidget(self.pnl_label)
+        top_layout.addWidget(self.chart_placeholder)
         top_widget.setLayout(top_layout)
+        self.top_layout = top_layout
         
         # 下部份
-        self.trade_log = QTextEdit()
+        # 交易記錄：超過容量時自動捨棄最舊的行
+        self.trade_log = QPlainTextEdit()
         self.trade_log.setReadOnly(True)
+        self.trade_log.setMaximumBlockCount(self.log_capacity)
         self.trade_log.setPlaceholderText('交易記錄將顯示在這裡...')
+        self.log_flush_timer = QTimer()
+        self.log_flush_timer.setSingleShot(True)
+        self.log_flush_timer.setInterval(LOG_FLUSH_MS)
+        self.log_flush_timer.timeout.connect(self.flush_log)
         
         splitter.addWidget(top_widget)
         splitter.addWidget(self.trade_log)
@@ -138,11 +330,49 @@ class KLinePlayer(QMainWindow):
         self.timer = QTimer()
         self.timer.timeout.connect(self.next_step)
     
+    def build_axes(self):
+        """建立子圖佈局 (總覽:K線:成交量:指標1:指標2:指標3:權益)，未開啟總覽時不含總覽列"""
+        self.figure.clear()
+        rows, offset = (10, 1) if self.show_overview else (9, 0)
+        self.ax_overview = self.figure.add_subplot(rows, 1, 1) if self.show_overview else None
+        self.ax1 = self.figure.add_subplot(rows, 1, (1 + offset, 4 + offset))  # K線圖
+        self.ax2 = self.figure.add_subplot(rows, 1, 5 + offset, sharex=self.ax1)  # 成交量
+        self.ax3 = self.figure.add_subplot(rows, 1, 6 + offset, sharex=self.ax1)  # 強度指標
+        self.ax4 = self.figure.add_subplot(rows, 1, 7 + offset, sharex=self.ax1)  # 大單指標
+        self.ax5 = self.figure.add_subplot(rows, 1, 8 + offset, sharex=self.ax1)  # 分數指標
+        self.ax_equity = self.figure.add_subplot(rows, 1, 9 + offset, sharex=self.ax1)  # 權益曲線
+
+    def update_viewport(self, value):
+        """更新視窗K棒數（0表示顯示全部）"""
+        self.viewport_bars = value
+        if not self.chart_ready:
+            return  # 圖表建立時套用
+        if self.pg_chart is not None:
+            self.pg_chart.set_viewport(value)
+        self.update_chart()
+
+    def toggle_overview(self, checked):
+        """顯示/隱藏整日總覽列"""
+        self.show_overview = checked
+        if not self.chart_ready:
+            return  # 圖表建立時套用
+        if self.pg_chart is not None:
+            self.pg_chart.set_overview_visible(checked)
+        else:
+            self.build_axes()
+        self.update_chart()
+
+    def viewport_start(self):
+        """目前視窗第一根K棒的位置"""
+        if self.viewport_bars:
+            return max(0, self.current_idx - self.viewport_bars)
+        return 0
+
     def update_speed(self, value):
         """更新播放速度"""
         self.speed = value
         if self.playing:
-            self.timer.setInterval(self.speed)
+            self.timer.setInterval(self.timer_interval())
         self.log_trade(f"播放速度已調整為: {self.speed}毫秒")
     
     def calculate_average_price(self):
@@ -154,16 +384,13 @@ class KLinePlayer(QMainWindow):
             return
             
         try:
-            # 讀取數據文件
-            df = pd.read_csv(file_path)
-            
-            # 檢查必要欄位
-            if 'Close' not in df.columns or 'Volume' not in df.columns:
-                raise ValueError("數據文件必須包含 Close 和 Volume 欄位")
+            # 讀取數據文件（缺少必要欄位時由load_day拋出錯誤）
+            df = load_day(file_path)
+            volume = df['Volume'].astype('float64')
             
             # 計算加權平均價
-            total_value = (df['Close'] * df['Volume']).sum()
-            total_volume = df['Volume'].sum()
+            total_value = (df['Close'].astype('float64') * volume).sum()
+            total_volume = volume.sum()
             
             if total_volume == 0:
                 raise ValueError("總成交量為0，無法計算均價")
@@ -173,7 +400,7 @@ class KLinePlayer(QMainWindow):
             # 获取Close列的最后一个值
             last_close = df['Close'].iloc[-1]
 
-            today = df['Date'].iloc[-1].split(' ')[0]
+            today = df.index[-1].strftime('%Y/%m/%d')
             
             # 計算最高價和最低價
             highest_price = df['Close'].max()
@@ -193,12 +420,12 @@ class KLinePlayer(QMainWindow):
             QMessageBox.critical(self, "計算錯誤", f"計算均價時發生錯誤: {str(e)}")
             self.log_trade(f"\n[均價計算錯誤] {str(e)}")
     
-    def update_price_labels(self, display_df):
-        """更新價格標籤"""
-        if len(display_df) > 0:
-            current_high = display_df['High'].max()
-            current_low = display_df['Low'].min()
-            current_close = display_df.iloc[-1]['Close']
+    def update_price_labels(self, count):
+        """更新價格標籤（前count根K棒，數值由bar_state以O(1)取得）"""
+        if count > 0:
+            i = count - 1
+            state = self.bar_state
+            current_high, current_low, current_close = self.current_range(count)
             
             # 清除舊標籤
             for artist in self.ax1.texts:
@@ -223,35 +450,35 @@ class KLinePlayer(QMainWindow):
             #              bbox=dict(facecolor='white', alpha=0.7))
 
             # 如果存在均價欄位，顯示最後均價
-            if 'Average' in display_df.columns:
-                current_avg = display_df.iloc[-1]['Average']
+            if 'Average' in self.df.columns:
+                current_avg = state['average'][i]
                 self.ax1.text(1.00, 0.60, f'Average: {current_avg:.2f}', 
                              transform=self.ax1.transAxes, color='purple',
                              bbox=dict(facecolor='white', alpha=0.7))
-                diff_avg = abs(current_close - display_df.iloc[-1]['Average'])
+                diff_avg = abs(current_close - current_avg)
                 self.ax1.text(1.00, 0.50, f'Diff_Avg: {diff_avg:.2f}', 
                              transform=self.ax1.transAxes, color='purple',
                              bbox=dict(facecolor='white', alpha=0.7))
             
             # 如果存在強度欄位，顯示最後強度
             if self.has_strength:
-                current_strength = display_df.iloc[-1]['strength']
+                current_strength = state['strength'][i]
                 # 根據正負值選擇顏色
-                strength_color = 'red' if current_strength >= 0 else 'green'
+                strength_color = state['strength_colors'][i]
                 self.ax1.text(1.00, 0.40, f'strength: {current_strength:.2f}', 
                              transform=self.ax1.transAxes, color=strength_color,
                              bbox=dict(facecolor='white', alpha=0.7))
             if self.has_largeorder:
-                current_largeorder = display_df.iloc[-1]['largeorder']
+                current_largeorder = state['largeorder'][i]
                 # 根據正負值選擇顏色
-                largeorder_color = 'red' if current_largeorder >= 0 else 'green'
+                largeorder_color = state['largeorder_colors'][i]
                 self.ax1.text(1.00, 0.30, f'largeorder: {current_largeorder:.2f}', 
                              transform=self.ax1.transAxes, color=largeorder_color,
                              bbox=dict(facecolor='white', alpha=0.7))
             if self.has_score:
-                current_score = display_df.iloc[-1]['score']
+                current_score = state['score'][i]
                 # 根據正負值選擇顏色
-                score_color = 'red' if current_score >= 0 else 'green'
+                score_color = state['score_colors'][i]
                 self.ax1.text(1.00, 0.20, f'score: {current_score:.2f}', 
                              transform=self.ax1.transAxes, color=score_color,
                              bbox=dict(facecolor='white', alpha=0.7))
@@ -263,70 +490,46 @@ class KLinePlayer(QMainWindow):
         
         if not file_path:
             return
+        
+        # 載入歷史檔案時結束即時模式
+        self.stop_live_mode()
             
         try:
-            # 讀取數據文件
-            if file_path.endswith('.csv'):
-                self.df = pd.read_csv(file_path, parse_dates=['Date'], index_col='Date')
-            else:
-                self.df = pd.read_excel(file_path, parse_dates=['Date'], index_col='Date')
-                
-            # 確保數據包含必要的列
-            required_cols = ['Open', 'High', 'Low', 'Close', 'Volume']
-            for col in required_cols:
-                if col not in self.df.columns:
-                    raise ValueError(f"數據文件中缺少必要的列: {col}")
+            # 讀取數據文件，統一欄位格式（缺少必要欄位時拋出錯誤）
+            loaded = load_day(file_path)
+            caps = capabilities(loaded)
+            self.df = plot_frame(loaded)
             
             # 檢查是否有Average欄位
-            if 'Average' not in self.df.columns:
+            if 'Average' in loaded.attrs.get('derived', []):
+                self.log_trade("數據文件中缺少Average欄位，已由成交量即時計算均價線")
+            elif not caps['average']:
                 self.log_trade("警告: 數據文件中缺少Average欄位，將無法繪製均價線")
             
             # 檢查是否有strength欄位
-            self.has_strength = 'strength' in self.df.columns
+            self.has_strength = caps['strength']
             if self.has_strength:
                 self.log_trade("數據文件中包含strength欄位，將繪製強度指標")
             else:
                 self.log_trade("警告: 數據文件中缺少strength欄位，將無法繪製強度指標")
 
             # 檢查是否有largeorder欄位
-            self.has_largeorder = 'largeorder' in self.df.columns
+            self.has_largeorder = caps['largeorder']
             if self.has_largeorder:
                 self.log_trade("數據文件中包含largeorder欄位，將繪製強度指標")
             else:
                 self.log_trade("警告: 數據文件中缺少largeorder欄位，將無法繪製強度指標")
 
             # 檢查是否有score欄位
-            self.has_score = 'score' in self.df.columns
+            self.has_score = caps['score']
             if self.has_score:
                 self.log_trade("數據文件中包含score欄位，將繪製分數指標")
             else:
                 self.log_trade("警告: 數據文件中缺少score欄位，將無法繪製分數指標")
 
             # 重置狀態
-            self.current_idx = 0
-            self.playing = False
-            self.timer.stop()
-            self.trades = []
-            self.positions = []
-            self.trade_history = []
-            self.trade_log.clear()
-            
-            # 完全重置圖表和子圖，避免狀態殘留
-            self.figure.clear()
-            self.ax1 = self.figure.add_subplot(8, 1, (1, 4))  # K線圖
-            self.ax2 = self.figure.add_subplot(8, 1, 5, sharex=self.ax1)  # 成交量
-            self.ax3 = self.figure.add_subplot(8, 1, 6, sharex=self.ax1)  # 強度指標
-            self.ax4 = self.figure.add_subplot(8, 1, 7, sharex=self.ax1)  # 大單指標
-            self.ax5 = self.figure.add_subplot(8, 1, 8, sharex=self.ax1)  # 分數指標
-            self.canvas.draw_idle()
-
-            # 啟用控制按鈕
-            self.play_btn.setEnabled(True)
-            self.step_btn.setEnabled(True)
-            self.buy_btn.setEnabled(True)
-            self.sell_btn.setEnabled(True)
-            self.result_btn.setEnabled(True)
-            self.play_btn.setText('開始')
+            self.source_path = file_path
+            self.reset_replay_state()
             
             # 顯示初始K線
             self.update_chart()
@@ -338,21 +541,188 @@ class KLinePlayer(QMainWindow):
             QMessageBox.critical(self, "載入錯誤", f"載入數據時發生錯誤: {str(e)}")
             self.log_trade(f"\n[載入錯誤] {str(e)}")
     
+    def reset_replay_state(self):
+        """重置播放、交易狀態與圖表，並開始新的練習紀錄"""
+        self.end_session()
+        self.current_idx = 0
+        self.playing = False
+        self.timer.stop()
+        self.trades = []
+        self.trade_history = []
+        self.trade_log.clear()
+        self._log_pending = []
+        self.bar_state = build_bar_state(self.df)
+        self.reset_pnl_state()
+        self.overview = build_overview(self.df)
+        self.sub_step = None
+        self.raw_ticks = None
+        self.load_tick_path()
+        
+        # 完全重置圖表和子圖，避免狀態殘留
+        if self.pg_chart is not None:
+            self.pg_chart.set_data(self.df, self.chart_capabilities(), self.bar_state, self.overview)
+        else:
+            self.build_axes()
+            self.canvas.draw_idle()
+
+        # 啟用控制按鈕
+        self.play_btn.setEnabled(True)
+        self.step_btn.setEnabled(True)
+        self.back_btn.setEnabled(True)
+        self.buy_btn.setEnabled(True)
+        self.sell_btn.setEnabled(True)
+        self.result_btn.setEnabled(True)
+        self.timeline_slider.setEnabled(True)
+        self.jump_time_edit.setEnabled(True)
+        self.jump_btn.setEnabled(True)
+        self.play_btn.setText('開始')
+        self.sync_timeline()
+        self.begin_session()
+
+    def begin_session(self):
+        if self.df is not None and not self.df.empty:
+            self.session_date = self.df.index[0].strftime('%Y%m%d')
+        else:
+            self.session_date = datetime.today().strftime('%Y%m%d')
+        self.session_id = self.journal.start_session(self.session_date, self.source_path,
+                                                     len(self.df), self.speed)
+
+    def end_session(self):
+        """寫入本次練習的結束時間與摘要"""
+        if self.session_id is None:
+            return
+        self.journal.end_session(self.session_id, self.current_idx, self.speed,
+                                 len(self.trades), self.realized_points)
+        self.session_id = None
+
+    def record_to_journal(self, trade, record=None):
+        """將使用者的下單（與平倉結果）送到練習紀錄"""
+        if self.session_id is None:
+            return
+        self.journal.record_trade(self.session_id, trade)
+        if record is not None:
+            self.journal.record_round_trip(self.session_id, self.session_date, record, trade['index'])
+
+    def show_journal_stats(self):
+        """以練習紀錄統計各分段組合與各時段的勝率"""
+        self.journal.flush()
+        try:
+            if self.journal.query('SELECT COUNT(*) AS n FROM segments')['n'][0] == 0:
+                if os.path.exists(SEGMENT_FILE):
+                    self.journal.import_segments(SEGMENT_FILE)
+            by_segment = self.journal.win_rate_by_segment()
+            by_time = self.journal.win_rate_by_time_of_day(30)
+        except Exception as e:
+            self.log_trade(f"[練習統計錯誤] {str(e)}")
+            return
+        result_text = "\n=== 練習統計（所有紀錄）===\n"
+        result_text += "依分段組合:\n"
+        result_text += (by_segment.head(20).to_string(index=False) if not by_segment.empty else "無資料") + "\n"
+        result_text += "\n依進場時段（30分鐘）:\n"
+        result_text += by_time.to_string(index=False) if not by_time.empty else "無資料"
+        self.log_trade(result_text)
+
+    def chart_capabilities(self):
+        """目前資料可繪製的指標"""
+        return {
+            'average': self.df is not None and not self.df['Average'].isna().all(),
+            'strength': self.has_strength,
+            'largeorder': self.has_largeorder,
+            'score': self.has_score,
+        }
+
+    def toggle_live_mode(self):
+        """開始/停止盤中即時模式"""
+        if self.live_ingest is None:
+            try:
+                self.start_live_mode(default_ingest())
+            except Exception as e:
+                QMessageBox.critical(self, "即時模式錯誤", f"啟動即時模式時發生錯誤: {str(e)}")
+                self.log_trade(f"\n[即時模式錯誤] {str(e)}")
+        else:
+            self.stop_live_mode()
+
+    def start_live_mode(self, ingest):
+        """訂閱LiveIngest，新K棒到達時自動追加並顯示"""
+        self.stop_live_mode()
+        self.df = pd.DataFrame(columns=BAR_COLUMNS[1:], dtype='float64',
+                               index=pd.DatetimeIndex([], name='Date'))
+        self.has_strength = self.has_largeorder = self.has_score = True
+        self.source_path = ingest.output_csv
+        self.reset_replay_state()
+        
+        self.live_ingest = ingest
+        ingest.subscribe(self._emit_live_bar)
+        ingest.start()
+        self.live_btn.setText('停止即時')
+        self.log_trade(f"即時模式已啟動: {ingest.output_csv}")
+
+    def stop_live_mode(self):
+        if self.live_ingest is None:
+            return
+        self.live_ingest.unsubscribe(self._emit_live_bar)
+        self.live_ingest.stop()
+        self.log_trade(f"即時模式已停止，資料已保存至: {self.live_ingest.output_csv}")
+        self.live_ingest = None
+        self.live_btn.setText('即時模式')
+        self.load_tick_path()
+
+    def _emit_live_bar(self, bar, is_update):
+        # 於匯入執行緒中呼叫，只負責轉送
+        self.live_bar_received.emit(bar, is_update)
+
+    def on_live_bar(self, bar, is_update):
+        """將即時K棒寫入self.df；若目前停在最後一根則跟隨顯示"""
+        timestamp = pd.to_datetime(bar['Date'])
+        values = [np.nan if bar[col] is None else bar[col] for col in BAR_COLUMNS[1:]]
+        following = self.current_idx >= len(self.df)
+        
+        if timestamp in self.df.index:
+            self.df.loc[timestamp, BAR_COLUMNS[1:]] = values
+        else:
+            new_row = pd.DataFrame([values], columns=BAR_COLUMNS[1:],
+                                   index=pd.DatetimeIndex([timestamp], name='Date'))
+            self.df = new_row if self.df.empty else pd.concat([self.df, new_row])
+        
+        self.bar_state = build_bar_state(self.df)
+        self.overview = build_overview(self.df)
+        if len(self.equity) < len(self.df):
+            self.equity = np.append(self.equity, np.full(len(self.df) - len(self.equity), np.nan))
+        if is_update and self.marked_idx >= len(self.df) - 1:
+            # 最後一根K棒被更新，重新計算其權益
+            self.marked_idx = len(self.df) - 2
+        if following:
+            self.mark_to_market(len(self.df) - 1)
+        if self.pg_chart is not None:
+            self.pg_chart.set_data(self.df, self.chart_capabilities(), self.bar_state, self.overview)
+        
+        if following:
+            self.current_idx = len(self.df)
+            self.update_chart()
+        elif self.pg_chart is not None:
+            self.update_chart()
+        self.sync_timeline()
+
     def toggle_play(self):
         if self.df is not None and not self.df.empty:
             self.playing = not self.playing
             if self.playing:
                 self.play_btn.setText('暫停')
-                self.timer.start(self.speed)
+                self.timer.start(self.timer_interval())
             else:
                 self.play_btn.setText('開始')
                 self.timer.stop()
             self.update_chart()
     
     def next_step(self):
+        if self.tick_active():
+            self.next_tick()
+            return
         if self.df is not None and self.current_idx < len(self.df):
             self.current_idx += 1
+            self.mark_to_market(self.current_idx - 1)
             self.update_chart()
+            self.sync_timeline()
             
             # 如果到達末尾，停止播放
             if self.current_idx >= len(self.df):
@@ -360,13 +730,233 @@ class KLinePlayer(QMainWindow):
                 self.play_btn.setText('開始')
                 self.timer.stop()
 
+    def tick_active(self):
+        """逐筆模式是否生效（即時模式下K棒隨時變動，不使用預先計算的路徑）"""
+        return self.tick_mode and self.tick_path is not None and self.live_ingest is None
+
+    def timer_interval(self):
+        """播放間隔：逐筆模式下一根K棒的分段平均分配播放速度"""
+        if self.tick_active():
+            return max(1, self.speed // self.tick_steps)
+        return self.speed
+
+    def toggle_tick_mode(self, checked):
+        """開啟/關閉逐筆模式；關閉時形成中的K棒直接走完"""
+        if not checked and self.sub_step is not None:
+            self.finish_forming_bar()
+        self.tick_mode = checked
+        self.load_tick_path()
+        if self.playing:
+            self.timer.setInterval(self.timer_interval())
+        self.update_chart()
+
+    def update_tick_steps(self, value):
+        if self.sub_step is not None:
+            self.finish_forming_bar()
+        self.tick_steps = value
+        self.load_tick_path()
+        if self.playing:
+            self.timer.setInterval(self.timer_interval())
+        self.update_chart()
+
+    def load_tick_path(self):
+        """逐筆模式下預先計算整日的K棒內價格路徑；有群益RAW逐筆成交時採用實際成交"""
+        if not self.tick_mode or self.df is None or self.df.empty:
+            self.tick_path = None
+            return
+        if self.raw_ticks is None:
+            folder = os.path.dirname(self.source_path or '')
+            self.raw_ticks = read_raw_ticks(raw_csv_path(self.df.index[0].strftime('%Y%m%d'), folder))
+        self.tick_path = build_tick_path(self.df, self.tick_steps, self.raw_ticks)
+        real = int(self.tick_path['real'].sum())
+        source = f"群益逐筆成交 {real}/{len(self.df)} 根，其餘以OHLC合成" if real else "以OHLC合成路徑"
+        self.log_trade(f"逐筆模式: 每根K棒 {self.tick_steps} 段，{source}")
+
+    def forming_bar(self):
+        """形成中K棒目前的(open, high, low, close)，沒有時回傳None"""
+        if self.sub_step is None or not self.tick_active():
+            return None
+        i, k = self.current_idx - 1, self.sub_step
+        path = self.tick_path
+        return (path['open'][i], path['high'][i, k], path['low'][i, k], path['price'][i, k])
+
+    def forming_price(self):
+        """形成中K棒目前的路徑價格（逐筆模式的成交價），沒有時回傳None"""
+        if self.sub_step is None or not self.tick_active():
+            return None
+        return self.tick_path['price'][self.current_idx - 1, self.sub_step]
+
+    def current_price(self, bar_idx):
+        """第bar_idx根K棒目前的價格：形成中的K棒為路徑價格，否則為收盤價"""
+        if bar_idx == self.current_idx - 1:
+            price = self.forming_price()
+            if price is not None:
+                return price
+        return self.bar_state['close'][bar_idx]
+
+    def current_range(self, count):
+        """前count根K棒（最後一根可能尚在形成）的最高、最低與目前價格"""
+        i = count - 1
+        state = self.bar_state
+        forming = self.forming_bar()
+        if forming is None:
+            return state['running_high'][i], state['running_low'][i], state['close'][i]
+        high, low = forming[1], forming[2]
+        if i > 0:
+            high = np.fmax(state['running_high'][i - 1], high)
+            low = np.fmin(state['running_low'][i - 1], low)
+        return high, low, forming[3]
+
+    def next_tick(self):
+        """逐筆模式前進一段：上一根已完成時開始下一根，否則沿路徑前進；走完最後一段即完成該K棒"""
+        if self.sub_step is None:
+            if self.current_idx >= len(self.df):
+                self.playing = False
+                self.play_btn.setText('開始')
+                self.timer.stop()
+                return
+            self.current_idx += 1
+            self.sub_step = 0
+        else:
+            self.sub_step += 1
+        i = self.current_idx - 1
+        # 持倉的MAE/MFE只計入這一段走過的價格，K棒內進場的部位不會計入進場前的高低點
+        self.update_excursion(self.tick_path['step_high'][i, self.sub_step],
+                              self.tick_path['step_low'][i, self.sub_step])
+        if self.sub_step >= self.tick_steps - 1:
+            self.sub_step = None
+            self.mark_to_market(i, excursion=False)
+        self.update_chart()
+        self.sync_timeline()
+        
+        if self.current_idx >= len(self.df) and self.sub_step is None:
+            self.playing = False
+            self.play_btn.setText('開始')
+            self.timer.stop()
+
+    def finish_forming_bar(self):
+        """將形成中的K棒直接走完（MAE/MFE計入剩餘路徑）"""
+        i, rest = self.current_idx - 1, slice(self.sub_step + 1, None)
+        if self.tick_active() and self.sub_step + 1 < self.tick_steps:
+            self.update_excursion(np.fmax.reduce(self.tick_path['step_high'][i, rest]),
+                                  np.fmin.reduce(self.tick_path['step_low'][i, rest]))
+        self.sub_step = None
+        self.mark_to_market(i, excursion=False)
+
+    def step_back(self):
+        """退回上一根K棒（該K棒上的交易一併撤銷）"""
+        if self.df is not None and self.current_idx > 0:
+            self.seek_to(self.current_idx - 1)
+
+    def seek_to(self, idx):
+        """
+        直接跳到第idx根K棒（顯示前idx根），畫面資訊由bar_state取得，成本與跳轉距離無關
+        往回跳時，發生在新位置之後的交易會被撤銷，持倉與交易紀錄依剩餘交易重建
+        """
+        if self.df is None:
+            return
+        idx = max(0, min(int(idx), len(self.df)))
+        if self.sub_step is not None:
+            # 形成中的K棒：往前跳時先走完，往回跳時捨棄
+            if idx >= self.current_idx:
+                self.finish_forming_bar()
+            else:
+                self.sub_step = None
+        if idx < self.current_idx:
+            self.rollback_trades_after(idx)
+        self.current_idx = idx
+        self.mark_to_market(idx - 1)
+        self.update_chart()
+        self.sync_timeline()
+        
+        if self.current_idx >= len(self.df) and self.playing:
+            self.playing = False
+            self.play_btn.setText('開始')
+            self.timer.stop()
+
+    def jump_to_time(self):
+        """跳到輸入時間（含）為止的最後一根K棒"""
+        if self.df is None or self.df.empty:
+            return
+        target = self.jump_time_edit.time()
+        first = self.df.index[0]
+        offset = (target.hour() * 60 + target.minute() - (first.hour * 60 + first.minute)) % 1440
+        idx = int(np.searchsorted(self.bar_state['session_minutes'], offset, side='right'))
+        self.seek_to(idx)
+
+    def sync_timeline(self):
+        """讓時間軸、時間標籤與目前位置一致（不觸發跳轉）"""
+        total = 0 if self.df is None else len(self.df)
+        self.timeline_slider.blockSignals(True)
+        self.timeline_slider.setRange(0, total)
+        self.timeline_slider.setValue(self.current_idx)
+        self.timeline_slider.blockSignals(False)
+        self.timeline_label.setText(self.timeline_text(self.current_idx))
+
+    def timeline_text(self, idx):
+        if self.df is None or idx == 0:
+            return '--:--'
+        return f"{self.df.index[idx-1].strftime('%H:%M')} ({idx}/{len(self.df)})"
+
+    def on_timeline_changed(self, value):
+        if self.timeline_slider.isSliderDown():
+            # 拖曳中只預覽時間，放開時才重繪
+            self.timeline_label.setText(self.timeline_text(value))
+        else:
+            self.seek_to(value)
+
+    def on_timeline_released(self):
+        self.seek_to(self.timeline_slider.value())
+
+    def rollback_trades_after(self, idx):
+        """
+        撤銷第idx根K棒（含）之後的交易，並以剩餘交易重建持倉與交易紀錄
+        即使沒有交易被撤銷也要重建：權益曲線與持倉的MAE/MFE已算到較後面的K棒，
+        必須退回idx之前，之後的K棒才會重新計入
+        """
+        kept = [t for t in self.trades if t['index'] < idx]
+        removed = len(self.trades) - len(kept)
+        self.trades = []
+        self.trade_history = []
+        self.reset_pnl_state()
+        if removed and self.session_id is not None:
+            self.journal.revoke_after(self.session_id, idx)
+        for trade in kept:
+            # K棒內成交的交易以原成交價重建（MAE/MFE重建時以整根K棒的高低點計算）
+            price = trade['price'] if trade.get('intrabar') else None
+            if trade['action'] in ('buy', 'buy_to_cover'):
+                self.place_buy(trade['index'], log=False, price=price)
+            else:
+                self.place_sell(trade['index'], log=False, price=price)
+        self.mark_to_market(idx - 1)
+        if removed:
+            self.log_trade(f"[回溯] 已撤銷 {removed} 筆在 {self.timeline_text(idx)} 之後的交易")
+
     def update_chart(self):
+        if self.df is not None:
+            self.pnl_label.setText(self.pnl_text())
+        if self.pg_chart is not None:
+            if self.df is not None:
+                title = None
+                if self.current_idx > 0:
+                    title = (f'K-Replay (Total {len(self.df)}, Now {self.current_idx}th, '
+                             f'{self.df.index[self.current_idx-1]})')
+                self.pg_chart.show_bars(self.current_idx, self.trades, title, equity=self.equity,
+                                        forming=self.forming_bar())
+            return
         if self.df is not None and self.current_idx > 0:
-            display_df = self.df.iloc[:self.current_idx].copy()
+            start = self.viewport_start()
+            display_df = self.df.iloc[start:self.current_idx]
+            forming = self.forming_bar()
+            if forming is not None:
+                # 形成中的K棒以目前走過的路徑顯示
+                display_df = display_df.copy()
+                display_df.iloc[-1, display_df.columns.get_indexer(['Open', 'High', 'Low', 'Close'])] = forming
             
             # 清除圖表
             self.ax1.clear()
             self.ax2.clear()
+            self.ax_equity.clear()
             if self.has_strength:
                 self.ax3.clear()
             if self.has_largeorder:
@@ -391,86 +981,44 @@ class KLinePlayer(QMainWindow):
                              # label='Average', alpha=0.7)
                 self.ax1.legend(loc='best')  # 添加圖例
             
-            # 繪製強度指標 (如果存在且有數據)
-            if self.has_strength and not display_df['strength'].dropna().empty:
-                # 分離正負值
-                positive = display_df[display_df['strength'] >= 0]
-                negative = display_df[display_df['strength'] < 0]
-
-                # 計算強度值的範圍用於設置y軸
-                strength_min = display_df['strength'].min() * 0.9
-                strength_max = display_df['strength'].max() * 1.1
-                
-                # 繪製柱狀圖
-                if not positive.empty:
-                    self.ax3.bar(positive.index, positive['strength'], 
-                                width=0.0005, color='red', alpha=0.7)
-                if not negative.empty:
-                    self.ax3.bar(negative.index, negative['strength'], 
-                                width=0.0005, color='green', alpha=0.7)
+            # 繪製強度/大單/分數指標 (如果存在且有數據)
+            # 顏色與y軸範圍皆取自載入時預先計算的bar_state，不必每步重新分離正負值
+            i = self.current_idx - 1
+            state = self.bar_state
+            indicators = [
+                ('strength', self.has_strength, self.ax3),
+                ('largeorder', self.has_largeorder, self.ax4),
+                ('score', self.has_score, self.ax5),
+            ]
+            for col, enabled, ax in indicators:
+                if not enabled:
+                    continue
+                values = state[col][start:self.current_idx]
+                if start == 0:
+                    low, high = state[f'{col}_min'][i], state[f'{col}_max'][i]
+                else:
+                    # 視窗模式下範圍只取視窗內，成本為O(N)
+                    low, high = np.fmin.reduce(values), np.fmax.reduce(values)
+                if np.isnan(high):
+                    continue
+                # 繪製柱狀圖（正值紅色、負值綠色）
+                ax.bar(display_df.index, values,
+                       width=0.0005, color=state[f'{col}_colors'][start:self.current_idx], alpha=0.7)
                 
                 # 設置標題和範圍
-                self.ax3.set_ylabel('strength')
-                self.ax3.set_ylim(strength_min, strength_max)
+                ax.set_ylabel(col)
+                ax.set_ylim(low * 0.9, high * 1.1)
                 
                 # 添加零線
-                self.ax3.axhline(0, color='gray', linestyle='-', linewidth=0.5)
-
-            # 繪製大單指標 (如果存在且有數據)
-            if self.has_largeorder and not display_df['largeorder'].dropna().empty:
-                # 分離正負值
-                positive = display_df[display_df['largeorder'] >= 0]
-                negative = display_df[display_df['largeorder'] < 0]
-
-                # 計算強度值的範圍用於設置y軸
-                largeorder_min = display_df['largeorder'].min() * 0.9
-                largeorder_max = display_df['largeorder'].max() * 1.1
-                
-                # 繪製柱狀圖
-                if not positive.empty:
-                    self.ax4.bar(positive.index, positive['largeorder'], 
-                                width=0.0005, color='red', alpha=0.7)
-                if not negative.empty:
-                    self.ax4.bar(negative.index, negative['largeorder'], 
-                                width=0.0005, color='green', alpha=0.7)
-                
-                # 設置標題和範圍
-                self.ax4.set_ylabel('largeorder')
-                self.ax4.set_ylim(largeorder_min, largeorder_max)
-                
-                # 添加零線
-                self.ax4.axhline(0, color='gray', linestyle='-', linewidth=0.5)
-
-            # 繪製分數指標 (如果存在且有數據)
-            if self.has_score and not display_df['score'].dropna().empty:
-                # 分離正負值
-                positive = display_df[display_df['score'] >= 0]
-                negative = display_df[display_df['score'] < 0]
-
-                # 計算分數值的範圍用於設置y軸
-                score_min = display_df['score'].min() * 0.9
-                score_max = display_df['score'].max() * 1.1
-                
-                # 繪製柱狀圖
-                if not positive.empty:
-                    self.ax5.bar(positive.index, positive['score'], 
-                                width=0.0005, color='red', alpha=0.7)
-                if not negative.empty:
-                    self.ax5.bar(negative.index, negative['score'], 
-                                width=0.0005, color='green', alpha=0.7)
-                
-                # 設置標題和範圍
-                self.ax5.set_ylabel('score')
-                self.ax5.set_ylim(score_min, score_max)
-                
-                # 添加零線
-                self.ax5.axhline(0, color='gray', linestyle='-', linewidth=0.5)
+                ax.axhline(0, color='gray', linestyle='-', linewidth=0.5)
 
             # 更新價格標籤
-            self.update_price_labels(display_df)
+            self.update_price_labels(self.current_idx)
             
             # 標記交易點
             for trade in self.trades:
+                if trade['index'] < start:
+                    continue
                 trade_time = trade['time']
                 trade_price = trade['price']
                 x_pos = mdates.date2num(trade_time)
@@ -481,7 +1029,7 @@ class KLinePlayer(QMainWindow):
                     self.ax1.plot(x_pos, trade_price, 'gv', markersize=10)
 
             # 設置時間軸格式
-            for ax in [self.ax1, self.ax2, self.ax3, self.ax4, self.ax5]:
+            for ax in [self.ax1, self.ax2, self.ax3, self.ax4, self.ax5, self.ax_equity]:
                 # 旋轉刻度標籤
                 ax.tick_params(axis='x', rotation=90)
 
@@ -496,115 +1044,234 @@ class KLinePlayer(QMainWindow):
             self.ax1.xaxis.set_major_locator(mdates.AutoDateLocator())
 
             self.ax2.set_ylabel('Volume')
+            
+            # 權益曲線（已實現+未實現，點數）
+            self.ax_equity.plot(display_df.index, self.equity[start:self.current_idx],
+                                color='blue', linewidth=1.0)
+            self.ax_equity.axhline(0, color='gray', linestyle='-', linewidth=0.5)
+            self.ax_equity.set_ylabel('Equity')
+            if self.ax_overview is not None:
+                self.draw_overview(start)
             self.figure.subplots_adjust(hspace=0.25)  # 調整子圖間距
             self.canvas.draw_idle()
+        elif self.df is not None:
+            # 跳回起點時清空圖表
+            for ax in [self.ax_overview, self.ax1, self.ax2, self.ax3, self.ax4, self.ax5, self.ax_equity]:
+                if ax is not None:
+                    ax.clear()
+            self.canvas.draw_idle()
+
+    def draw_overview(self, start):
+        """繪製整日總覽（降採樣的高低區間與收盤線），並標示目前視窗"""
+        ax = self.ax_overview
+        ax.clear()
+        bars = overview_upto(self.overview, self.current_idx)
+        ax.fill_between(bars['time'], bars['low'], bars['high'],
+                        step='post', color='gray', alpha=0.3, linewidth=0)
+        ax.plot(bars['time'], bars['close'], color='blue', linewidth=0.8, drawstyle='steps-post')
+        ax.axvspan(self.df.index[start], self.df.index[self.current_idx-1], color='orange', alpha=0.3)
+        ax.set_xlim(self.df.index[0], self.df.index[-1])
+        ax.set_yticks([])
+        # 時間刻度會與K線圖標題重疊，總覽列不顯示刻度文字
+        ax.tick_params(axis='x', labelbottom=False)
     
+    def reset_pnl_state(self):
+        """重置持倉、已實現損益與權益曲線"""
+        n = 0 if self.df is None else len(self.df)
+        # 各方向的未平倉部位，先進先出
+        self.positions = {'long': deque(), 'short': deque()}
+        # 各方向的進場價總和，未實現損益 = 口數*收盤 - 進場價總和，為O(1)
+        self.entry_sum = {'long': 0.0, 'short': 0.0}
+        self.realized_points = 0.0
+        self.realized_pct = 0.0
+        self.winning_trades = 0
+        self.equity = np.full(n, np.nan)  # 每根K棒收盤時的權益（已實現+未實現，點數）
+        self.marked_idx = -1  # equity與MAE/MFE已更新到的K棒
+
+    def unrealized_points(self, bar_idx):
+        """第bar_idx根K棒目前價格（收盤或逐筆模式下的路徑價格）下所有未平倉部位的未實現損益（點數）"""
+        close = self.current_price(bar_idx)
+        return ((len(self.positions['long']) * close - self.entry_sum['long'])
+                + (self.entry_sum['short'] - len(self.positions['short']) * close))
+
+    def mark_to_market(self, bar_idx, excursion=True):
+        """
+        將權益曲線與未平倉部位的MAE/MFE更新到第bar_idx根K棒
+        一般每步只處理一根；跳轉時以向量運算一次處理跳過的K棒，期間持倉不變
+        :param excursion: bool, 是否以K棒高低點更新MAE/MFE；逐筆模式已逐段更新時為False
+        """
+        if bar_idx <= self.marked_idx:
+            return
+        start = self.marked_idx + 1
+        state = self.bar_state
+        net = len(self.positions['long']) - len(self.positions['short'])
+        offset = self.entry_sum['short'] - self.entry_sum['long']
+        self.equity[start:bar_idx + 1] = (self.realized_points
+                                         + net * state['close'][start:bar_idx + 1] + offset)
+        if excursion and (self.positions['long'] or self.positions['short']):
+            self.update_excursion(np.fmax.reduce(state['high'][start:bar_idx + 1]),
+                                  np.fmin.reduce(state['low'][start:bar_idx + 1]))
+        self.marked_idx = bar_idx
+
+    def update_excursion(self, high, low):
+        """以期間的最高/最低價更新所有未平倉部位的MAE/MFE"""
+        for position in self.positions['long']:
+            position['mfe'] = max(position['mfe'], high - position['entry_price'])
+            position['mae'] = max(position['mae'], position['entry_price'] - low)
+        for position in self.positions['short']:
+            position['mfe'] = max(position['mfe'], position['entry_price'] - low)
+            position['mae'] = max(position['mae'], high - position['entry_price'])
+
+    def open_position(self, side, price, bar_idx):
+        self.positions[side].append({
+            'type': side,
+            'entry_price': price,
+            'entry_time': self.df.index[bar_idx],
+            'entry_index': bar_idx,
+            'mae': 0.0,  # 最大不利變動（點數）
+            'mfe': 0.0,  # 最大有利變動（點數）
+        })
+        self.entry_sum[side] += price
+
+    def close_position(self, side, price, bar_idx):
+        """平掉最早的side部位，記錄到trade_history並回傳該筆紀錄"""
+        position = self.positions[side].popleft()
+        self.entry_sum[side] -= position['entry_price']
+        if side == 'long':
+            price_diff = price - position['entry_price']
+        else:
+            price_diff = position['entry_price'] - price
+        profit_pct = (price_diff / position['entry_price']) * 100
+        
+        self.realized_points += price_diff
+        self.realized_pct += profit_pct
+        if price_diff > 0:
+            self.winning_trades += 1
+        record = {
+            'type': side,
+            'entry_price': position['entry_price'],
+            'exit_price': price,
+            'entry_time': position['entry_time'],
+            'exit_time': self.df.index[bar_idx],
+            'profit_pct': profit_pct,
+            'profit_points': price_diff,
+            'mae': position['mae'],
+            'mfe': position['mfe'],
+        }
+        self.trade_history.append(record)
+        return record
+
     def buy_action(self):
         if self.df is not None and self.current_idx > 0:
-            current_price = self.df.iloc[self.current_idx-1]['Close']
-            
-            # 檢查是否有做空持倉需要平倉
-            short_positions = [p for p in self.positions if p['type'] == 'short']
-            if short_positions:
-                position = short_positions[0]
-                price_diff = position['entry_price'] - current_price
-                profit_pct = (price_diff / position['entry_price']) * 100
-                
-                self.trades.append({
-                    'action': 'buy_to_cover',
-                    'price': current_price,
-                    'time': self.df.index[self.current_idx-1],
-                    'index': self.current_idx-1
-                })
-                
-                self.trade_history.append({
-                    'type': 'short',
-                    'entry_price': position['entry_price'],
-                    'exit_price': current_price,
-                    'entry_time': position['entry_time'],
-                    'exit_time': self.df.index[self.current_idx-1],
-                    'profit_pct': profit_pct,
-                    'profit_points': price_diff
-                })
-                
-                self.positions.remove(position)
-                self.log_trade(f"平空 @ {current_price:.2f} (盈虧: {profit_pct:.2f}% / {price_diff:.2f}點)")
-            else:
-                self.positions.append({
-                    'type': 'long',
-                    'entry_price': current_price,
-                    'entry_time': self.df.index[self.current_idx-1],
-                    'entry_index': self.current_idx-1
-                })
-                self.trades.append({
-                    'action': 'buy',
-                    'price': current_price,
-                    'time': self.df.index[self.current_idx-1],
-                    'index': self.current_idx-1
-                })
-                self.log_trade(f"買入 @ {current_price:.2f}")
-            
+            self.place_buy(self.current_idx - 1, price=self.forming_price())
             self.update_chart()
             
+    def place_buy(self, bar_idx, log=True, price=None):
+        """於第bar_idx根K棒收盤價買入（有空單時平空）
+        :param log: 是否為使用者下單（寫入交易記錄與練習紀錄）；重建持倉時為False
+        :param price: float, K棒內的成交價（逐筆模式），None時以收盤價成交
+        """
+        intrabar = price is not None
+        # K棒內成交時該K棒尚未走完，只結算到前一根
+        self.mark_to_market(bar_idx - 1 if intrabar else bar_idx)
+        current_price = price if intrabar else self.bar_state['close'][bar_idx]
+        record = None
+        
+        # 檢查是否有做空持倉需要平倉
+        if self.positions['short']:
+            record = self.close_position('short', current_price, bar_idx)
+            self.trades.append({
+                'action': 'buy_to_cover',
+                'price': current_price,
+                'time': self.df.index[bar_idx],
+                'index': bar_idx,
+                'intrabar': intrabar
+            })
+            if log:
+                self.log_trade(f"平空 @ {current_price:.2f} (盈虧: {record['profit_pct']:.2f}% / "
+                               f"{record['profit_points']:.2f}點, MAE {record['mae']:.2f} / MFE {record['mfe']:.2f})")
+        else:
+            self.open_position('long', current_price, bar_idx)
+            self.trades.append({
+                'action': 'buy',
+                'price': current_price,
+                'time': self.df.index[bar_idx],
+                'index': bar_idx,
+                'intrabar': intrabar
+            })
+            if log:
+                self.log_trade(f"買入 @ {current_price:.2f}")
+        if log:
+            self.record_to_journal(self.trades[-1], record)
+        
     def sell_action(self):
         if self.df is not None and self.current_idx > 0:
-            current_price = self.df.iloc[self.current_idx-1]['Close']
-            
-            # 檢查是否有多頭持倉需要平倉
-            long_positions = [p for p in self.positions if p['type'] == 'long']
-            if long_positions:
-                position = long_positions[0]
-                price_diff = current_price - position['entry_price']
-                profit_pct = (price_diff / position['entry_price']) * 100
-                
-                self.trades.append({
-                    'action': 'sell_to_close',
-                    'price': current_price,
-                    'time': self.df.index[self.current_idx-1],
-                    'index': self.current_idx-1
-                })
-                
-                self.trade_history.append({
-                    'type': 'long',
-                    'entry_price': position['entry_price'],
-                    'exit_price': current_price,
-                    'entry_time': position['entry_time'],
-                    'exit_time': self.df.index[self.current_idx-1],
-                    'profit_pct': profit_pct,
-                    'profit_points': price_diff
-                })
-                
-                self.positions.remove(position)
-                self.log_trade(f"賣出 @ {current_price:.2f} (盈虧: {profit_pct:.2f}% / {price_diff:.2f}點)")
-            else:
-                self.positions.append({
-                    'type': 'short',
-                    'entry_price': current_price,
-                    'entry_time': self.df.index[self.current_idx-1],
-                    'entry_index': self.current_idx-1
-                })
-                self.trades.append({
-                    'action': 'sell_short',
-                    'price': current_price,
-                    'time': self.df.index[self.current_idx-1],
-                    'index': self.current_idx-1
-                })
-                self.log_trade(f"做空 @ {current_price:.2f}")
-            
+            self.place_sell(self.current_idx - 1, price=self.forming_price())
             self.update_chart()
             
+    def place_sell(self, bar_idx, log=True, price=None):
+        """於第bar_idx根K棒收盤價賣出（有多單時平倉）
+        :param log: 是否為使用者下單（寫入交易記錄與練習紀錄）；重建持倉時為False
+        :param price: float, K棒內的成交價（逐筆模式），None時以收盤價成交
+        """
+        intrabar = price is not None
+        # K棒內成交時該K棒尚未走完，只結算到前一根
+        self.mark_to_market(bar_idx - 1 if intrabar else bar_idx)
+        current_price = price if intrabar else self.bar_state['close'][bar_idx]
+        record = None
+        
+        # 檢查是否有多頭持倉需要平倉
+        if self.positions['long']:
+            record = self.close_position('long', current_price, bar_idx)
+            self.trades.append({
+                'action': 'sell_to_close',
+                'price': current_price,
+                'time': self.df.index[bar_idx],
+                'index': bar_idx,
+                'intrabar': intrabar
+            })
+            if log:
+                self.log_trade(f"賣出 @ {current_price:.2f} (盈虧: {record['profit_pct']:.2f}% / "
+                               f"{record['profit_points']:.2f}點, MAE {record['mae']:.2f} / MFE {record['mfe']:.2f})")
+        else:
+            self.open_position('short', current_price, bar_idx)
+            self.trades.append({
+                'action': 'sell_short',
+                'price': current_price,
+                'time': self.df.index[bar_idx],
+                'index': bar_idx,
+                'intrabar': intrabar
+            })
+            if log:
+                self.log_trade(f"做空 @ {current_price:.2f}")
+        if log:
+            self.record_to_journal(self.trades[-1], record)
+        
+    def pnl_text(self):
+        """目前持倉、未實現/已實現損益與未平倉部位的最大MAE/MFE"""
+        longs, shorts = self.positions['long'], self.positions['short']
+        unrealized = self.unrealized_points(self.current_idx - 1) if self.current_idx > 0 else 0.0
+        text = (f"持倉: 多{len(longs)} 空{len(shorts)}  未實現: {unrealized:+.2f}點  "
+                f"已實現: {self.realized_points:+.2f}點")
+        if longs or shorts:
+            mae = max(p['mae'] for side in (longs, shorts) for p in side)
+            mfe = max(p['mfe'] for side in (longs, shorts) for p in side)
+            text += f"  MAE: {mae:.2f}  MFE: {mfe:.2f}"
+        return text
+        
     def show_results(self):
         if not self.trade_history:
             self.log_trade("尚未完成任何交易")
             return
             
+        # 統計值於平倉時累計，不必重新掃描trade_history
         total_trades = len(self.trade_history)
-        winning_trades = len([t for t in self.trade_history if t['profit_points'] > 0])
+        winning_trades = self.winning_trades
         losing_trades = total_trades - winning_trades
         win_rate = (winning_trades / total_trades) * 100 if total_trades > 0 else 0
-        avg_profit_pct = sum(t['profit_pct'] for t in self.trade_history) / total_trades
-        avg_profit_points = sum(t['profit_points'] for t in self.trade_history) / total_trades
-        total_profit_points = sum(t['profit_points'] for t in self.trade_history)
+        avg_profit_pct = self.realized_pct / total_trades
+        avg_profit_points = self.realized_points / total_trades
+        total_profit_points = self.realized_points
         
         result_text = "\n=== 交易結果 ===\n"
         result_text += f"總交易次數: {total_trades}\n"
@@ -614,28 +1281,83 @@ class KLinePlayer(QMainWindow):
         result_text += f"平均報酬率: {avg_profit_pct:.2f}%\n"
         result_text += f"平均盈虧點數: {avg_profit_points:.2f}點\n"
         result_text += f"總盈虧點數: {total_profit_points:.2f}點\n"
+        if self.current_idx > 0:
+            result_text += f"未實現盈虧: {self.unrealized_points(self.current_idx - 1):.2f}點\n"
+            # 最大回落：權益曲線與其歷史高點的最大差距
+            equity = self.equity[:self.current_idx]
+            drawdown = np.fmax.accumulate(equity) - equity
+            if not np.isnan(drawdown).all():
+                result_text += f"最大回落: {np.nanmax(drawdown):.2f}點\n"
         
+        # 視窗中只列出最近的交易，完整清單寫入練習紀錄
+        details = []
         for i, trade in enumerate(self.trade_history, 1):
             trade_type = "多頭" if trade['type'] == 'long' else "空頭"
-            result_text += (f"\n交易 #{i} ({trade_type}):\n"
-                          f"進場價: {trade['entry_price']:.2f} @ {trade['entry_time']}\n"
-                          f"出場價: {trade['exit_price']:.2f} @ {trade['exit_time']}\n"
-                          f"報酬率: {trade['profit_pct']:.2f}%\n"
-                          f"盈虧點數: {trade['profit_points']:.2f}點\n")
+            details.append(f"\n交易 #{i} ({trade_type}):\n"
+                           f"進場價: {trade['entry_price']:.2f} @ {trade['entry_time']}\n"
+                           f"出場價: {trade['exit_price']:.2f} @ {trade['exit_time']}\n"
+                           f"報酬率: {trade['profit_pct']:.2f}%\n"
+                           f"盈虧點數: {trade['profit_points']:.2f}點\n"
+                           f"MAE/MFE: {trade['mae']:.2f} / {trade['mfe']:.2f}點\n")
         
-        self.log_trade(result_text)
+        display_text = result_text
+        if len(details) > RESULT_TRADES_SHOWN:
+            display_text += (f"\n（僅列出最近 {RESULT_TRADES_SHOWN} 筆，"
+                             f"完整 {len(details)} 筆請按「匯出記錄」）\n")
+        display_text += ''.join(details[-RESULT_TRADES_SHOWN:])
+        self.log_trade(result_text + ''.join(details), display=display_text)
     
-    def log_trade(self, message):
+    def log_trade(self, message, display=None):
+        """
+        新增交易記錄；同一畫面內的多則訊息合併後一次寫入視窗
+        :param display: str, 視窗中顯示的內容，None時與message相同（練習紀錄一律保存message）
+        """
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.trade_log.append(f"[{timestamp}] {message}")
+        self._log_pending.append(f"[{timestamp}] {message if display is None else display}")
+        self.journal.record_log(self.session_id, f"[{timestamp}] {message}")
+        if not self.log_flush_timer.isActive():
+            self.log_flush_timer.start()
+
+    def flush_log(self):
+        if self._log_pending:
+            self.trade_log.appendPlainText('\n'.join(self._log_pending))
+            self._log_pending = []
+
+    def export_log(self):
+        """將本次練習的完整交易記錄匯出為文字檔"""
+        if self.session_id is None:
+            self.log_trade("尚未開始練習，沒有可匯出的記錄")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, '匯出交易記錄', f'replay_log_{self.session_date}.txt', '文字檔 (*.txt)')
+        if not file_path:
+            return
+        self.journal.flush()
+        messages = self.journal.session_log(self.session_id)['message']
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(messages) + '\n')
+        self.log_trade(f"已匯出 {len(messages)} 則交易記錄至: {file_path}")
 
     def closeEvent(self, event):
-        # 確保停止定時器
+        # 確保停止定時器與即時匯入
         self.timer.stop()
+        self.stop_live_mode()
+        self.end_session()
+        self.journal.close()
         super().closeEvent(event)
 
 if __name__ == '__main__':
+    # 以 --profile-startup 分析啟動時間與import耗時
+    handle_profile_flag(__file__)
     app = QApplication(sys.argv)
-    player = KLinePlayer()
+    # 以 --backend pyqtgraph 啟動快速繪圖後端
+    backend = 'matplotlib'
+    if '--backend' in sys.argv[1:-1]:
+        backend = sys.argv[sys.argv.index('--backend') + 1]
+    # 以 --log-capacity N 調整交易記錄視窗保留的行數
+    log_capacity = LOG_CAPACITY
+    if '--log-capacity' in sys.argv[1:-1]:
+        log_capacity = int(sys.argv[sys.argv.index('--log-capacity') + 1])
+    player = KLinePlayer(backend=backend, log_capacity=log_capacity, background_init=True)
     player.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,371 @@
+import os
+import re
+import csv
+import sys
+import time
+import hashlib
+import argparse
+import threading
+import pandas as pd
+from datetime import datetime
+
+from Average import write_csv_atomic
+from NewData import RAW_COLUMN_MAP, INDICATOR_COLUMNS
+
+BAR_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume'] + INDICATOR_COLUMNS
+# TX00匯出檔刪除第6、7、9欄後剩下的欄位索引（與NewData.load_tx00一致）
+TX00_COLUMN_INDEX = [0, 1, 2, 3, 4, 7]
+MINUTE_PATTERN = re.compile(r'(\d{1,2}:\d{2})')
+# 用來判斷檔案是否只在檔尾追加的檔頭長度
+HEAD_BYTES = 512
+
+def minute_of(date_str):
+    """由Date字串取出HH:MM"""
+    match = MINUTE_PATTERN.search(date_str)
+    return match.group(1).zfill(5) if match else None
+
+def _to_float(value):
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+class FileTail:
+    """
+    以位移追蹤檔案，只解析新增的完整行
+    TX00匯出檔由新到舊排列，每分鐘在標題列之後插入新K棒並改寫形成中的K棒；
+    此時以上次第一筆資料行之後的內容比對新檔的檔尾，相同時只解析檔頭新增與改寫的行。
+    內容與上次不符（整檔被改寫）時才重新解析整檔
+    """
+
+    def __init__(self, path, encoding):
+        self.path = path
+        self.encoding = encoding
+        self.offset = 0
+        self.header = None
+        self.mtime = None
+        self._head = b''
+        self._stable = None     # (長度, 雜湊)：上次第一筆資料行之後的內容，檔頭插入時應原樣留在檔尾
+
+    def poll(self):
+        """
+        讀取自上次位移後新增的行
+        :return: (是否為整檔重讀, 資料行列表, 檔案修改時間)；檔頭插入時資料行只含新增與改寫的行
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False, [], None
+        if stat.st_size == self.offset and stat.st_mtime == self.mtime:
+            return False, [], stat.st_mtime
+
+        with open(self.path, 'rb') as f:
+            head = f.read(HEAD_BYTES)
+            appended = not (self.offset == 0 or stat.st_size < self.offset
+                            or head[:len(self._head)] != self._head)
+            if appended:
+                f.seek(self.offset)
+                data = f.read()
+                # 追加模式下最後一行可能尚未寫完，留待下次讀取
+                end = data.rfind(b'\n') + 1
+            else:
+                data = head + f.read()
+
+        self.mtime = stat.st_mtime
+        self._head = head
+        if appended:
+            self.offset += end
+            self._stable = None
+            lines = data[:end].decode(self.encoding, errors='replace').splitlines()
+            return False, [line for line in lines if line.strip()], stat.st_mtime
+
+        end = self._prepended_end(data)
+        self.offset = len(data)
+        self._stable = self._stable_part(data)
+        lines = data[:end].decode(self.encoding, errors='replace').splitlines()
+        if lines:
+            self.header = next(csv.reader([lines[0]]))
+            lines = lines[1:]
+        return end == len(data), [line for line in lines if line.strip()], stat.st_mtime
+
+    def _prepended_end(self, data):
+        """檔尾與上次的穩定內容相同時，回傳檔頭新增部分的結尾位置，否則回傳整檔長度"""
+        if not self._stable:
+            return len(data)
+        length, digest = self._stable
+        end = len(data) - length
+        if length == 0 or end <= 0 or data[end - 1:end] != b'\n' or \
+                hashlib.sha1(memoryview(data)[end:]).digest() != digest:
+            return len(data)
+        return end
+
+    @staticmethod
+    def _stable_part(data):
+        """標題列與第一筆資料行之後的內容（長度, 雜湊）；第一筆資料行可能是形成中的K棒，不列入"""
+        header_end = data.find(b'\n')
+        first_end = data.find(b'\n', header_end + 1) if header_end >= 0 else -1
+        if first_end < 0:
+            return None
+        return len(data) - first_end - 1, hashlib.sha1(memoryview(data)[first_end + 1:]).digest()
+
+class LiveIngest:
+    """
+    盤中即時匯入：輪詢TX00分鐘線與群益RAW檔，只解析新增資料，
+    增量更新當日K線、均價與指標，並通知訂閱者
+    """
+
+    def __init__(self, tx_path, raw_path, output_csv, interval=0.2, backup_csv=None):
+        self.tx_tail = FileTail(tx_path, 'big5')
+        self.raw_tail = FileTail(raw_path, 'utf-8-sig')
+        self.output_csv = output_csv
+        self.backup_csv = backup_csv
+        self.interval = interval
+
+        self.bars = []            # 依時間排序的K棒(dict)
+        self._positions = {}      # Date → 在bars中的位置
+        self._minute_positions = {}   # HH:MM → 在bars中的位置
+        self._cum_pv = []         # 累積 Close*Volume
+        self._cum_v = []          # 累積 Volume
+        self.minute_indicators = {}   # HH:MM → 該分鐘第一筆指標
+        self._raw_index = None
+        self._written = 0         # 已寫入輸出檔的完成K棒數
+
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.last_latency = None
+
+    # ---------- 訂閱 ----------
+    def subscribe(self, callback):
+        """
+        註冊新K棒通知，callback(bar, is_update) 於匯入執行緒中呼叫
+        is_update為True表示既有K棒（形成中的最後一根）內容有變
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def snapshot(self):
+        """回傳目前所有K棒的DataFrame"""
+        with self._lock:
+            return pd.DataFrame([dict(bar) for bar in self.bars], columns=BAR_COLUMNS)
+
+    # ---------- 解析 ----------
+    def _parse_raw_lines(self, lines):
+        """更新每分鐘第一筆指標，回傳有新值的分鐘"""
+        header = self.raw_tail.header
+        if header is None:
+            return set()
+        if self._raw_index is None or self._raw_index[0] is not header:
+            self._raw_index = (header, header.index('時間'),
+                               {RAW_COLUMN_MAP[name]: header.index(name) for name in RAW_COLUMN_MAP})
+        _, time_idx, value_idx = self._raw_index
+
+        changed = set()
+        for row in csv.reader(lines):
+            if len(row) <= time_idx:
+                continue
+            minute = minute_of(row[time_idx])
+            if minute is None:
+                continue
+            known = self.minute_indicators.setdefault(minute, {})
+            for column, idx in value_idx.items():
+                # 與groupby().first()相同：取該分鐘第一個非空值
+                if known.get(column) is None and idx < len(row):
+                    value = _to_float(row[idx])
+                    if value is not None:
+                        known[column] = value
+                        changed.add(minute)
+        return changed
+
+    def _parse_tx_lines(self, lines):
+        bars = []
+        for row in csv.reader(lines):
+            if len(row) <= max(TX00_COLUMN_INDEX):
+                continue
+            date, open_, high, low, close, volume = (row[i] for i in TX00_COLUMN_INDEX)
+            values = [_to_float(v) for v in (open_, high, low, close, volume)]
+            if any(v is None for v in values):
+                continue
+            bars.append({'Date': date.strip(), 'Open': values[0], 'High': values[1],
+                         'Low': values[2], 'Close': values[3], 'Volume': values[4]})
+        bars.sort(key=lambda bar: bar['Date'])
+        return bars
+
+    # ---------- 增量更新 ----------
+    def _apply_indicators(self, bar):
+        indicators = self.minute_indicators.get(minute_of(bar['Date']), {})
+        for column in INDICATOR_COLUMNS:
+            if column == 'Average':
+                continue
+            bar[column] = indicators.get(column)
+        return indicators.get('Average')
+
+    def _refresh_bar(self, pos):
+        """重新套用單根K棒的指標與均價"""
+        bar = self.bars[pos]
+        raw_average = self._apply_indicators(bar)
+        # 有群益均價時沿用，否則以累積成交量加權計算
+        if raw_average is not None:
+            bar['Average'] = raw_average
+        else:
+            bar['Average'] = self._cum_pv[pos] / self._cum_v[pos] if self._cum_v[pos] else None
+
+    def _recompute_from(self, pos):
+        """自pos起重新累加均價（通常只有最後一根）"""
+        prev_pv = self._cum_pv[pos - 1] if pos > 0 else 0.0
+        prev_v = self._cum_v[pos - 1] if pos > 0 else 0.0
+        for i in range(pos, len(self.bars)):
+            bar = self.bars[i]
+            prev_pv += bar['Close'] * bar['Volume']
+            prev_v += bar['Volume']
+            self._cum_pv[i] = prev_pv
+            self._cum_v[i] = prev_v
+            self._refresh_bar(i)
+
+    def _merge_bars(self, parsed):
+        """合併解析出的K棒，回傳有變動的 [(位置, is_update)]"""
+        events = []
+        first_dirty = None
+        for new_bar in parsed:
+            pos = self._positions.get(new_bar['Date'])
+            if pos is None:
+                if self.bars and new_bar['Date'] < self.bars[-1]['Date']:
+                    continue  # 不接受比已知最後一根更早的新K棒
+                pos = len(self.bars)
+                self._positions[new_bar['Date']] = pos
+                self._minute_positions[minute_of(new_bar['Date'])] = pos
+                self.bars.append(new_bar)
+                self._cum_pv.append(0.0)
+                self._cum_v.append(0.0)
+                events.append((pos, False))
+            else:
+                bar = self.bars[pos]
+                if all(bar[k] == new_bar[k] for k in ('Open', 'High', 'Low', 'Close', 'Volume')):
+                    continue
+                bar.update(new_bar)
+                events.append((pos, True))
+            first_dirty = pos if first_dirty is None else min(first_dirty, pos)
+        if first_dirty is not None:
+            self._recompute_from(first_dirty)
+        return events
+
+    def poll_once(self):
+        """輪詢一次來源檔，回傳本次產生的通知數"""
+        _, raw_lines, _ = self.raw_tail.poll()
+        _, tx_lines, tx_mtime = self.tx_tail.poll()
+        if not raw_lines and not tx_lines:
+            return 0
+
+        with self._lock:
+            events = []
+            changed_minutes = self._parse_raw_lines(raw_lines) if raw_lines else set()
+            if tx_lines:
+                events = self._merge_bars(self._parse_tx_lines(tx_lines))
+            if changed_minutes:
+                touched = {pos for pos, _ in events}
+                for minute in changed_minutes:
+                    pos = self._minute_positions.get(minute)
+                    if pos is not None and pos not in touched:
+                        self._refresh_bar(pos)
+                        events.append((pos, True))
+                        touched.add(pos)
+            self._append_finished_bars()
+            notifications = [(dict(self.bars[pos]), is_update) for pos, is_update in sorted(events)]
+
+        if tx_mtime is not None and tx_lines:
+            self.last_latency = time.time() - tx_mtime
+            if self.last_latency > 1.0:
+                print(f"警告: 匯入延遲 {self.last_latency:.2f} 秒")
+        for bar, is_update in notifications:
+            for callback in list(self._subscribers):
+                try:
+                    callback(bar, is_update)
+                except Exception as e:
+                    print(f"通知訂閱者時發生錯誤: {e}")
+        return len(notifications)
+
+    # ---------- 輸出 ----------
+    def _append_finished_bars(self):
+        """最後一根仍在形成中，只把之前已完成的K棒追加寫入輸出檔"""
+        finished = len(self.bars) - 1
+        if finished <= self._written:
+            return
+        new_file = self._written == 0
+        with open(self.output_csv, 'w' if new_file else 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=BAR_COLUMNS)
+            if new_file:
+                writer.writeheader()
+            for bar in self.bars[self._written:finished]:
+                writer.writerow({k: ('' if bar.get(k) is None else bar[k]) for k in BAR_COLUMNS})
+        self._written = finished
+
+    def flush(self):
+        """將包含形成中K棒在內的完整資料原子寫入輸出檔（及備份檔）"""
+        df = self.snapshot()
+        if df.empty:
+            return
+        write_csv_atomic(df, self.output_csv)
+        if self.backup_csv:
+            write_csv_atomic(df, self.backup_csv, encoding='utf-8')
+
+    # ---------- 執行緒 ----------
+    def run(self):
+        while not self._stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"匯入時發生錯誤: {e}")
+            self._stop_event.wait(max(0.0, self.interval - (time.perf_counter() - started)))
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name='LiveIngest', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+def default_ingest(today_date=None, interval=0.2):
+    """依NewData.py的路徑慣例建立當日的LiveIngest"""
+    download_folder = os.path.join(os.environ['USERPROFILE'], 'Downloads')
+    today_date = today_date or datetime.today().strftime('%Y%m%d')
+    return LiveIngest(
+        tx_path=os.path.join(download_folder, "TX00_台指近_分鐘線.csv"),
+        raw_path=os.path.join(download_folder, f"日_看盤_群益_{today_date}_FITX_RAW.csv"),
+        output_csv=os.path.join(download_folder, f"TX_{today_date}_1K.csv"),
+        backup_csv=os.path.join(download_folder, 'TX_Replay', f"TX_{today_date}_1K.csv"),
+        interval=interval,
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='盤中即時匯入TX分鐘線')
+    parser.add_argument('--date', help='交易日(YYYYMMDD)，預設今日')
+    parser.add_argument('--interval', type=float, default=0.2, help='輪詢間隔(秒)')
+    args = parser.parse_args()
+
+    ingest = default_ingest(args.date, args.interval)
+    ingest.subscribe(lambda bar, is_update: print(
+        f"{'更新' if is_update else '新增'} {bar['Date']} C={bar['Close']} V={bar['Volume']}"))
+    print(f"開始匯入，輸出至: {ingest.output_csv}（Ctrl+C 結束）")
+    ingest.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        ingest.stop()
+        print("已停止匯入並保存完整檔案")
+        sys.exit(0)
@@ -1,182 +1,272 @@
 import pandas as pd
+import io
 import os
+import hashlib
 from datetime import datetime
 import mplfinance as mpf
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
 
-# 1. 設定路徑
-download_folder = os.path.join(os.environ['USERPROFILE'], 'Downloads')
-today_date = datetime.today().strftime('%Y%m%d')
-
-# 2. 讀取原始CSV文件（包含欄位名稱）
-input_csv = os.path.join(download_folder, "TX00_台指近_分鐘線.csv")
-df = pd.read_csv(input_csv, encoding='big5')
-
-# # 刪除最後一行（原始欄位名稱）
-# df = df.iloc[:-1]  # 刪除最後一行
-
-# 刪除第6、7、9欄（索引5,6,8）
-df = df.drop(df.columns[[5, 6, 8]], axis=1)
-
-# 反轉資料順序（將最後一筆變第一筆）
-df = df.iloc[::-1].reset_index(drop=True)
-
-# 重新命名欄位
-new_columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
-df.columns = new_columns
-
-# 新增strength和Average欄位
-df['strength'] = np.nan
-df['largeorder'] = np.nan
-df['score'] = np.nan
-df['Average'] = np.nan
-
-# 讀取CSV的多空力道和均價數據
-csv_path = os.path.join(download_folder, f"日_看盤_群益_{today_date}_FITX_RAW.csv")
-try:
-    # 從CSV讀取資料，並指定編碼為 'utf-8-sig' 來處理BOM
-    raw_data = pd.read_csv(
-        csv_path,
-        encoding='utf-8-sig',
-        usecols=['時間', '多空力道', '大單', '多空分數', '均價']  # 讀取指定的5個欄位
-    )
-except FileNotFoundError:
-    print(f"錯誤：找不到資料來源檔案 {csv_path}")
-    # 建立一個空的DataFrame，避免後續程式碼出錯
-    raw_data = pd.DataFrame(columns=['時間', '多空力道', '大單', '多空分數', '均價'])
-except Exception as e:
-    print(f"讀取 {csv_path} 時發生錯誤: {e}")
-    # 發生其他錯誤時，同樣建立空DataFrame
-    raw_data = pd.DataFrame(columns=['時間', '多空力道', '大單', '多空分數', '均價'])
+from DataLoader import load_day, capabilities, plot_frame
+from Average import load_manifest, save_manifest
+
+# RAW欄位 → K線檔欄位
+RAW_COLUMN_MAP = {
+    '多空力道': 'strength',
+    '大單': 'largeorder',
+    '多空分數': 'score',
+    '均價': 'Average',
+}
+INDICATOR_COLUMNS = list(RAW_COLUMN_MAP.values())
+# RAW檔的逐筆成交價欄位（逐筆回放用）
+RAW_PRICE_COLUMN = '成交價'
+# RAW檔旁的讀取進度檔：已讀到的位元組位置、檔頭雜湊與已縮減的每分鐘指標
+RAW_PROGRESS_SUFFIX = '.minutes.json'
+# 以檔頭這麼多位元組判斷RAW檔是否被重新擷取
+RAW_HEAD_BYTES = 4096
+
+def raw_csv_path(date_str, folder='.'):
+    """日期(YYYYMMDD) → 日_看盤_群益_YYYYMMDD_FITX_RAW.csv路徑"""
+    return os.path.join(folder, f"日_看盤_群益_{date_str}_FITX_RAW.csv")
 
-# 處理時間格式
-raw_data['分鐘'] = raw_data['時間'].astype(str).str.extract(r'(\d{2}:\d{2})')[0]
+def load_tx00(input_csv):
+    """讀取群益匯出的TX00分鐘線（Big5），轉為Date/OHLCV格式"""
+    df = pd.read_csv(input_csv, encoding='big5')
 
-# 從DF的Date欄位提取分鐘資訊
-df['交易分鐘'] = df['Date'].str.split().str[-1]  # 取出空格後的部分
+    # # 刪除最後一行（原始欄位名稱）
+    # df = df.iloc[:-1]  # 刪除最後一行
 
-# 建立分鐘→多空力道的映射字典
-minute_strength_map = raw_data.groupby('分鐘')['多空力道'].first().to_dict()
+    # 刪除第6、7、9欄（索引5,6,8）
+    df = df.drop(df.columns[[5, 6, 8]], axis=1)
 
-# 建立分鐘→大單的映射字典
-minute_largeorder_map = raw_data.groupby('分鐘')['大單'].first().to_dict()
+    # 反轉資料順序（將最後一筆變第一筆）
+    df = df.iloc[::-1].reset_index(drop=True)
 
-# 建立分鐘→多空分數的映射字典
-minute_score_map = raw_data.groupby('分鐘')['多空分數'].first().to_dict()
+    # 重新命名欄位
+    df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+    return df
 
-# 建立分鐘→均價的映射字典
-minute_average_map = raw_data.groupby('分鐘')['均價'].first().to_dict()
+def reduce_raw_to_minutes(raw_data):
+    """
+    將RAW資料（可能為逐筆）縮減為每分鐘一筆，取該分鐘第一筆有效值
+    :return: DataFrame, index為分鐘(HH:MM)，欄位為strength/largeorder/score/Average
+    """
+    minutes = raw_data['時間'].astype(str).str.extract(r'(\d{2}:\d{2})', expand=False)
+    per_minute = (raw_data.drop(columns=['時間'])
+                          .assign(分鐘=minutes)
+                          .dropna(subset=['分鐘'])
+                          .groupby('分鐘', sort=True)
+                          .first())
+    return per_minute.rename(columns=RAW_COLUMN_MAP)
 
-# 映射多空力道
-df['strength'] = df['交易分鐘'].map(minute_strength_map)
+def read_raw_indicators(csv_path, start=0):
+    """
+    讀取群益RAW檔的多空力道、大單、多空分數和均價，縮減為每分鐘一筆
+    指標欄逐欄以to_numeric轉換，無法解析的儲存格只捨棄該值
+    :param csv_path: str, 日_看盤_群益_YYYYMMDD_FITX_RAW.csv路徑
+    :param start: int, 從此位元組位置（上次讀到的行尾）開始讀，0為整檔
+    :return: (DataFrame index為分鐘, 已讀到的位元組位置)
+    """
+    empty = pd.DataFrame(columns=INDICATOR_COLUMNS, dtype='float64').rename_axis('分鐘')
+    try:
+        with open(csv_path, 'rb') as f:
+            header = f.readline()
+            start = max(start, len(header))
+            f.seek(start)
+            data = f.read()
+    except FileNotFoundError:
+        print(f"錯誤：找不到資料來源檔案 {csv_path}")
+        return empty, start
+    # 擷取中的最後一行可能尚未寫完，留待下次讀取
+    end = data.rfind(b'\n') + 1
+    try:
+        # 指定編碼為 'utf-8-sig' 來處理BOM
+        raw = pd.read_csv(io.BytesIO(header + data[:end]), encoding='utf-8-sig',
+                          usecols=['時間'] + list(RAW_COLUMN_MAP), dtype={'時間': str})
+    except Exception as e:
+        print(f"讀取 {csv_path} 時發生錯誤: {e}")
+        return empty, start
+    for column in RAW_COLUMN_MAP:
+        raw[column] = pd.to_numeric(raw[column], errors='coerce')
+    return reduce_raw_to_minutes(raw), start + end
 
-# 映射大單
-df['largeorder'] = df['交易分鐘'].map(minute_largeorder_map)
+def read_raw_ticks(csv_path):
+    """
+    讀取群益RAW檔的逐筆成交價，依檔案順序（時間先後）回傳
+    :return: DataFrame, 欄位minute(HH:MM)/price；檔案不存在或沒有成交價欄位時為空
+    """
+    empty = pd.DataFrame({'minute': pd.Series(dtype=str), 'price': pd.Series(dtype='float64')})
+    if not os.path.exists(csv_path):
+        return empty
+    try:
+        raw = pd.read_csv(csv_path, encoding='utf-8-sig', usecols=['時間', RAW_PRICE_COLUMN],
+                          dtype={'時間': str})
+    except ValueError:
+        print(f"{csv_path} 沒有{RAW_PRICE_COLUMN}欄位，無法使用逐筆資料")
+        return empty
+    except Exception as e:
+        print(f"讀取 {csv_path} 時發生錯誤: {e}")
+        return empty
+    ticks = pd.DataFrame({
+        'minute': raw['時間'].astype(str).str.extract(r'(\d{2}:\d{2})', expand=False),
+        'price': pd.to_numeric(raw[RAW_PRICE_COLUMN], errors='coerce'),
+    })
+    return ticks.dropna().reset_index(drop=True)
 
-# 映射多空分數
-df['score'] = df['交易分鐘'].map(minute_score_map)
+def enrich_with_raw(df, per_minute):
+    """
+    以單次merge將每分鐘指標併入K線資料
+    :param df: DataFrame, 含Date欄位的K線資料
+    :param per_minute: DataFrame, read_raw_indicators的結果
+    :return: DataFrame, 已含strength/largeorder/score/Average欄位
+    """
+    base = df.drop(columns=[c for c in INDICATOR_COLUMNS if c in df.columns])
+    # 從DF的Date欄位提取分鐘資訊
+    base['交易分鐘'] = base['Date'].astype(str).str.split().str[-1].str.zfill(5)
+    enriched = base.merge(per_minute, how='left', left_on='交易分鐘', right_index=True)
+    # 移除臨時列
+    return enriched.drop(columns=['交易分鐘'])
 
-# 映射均價
-df['Average'] = df['交易分鐘'].map(minute_average_map)
+def _raw_head_digest(csv_path, length):
+    with open(csv_path, 'rb') as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
 
-# 移除臨時列
-df = df.drop(columns=['交易分鐘'])
+def enrich_incremental(df, raw_csv):
+    """
+    盤中重跑時只讀取RAW檔上次讀到的位置之後新增的行，與進度檔中已縮減的每分鐘指標合併
+    RAW檔變短或檔頭不同（重新擷取）時整檔重讀
+    """
+    folder, name = os.path.split(raw_csv + RAW_PROGRESS_SUFFIX)
+    folder = folder or '.'
+    progress = load_manifest(folder, name)
+    known = pd.DataFrame(columns=INDICATOR_COLUMNS, dtype='float64').rename_axis('分鐘')
+    start = 0
+    if progress and os.path.exists(raw_csv) and progress['offset'] <= os.path.getsize(raw_csv) \
+            and _raw_head_digest(raw_csv, progress['head_length']) == progress['head']:
+        start = progress['offset']
+        known = pd.DataFrame.from_dict(progress['minutes'], orient='index', columns=INDICATOR_COLUMNS,
+                                       dtype='float64').rename_axis('分鐘')
 
-# 保存結果
-output_csv = os.path.join(download_folder, f"TX_{today_date}_1K.csv")
-df.to_csv(output_csv, index=False)
+    new_minutes, end = read_raw_indicators(raw_csv, start)
+    # 每分鐘取第一筆有效值：先前讀到的值優先，缺值才由新讀到的行補上
+    per_minute = known.combine_first(new_minutes) if not known.empty else new_minutes
+    if end > start:
+        head_length = min(end, RAW_HEAD_BYTES)
+        save_manifest({'offset': end, 'head_length': head_length,
+                       'head': _raw_head_digest(raw_csv, head_length),
+                       'minutes': {minute: row.tolist() for minute, row in per_minute.iterrows()}},
+                      folder, name)
+    return enrich_with_raw(df, per_minute)
 
-print(f"處理完成！結果已保存至: {output_csv}")
-backup_csv = os.path.join(download_folder, 'TX_Replay', f"TX_{today_date}_1K.csv")
-df.to_csv(backup_csv, index=False, encoding='utf-8')
-# print(f"新檔案格式: {df.shape[0]} 行 x {df.shape[1]} 欄")
-# print("欄位名稱:", list(df.columns))
+def plot_chart(output_csv, chart_file, today_date, dpi=300):
+    """繪製K線圖、成交量、strength直方圖和均價線，回傳Figure"""
+    # 1. 讀取剛剛保存的CSV文件（統一欄位格式）
+    loaded = load_day(output_csv)
+    caps = capabilities(loaded)
+    df_plot = plot_frame(loaded)
 
-# 繪製K線圖、成交量、strength直方圖和均價線
-# ------------------------------------------------------------
-# 1. 讀取剛剛保存的CSV文件
-# output_csv = os.path.join(download_folder, 'TX_Replay', f"TX_20250526_1K.csv")
-df_plot = pd.read_csv(output_csv, parse_dates=['Date'], index_col='Date')
+    # 2. 創建額外的圖表面板
+    apds = [
+        # 均價線（在主圖面板）
+        mpf.make_addplot(df_plot['Average'], panel=0, type='line', color='purple',
+                        width=1.5, alpha=0.8, linestyle='-', label='Average'),
 
-try:
-        # 2. 創建顏色映射 - strength,colors_largeorder指標
+        # 成交量柱狀圖（在面板1）
+        mpf.make_addplot(df_plot['Volume'], panel=1, type='bar', color='blue', ylabel='Volume'),
+    ]
+    panel_ratios = (3, 1)  # 主圖:成交量 = 3:1
+
+    if caps['strength'] and caps['largeorder']:
+        # 3. 創建顏色映射 - strength,colors_largeorder指標
         # 正值紅色，負值綠色
-        colors = ['red' if s >= 0 else 'green' for s in df_plot['strength']]
-        colors_largeorder = ['red' if s >= 0 else 'green' for s in df_plot['largeorder']]
-
-        # 3. 創建額外的圖表面板
-        apds = [
-            # 均價線（在主圖面板）
-            mpf.make_addplot(df_plot['Average'], panel=0, type='line', color='purple', 
-                            width=1.5, alpha=0.8, linestyle='-', label='Average'),
-        
-            # 成交量柱狀圖（在面板1）
-            mpf.make_addplot(df_plot['Volume'], panel=1, type='bar', color='blue', ylabel='Volume'),
-        
+        colors = np.where(df_plot['strength'] >= 0, 'red', 'green').tolist()
+        colors_largeorder = np.where(df_plot['largeorder'] >= 0, 'red', 'green').tolist()
+        apds += [
             # strength指標直方圖（在面板2）
             mpf.make_addplot(df_plot['strength'], panel=2, type='bar', color=colors, ylabel='Strength'),
 
             # largeorder指標直方圖（在面板3）
             mpf.make_addplot(df_plot['largeorder'], panel=3, type='bar', color=colors_largeorder, ylabel='Largeorder'),
         ]
-        # 4. 繪製圖表
-        fig, axes = mpf.plot(
-            df_plot,
-            type='candle',
-            volume=False,  # 我們已經自定義了成交量面板
-            addplot=apds,
-            figratio=(12, 8),
-            figscale=1.0,
-            title=f'TX Futures 1-min K-line ({today_date})',
-            ylabel='Price',
-            style='yahoo',
-            panel_ratios=(3, 1, 1, 1),  # 主圖:成交量:strength:largeorder = 3:1:1:1
-            returnfig=True
-        )
-except Exception as e:
-        # 3. 創建額外的圖表面板
-        apds = [
-            # 均價線（在主圖面板）
-            mpf.make_addplot(df_plot['Average'], panel=0, type='line', color='purple', 
-                            width=1.5, alpha=0.8, linestyle='-', label='Average'),
-        
-            # 成交量柱狀圖（在面板1）
-            mpf.make_addplot(df_plot['Volume'], panel=1, type='bar', color='blue', ylabel='Volume'),
-        ]
+        panel_ratios = (3, 1, 1, 1)  # 主圖:成交量:strength:largeorder = 3:1:1:1
+    else:
+        print("數據中缺少strength/largeorder指標，僅繪製K線與成交量")
+
+    # 4. 繪製圖表
+    fig, axes = mpf.plot(
+        df_plot,
+        type='candle',
+        volume=False,  # 我們已經自定義了成交量面板
+        addplot=apds,
+        figratio=(12, 8),
+        figscale=1.0,
+        title=f'TX Futures 1-min K-line ({today_date})',
+        ylabel='Price',
+        style='yahoo',
+        panel_ratios=panel_ratios,
+        returnfig=True
+    )
+
+    # 5. 設置日期格式
+    axes[0].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    fig.autofmt_xdate()  # 自動旋轉日期標籤
+
+    # 6. 添加網格
+    for ax in axes:
+        ax.grid(True, linestyle='--', alpha=0.7)
+
+    # 7. 添加圖例
+    axes[0].legend(loc='upper left')
+
+    # 8. 保存圖表
+    fig.savefig(chart_file, dpi=dpi, bbox_inches='tight')
+    print(f"K線圖已保存至: {chart_file}")
+    return fig
+
+def main():
+    # 1. 設定路徑
+    download_folder = os.path.join(os.environ['USERPROFILE'], 'Downloads')
+    today_date = datetime.today().strftime('%Y%m%d')
+
+    # 2. 讀取原始CSV文件（包含欄位名稱）
+    input_csv = os.path.join(download_folder, "TX00_台指近_分鐘線.csv")
+    df = load_tx00(input_csv)
+
+    # 3. 讀取CSV的多空力道和均價數據，盤中重跑時只處理新的分鐘
+    csv_path = raw_csv_path(today_date, download_folder)
+    output_csv = os.path.join(download_folder, f"TX_{today_date}_1K.csv")
+    df = enrich_incremental(df, csv_path)
+
+    # 保存結果
+    df.to_csv(output_csv, index=False)
+
+    print(f"處理完成！結果已保存至: {output_csv}")
+    backup_csv = os.path.join(download_folder, 'TX_Replay', f"TX_{today_date}_1K.csv")
+    df.to_csv(backup_csv, index=False, encoding='utf-8')
+
+    # 增量更新回放目錄的相似交易日索引與特徵表（失敗不影響匯入）
+    try:
+        from SimilarityIndex import update_similarity_index
+        update_similarity_index(os.path.dirname(backup_csv))
+    except Exception as e:
+        print(f"更新相似度索引時發生錯誤: {e}")
+    try:
+        from FeaturePanel import update_feature_panel
+        update_feature_panel(os.path.dirname(backup_csv))
+    except Exception as e:
+        print(f"更新特徵表時發生錯誤: {e}")
+    # print(f"新檔案格式: {df.shape[0]} 行 x {df.shape[1]} 欄")
+    # print("欄位名稱:", list(df.columns))
+
+    # 繪製K線圖、成交量、strength直方圖和均價線
+    # ------------------------------------------------------------
+    # output_csv = os.path.join(download_folder, 'TX_Replay', f"TX_20250526_1K.csv")
+    chart_file = os.path.join(download_folder, 'TX_Replay', f"TX_{today_date}_1K_chart.png")
+    plot_chart(output_csv, chart_file, today_date)
+
+    # 9. 顯示圖表（可選）
+    plt.show()
 
-        # 4. 繪製圖表
-        fig, axes = mpf.plot(
-            df_plot,
-            type='candle',
-            volume=False,  # 我們已經自定義了成交量面板
-            addplot=apds,
-            figratio=(12, 8),
-            figscale=1.0,
-            title=f'TX Futures 1-min K-line ({today_date})',
-            ylabel='Price',
-            style='yahoo',
-            panel_ratios=(3, 1),  # 主圖:成交量 = 3:1
-            returnfig=True
-        )
-        print(f"發生錯誤：{e}")
-
-# 5. 設置日期格式
-axes[0].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-fig.autofmt_xdate()  # 自動旋轉日期標籤
-
-# 6. 添加網格
-for ax in axes:
-    ax.grid(True, linestyle='--', alpha=0.7)
-
-# 7. 添加圖例
-axes[0].legend(loc='upper left')
-
-# 8. 保存圖表
-chart_file = os.path.join(download_folder, 'TX_Replay', f"TX_{today_date}_1K_chart.png")
-plt.savefig(chart_file, dpi=300, bbox_inches='tight')
-print(f"K線圖已保存至: {chart_file}")
-
-# 9. 顯示圖表（可選）
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+import numpy as np
+import pyqtgraph as pg
+
+from DataLoader import overview_upto
+from PyQt5.QtCore import QRectF, QPointF
+from PyQt5.QtGui import QPicture, QPainter, QColor, QBrush
+
+# 與mplfinance樣式相同：漲紅跌綠
+UP_COLOR = QColor('red')
+DOWN_COLOR = QColor('green')
+# 畫筆與筆刷只建立一次，繪製區塊時不必每根K棒重建
+UP_PEN = pg.mkPen(UP_COLOR)
+DOWN_PEN = pg.mkPen(DOWN_COLOR)
+UP_BRUSH = QBrush(UP_COLOR)
+DOWN_BRUSH = QBrush(DOWN_COLOR)
+# 每個快取區塊的K棒數；已完成的區塊只繪製一次
+CHUNK_SIZE = 64
+
+class _ChunkedItem(pg.GraphicsObject):
+    """
+    依區塊快取QPicture的圖形項目
+    資料於載入時預先配置，顯示更多K棒時只重繪最後一個未完成的區塊
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self._pictures = []
+        self._bounds = QRectF()
+
+    def reset(self):
+        self.prepareGeometryChange()
+        self.count = 0
+        self._pictures = []
+        self._bounds = QRectF()
+        self.update()
+
+    def set_count(self, count):
+        """顯示前count根K棒"""
+        if count == self.count:
+            return
+        self.prepareGeometryChange()
+        keep = min(count, self.count) // CHUNK_SIZE
+        del self._pictures[keep:]
+        for chunk in range(keep, (count + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            start = chunk * CHUNK_SIZE
+            self._pictures.append(self._draw_range(start, min(start + CHUNK_SIZE, count)))
+        self.count = count
+        self._bounds = self._compute_bounds(count)
+        self.update()
+
+    def _draw_range(self, start, end):
+        picture = QPicture()
+        painter = QPainter(picture)
+        self._paint_bars(painter, start, end)
+        painter.end()
+        return picture
+
+    def paint(self, painter, *args):
+        # 只重播與可見x範圍重疊的區塊，視窗模式下繪製成本與總K棒數無關
+        first, last = 0, len(self._pictures)
+        view = self.getViewBox()
+        if view is not None:
+            x_min, x_max = view.viewRange()[0]
+            first = max(first, int(x_min) // CHUNK_SIZE)
+            last = min(last, int(x_max) // CHUNK_SIZE + 1)
+        for picture in self._pictures[first:last]:
+            picture.play(painter)
+
+    def boundingRect(self):
+        return self._bounds
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        """供ViewBox自動縮放：y軸只計算可見x範圍內的K棒"""
+        if self.count == 0:
+            return None
+        if ax == 0:
+            return (-1, self.count)
+        start, end = 0, self.count
+        if orthoRange is not None:
+            start = max(0, int(np.floor(orthoRange[0])))
+            end = min(self.count, int(np.ceil(orthoRange[1])) + 1)
+        if start >= end:
+            return None
+        return self._value_range(start, end)
+
+class CandleItem(_ChunkedItem):
+    """K線（實體與影線），可在已完成的K棒之後顯示一根形成中的K棒"""
+
+    def __init__(self):
+        super().__init__()
+        self.ohlc = np.empty((0, 4))
+        self.forming = None
+
+    def set_data(self, ohlc):
+        self.ohlc = np.asarray(ohlc, dtype='float64')
+        # 累計最高/最低，邊界計算為O(1)
+        self._running_high = np.fmax.accumulate(self.ohlc[:, 1])
+        self._running_low = np.fmin.accumulate(self.ohlc[:, 2])
+        self.forming = None
+        self.reset()
+
+    def set_forming(self, ohlc):
+        """
+        在前count根K棒之後（位置count）顯示形成中的K棒，不進入區塊快取
+        :param ohlc: tuple, (open, high, low, close)，None表示不顯示
+        """
+        if ohlc is None and self.forming is None:
+            return
+        self.prepareGeometryChange()
+        self.forming = None if ohlc is None else tuple(ohlc)
+        self._bounds = self._compute_bounds(self.count)
+        self.update()
+
+    def _paint_candle(self, painter, i, o, h, l, c):
+        if np.isnan(o) or np.isnan(c):
+            return
+        width = 0.35
+        up = c >= o
+        painter.setPen(UP_PEN if up else DOWN_PEN)
+        painter.setBrush(UP_BRUSH if up else DOWN_BRUSH)
+        painter.drawLine(QPointF(i, l), QPointF(i, h))
+        painter.drawRect(QRectF(i - width, o, width * 2, c - o))
+
+    def _paint_bars(self, painter, start, end):
+        for i in range(start, end):
+            self._paint_candle(painter, i, *self.ohlc[i])
+
+    def paint(self, painter, *args):
+        super().paint(painter, *args)
+        if self.forming is not None:
+            self._paint_candle(painter, self.count, *self.forming)
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        bounds = super().dataBounds(ax, frac, orthoRange)
+        if self.forming is None:
+            return bounds
+        if ax == 0:
+            return (-1, self.count + 1)
+        if orthoRange is not None and not (orthoRange[0] <= self.count <= orthoRange[1] + 1):
+            return bounds
+        low, high = self.forming[2], self.forming[1]
+        return (low, high) if bounds is None else (min(bounds[0], low), max(bounds[1], high))
+
+    def _value_range(self, start, end):
+        low = np.fmin.reduce(self.ohlc[start:end, 2])
+        high = np.fmax.reduce(self.ohlc[start:end, 1])
+        return None if np.isnan(low) or np.isnan(high) else (low, high)
+
+    def _compute_bounds(self, count):
+        low = self._running_low[count - 1] if count else np.nan
+        high = self._running_high[count - 1] if count else np.nan
+        width = count + 1
+        if self.forming is not None:
+            low, high = np.fmin(low, self.forming[2]), np.fmax(high, self.forming[1])
+            width += 1
+        if np.isnan(low) or np.isnan(high):
+            return QRectF()
+        return QRectF(-1, low, width, high - low)
+
+class SignedBarItem(_ChunkedItem):
+    """直方圖：正值紅色、負值綠色（或依漲跌著色）"""
+
+    def __init__(self, alpha=180):
+        super().__init__()
+        self.values = np.empty(0)
+        self.signs = np.empty(0, dtype=bool)
+        self.alpha = alpha
+
+    def set_data(self, values, positive=None):
+        """
+        :param values: 柱高
+        :param positive: 每根是否用紅色，None時依values正負決定
+        """
+        self.values = np.asarray(values, dtype='float64')
+        self.signs = self.values >= 0 if positive is None else np.asarray(positive, dtype=bool)
+        self._running_min = np.fmin.accumulate(self.values)
+        self._running_max = np.fmax.accumulate(self.values)
+        self.reset()
+
+    def _paint_bars(self, painter, start, end):
+        width = 0.4
+        painter.setPen(pg.mkPen(None))
+        brushes = {}
+        for positive in (True, False):
+            color = QColor(UP_COLOR if positive else DOWN_COLOR)
+            color.setAlpha(self.alpha)
+            brushes[positive] = QBrush(color)
+        for i in range(start, end):
+            value = self.values[i]
+            if np.isnan(value):
+                continue
+            painter.setBrush(brushes[bool(self.signs[i])])
+            painter.drawRect(QRectF(i - width, 0, width * 2, value))
+
+    def _value_range(self, start, end):
+        values = self.values[start:end]
+        high = np.fmax.reduce(values)
+        if np.isnan(high):
+            return None
+        return (min(0.0, np.fmin.reduce(values)), max(0.0, high))
+
+    def _compute_bounds(self, count):
+        if count == 0 or np.isnan(self._running_max[count - 1]):
+            return QRectF()
+        low = min(0.0, self._running_min[count - 1])
+        high = max(0.0, self._running_max[count - 1])
+        return QRectF(-1, low, count + 1, high - low)
+
+class TimeAxisItem(pg.AxisItem):
+    """x軸以K棒序號繪製，刻度顯示HH:MM"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.labels = []
+
+    def tickStrings(self, values, scale, spacing):
+        strings = []
+        for value in values:
+            i = int(round(value))
+            strings.append(self.labels[i] if 0 <= i < len(self.labels) else '')
+        return strings
+
+class PGChartWidget(pg.GraphicsLayoutWidget):
+    """
+    KLinePlayer的pyqtgraph繪圖後端：K線、成交量、strength、largeorder、score與均價線，
+    播放時只增加顯示的K棒數，不重建圖形
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setBackground('w')
+        self.df = None
+        self.caps = {}
+        self.count = 0
+        self._trades = []
+        self._forming = None
+        self.viewport_bars = 0  # 只顯示最後N根K棒，0表示全部
+        self.overview = None
+
+        self.axes = []
+        names = ['Price', 'Volume', 'strength', 'largeorder', 'score', 'Equity']
+        for row, name in enumerate(names):
+            axis = TimeAxisItem(orientation='bottom')
+            plot = self.addPlot(row=row, col=0, axisItems={'bottom': axis})
+            plot.setLabel('left', name)
+            plot.showGrid(x=True, y=True, alpha=0.3)
+            plot.setMouseEnabled(x=True, y=False)
+            plot.enableAutoRange(y=True)
+            plot.setAutoVisible(y=True)
+            if row > 0:
+                plot.setXLink(self.axes[0][0])
+                plot.addLine(y=0, pen=pg.mkPen('gray', width=0.5))
+            self.axes.append((plot, axis))
+        self.ci.layout.setRowStretchFactor(0, 4)
+        self.price_plot = self.axes[0][0]
+        
+        # 總覽列：整日降採樣的高低區間與收盤線，橘色區域為目前視窗
+        self.overview_plot = self.addPlot(row=len(names), col=0)
+        self.overview_plot.setMaximumHeight(80)
+        self.overview_plot.setMouseEnabled(x=False, y=False)
+        self.overview_plot.hideAxis('left')
+        self.overview_plot.hideButtons()
+        self.overview_high = self.overview_plot.plot(pen=pg.mkPen('gray'), stepMode='center')
+        self.overview_low = self.overview_plot.plot(pen=pg.mkPen('gray'), stepMode='center')
+        self.overview_close = self.overview_plot.plot(pen=pg.mkPen('b'), stepMode='center')
+        self.overview_region = pg.LinearRegionItem(movable=False, brush=pg.mkBrush(255, 165, 0, 70))
+        self.overview_plot.addItem(self.overview_region)
+        self.overview_plot.setVisible(False)
+
+        self.candles = CandleItem()
+        self.price_plot.addItem(self.candles)
+        self.average_line = self.price_plot.plot(pen=pg.mkPen('purple', width=1.5))
+        self.buy_markers = pg.ScatterPlotItem(symbol='t1', size=12, brush='r', pen='r')
+        self.sell_markers = pg.ScatterPlotItem(symbol='t', size=12, brush='g', pen='g')
+        self.price_plot.addItem(self.buy_markers)
+        self.price_plot.addItem(self.sell_markers)
+
+        self.volume_bars = SignedBarItem()
+        self.axes[1][0].addItem(self.volume_bars)
+        self.indicator_bars = {}
+        self.indicator_plots = {}
+        for row, name in enumerate(['strength', 'largeorder', 'score'], start=2):
+            item = SignedBarItem()
+            self.axes[row][0].addItem(item)
+            self.indicator_bars[name] = item
+            self.indicator_plots[name] = self.axes[row][0]
+
+        # 權益曲線（已實現+未實現，點數）
+        self.equity = np.empty(0)
+        self.equity_line = self.axes[5][0].plot(pen=pg.mkPen('b', width=1.2))
+        
+        # 使用者手動縮放/平移後不再自動跟隨最新K棒，雙擊恢復
+        self.follow = True
+        self.price_plot.getViewBox().sigRangeChangedManually.connect(self._stop_following)
+
+        # 價格標籤（對應matplotlib版update_price_labels）
+        self.price_labels = pg.LabelItem(justify='left')
+        self.addItem(self.price_labels, row=0, col=1)
+        self.ci.layout.setColumnMinimumWidth(1, 170)
+
+    def _stop_following(self, *args):
+        self.follow = False
+
+    def mouseDoubleClickEvent(self, event):
+        self.follow = True
+        self.refresh()
+        super().mouseDoubleClickEvent(event)
+
+    def set_viewport(self, bars):
+        """只顯示最後bars根K棒，0表示全部"""
+        self.viewport_bars = bars
+        self.follow = True
+        self.refresh()
+
+    def set_overview_visible(self, visible):
+        self.overview_plot.setVisible(visible)
+        self.refresh()
+
+    def set_data(self, df, caps, state, overview=None):
+        """
+        預先配置所有K棒資料
+        :param df: DataFrame, 欄位同DataLoader.SCHEMA_COLUMNS
+        :param state: dict, DataLoader.build_bar_state的結果
+        :param overview: dict, DataLoader.build_overview的結果，None時不顯示總覽
+        """
+        self.follow = True
+        self.overview = overview
+        self.df = df
+        self.caps = caps
+        self.count = 0
+        self._forming = None
+        self.candles.set_data(df[['Open', 'High', 'Low', 'Close']].to_numpy(dtype='float64'))
+        self.state = state
+        self.average = state['average']
+        close = state['close']
+        self.close = close
+        self.volume_bars.set_data(df['Volume'].to_numpy(dtype='float64'), positive=state['up'])
+        for name, item in self.indicator_bars.items():
+            if caps.get(name):
+                item.set_data(state[name], positive=state[f'{name}_positive'])
+            else:
+                item.set_data(np.full(len(df), np.nan))
+            self.indicator_plots[name].setVisible(bool(caps.get(name)))
+        # 累計最高/最低，供價格標籤以O(1)取得
+        self.running_high = state['running_high']
+        self.running_low = state['running_low']
+        labels = df.index.strftime('%H:%M').tolist()
+        for _, axis in self.axes:
+            axis.labels = labels
+
+    def refresh(self):
+        """以上次的K棒數、交易與形成中的K棒重畫（權益曲線沿用上次傳入的陣列）"""
+        self.show_bars(self.count, self._trades, forming=self._forming)
+
+    def show_bars(self, count, trades, title=None, equity=None, forming=None):
+        """
+        顯示前count根K棒與交易標記
+        :param equity: ndarray, 每根K棒的權益，None時沿用上次傳入的陣列
+        :param forming: tuple, 第count根K棒尚在形成時的(open, high, low, close)，None表示已完成
+        """
+        if self.df is None:
+            return
+        count = min(count, len(self.df))
+        self.count = count
+        self._trades = trades
+        self._forming = forming
+        # 形成中的K棒另外繪製，已完成的部分仍沿用區塊快取
+        completed = count - 1 if forming is not None else count
+        self.candles.set_count(completed)
+        self.candles.set_forming(forming)
+        self.volume_bars.set_count(count)
+        for item in self.indicator_bars.values():
+            item.set_count(count)
+        self.average_line.setData(np.arange(count), self.average[:count], connect='finite')
+        if equity is not None:
+            self.equity = equity
+        self.equity_line.setData(np.arange(min(count, len(self.equity))), self.equity[:count],
+                                 connect='finite')
+
+        buys = [(t['index'], t['price']) for t in trades if t['action'] in ('buy', 'buy_to_cover')]
+        sells = [(t['index'], t['price']) for t in trades
+                 if t['action'] in ('sell', 'sell_short', 'sell_to_close')]
+        self.buy_markers.setData(pos=buys)
+        self.sell_markers.setData(pos=sells)
+
+        if title:
+            self.price_plot.setTitle(title)
+        start = max(0, count - self.viewport_bars) if self.viewport_bars else 0
+        if self.follow:
+            self.price_plot.setXRange(start - 1, max(count, 1) + 1, padding=0)
+        if self.overview is not None and self.overview_plot.isVisible():
+            self.update_overview(start, completed)
+        self.update_price_labels(count, forming)
+
+    def update_overview(self, start, count):
+        bars = overview_upto(self.overview, count)
+        # stepMode='center'以x為各段邊界，需比y多一個（最後一段的右邊界）
+        x = np.append(bars['starts'], count)
+        self.overview_high.setData(x, bars['high'])
+        self.overview_low.setData(x, bars['low'])
+        self.overview_close.setData(x, bars['close'])
+        self.overview_region.setRegion((start - 0.5, count - 0.5))
+        self.overview_plot.setXRange(0, len(self.df), padding=0)
+
+    def update_price_labels(self, count, forming=None):
+        if count == 0:
+            self.price_labels.setText('')
+            return
+        i = count - 1
+        if forming is None:
+            high, low, close = self.running_high[i], self.running_low[i], self.close[i]
+        else:
+            # 形成中的K棒只計入已走過的部分
+            high = forming[1] if i == 0 else np.fmax(self.running_high[i - 1], forming[1])
+            low = forming[2] if i == 0 else np.fmin(self.running_low[i - 1], forming[2])
+            close = forming[3]
+        rows = [
+            ('orange', f'INT: {high - low:.2f}'),
+            ('red', f'HIGH: {high:.2f}'),
+            ('green', f'LOW: {low:.2f}'),
+            ('blue', f'Close: {close:.2f}'),
+        ]
+        if self.caps.get('average'):
+            rows.append(('purple', f'Average: {self.average[i]:.2f}'))
+            rows.append(('purple', f'Diff_Avg: {abs(close - self.average[i]):.2f}'))
+        for name, item in self.indicator_bars.items():
+            if self.caps.get(name):
+                value = item.values[i]
+                rows.append(('red' if item.signs[i] else 'green', f'{name}: {value:.2f}'))
+        self.price_labels.setText('<br>'.join(
+            f'<span style="color:{color}">{text}</span>' for color, text in rows))
@@ -0,0 +1,286 @@
+import sys
+import time
+import uuid
+import queue
+import sqlite3
+import argparse
+import threading
+from contextlib import closing
+from datetime import datetime
+
+JOURNAL_FILE = 'replay_journal.db'
+SEGMENT_FILE = 'segment_detailed_dates.csv'
+# 累積到這麼多筆或超過FLUSH_INTERVAL秒就寫入一次
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0
+SEGMENT_COLUMNS = ['date', 'first_trade_class', 'first_trade_change', 'second_trade_class',
+                   'second_trade_change', 'final_trade_class', 'final_trade_change', 'combination']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    date TEXT,
+    source TEXT,
+    bars INTEGER,
+    speed INTEGER,
+    started_at TEXT,
+    ended_at TEXT,
+    bars_played INTEGER,
+    trade_count INTEGER,
+    realized_points REAL
+);
+CREATE TABLE IF NOT EXISTS trades (
+    session_id TEXT,
+    bar_index INTEGER,
+    bar_time TEXT,
+    action TEXT,
+    price REAL,
+    placed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS round_trips (
+    session_id TEXT,
+    date TEXT,
+    side TEXT,
+    entry_price REAL,
+    exit_price REAL,
+    entry_time TEXT,
+    exit_time TEXT,
+    entry_minute INTEGER,
+    exit_index INTEGER,
+    profit_points REAL,
+    profit_pct REAL,
+    mae REAL,
+    mfe REAL
+);
+CREATE TABLE IF NOT EXISTS logs (
+    session_id TEXT,
+    logged_at TEXT,
+    message TEXT
+);
+CREATE TABLE IF NOT EXISTS segments (
+    date TEXT PRIMARY KEY,
+    first_trade_class TEXT,
+    first_trade_change TEXT,
+    second_trade_class TEXT,
+    second_trade_change TEXT,
+    final_trade_class TEXT,
+    final_trade_change TEXT,
+    combination TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_date ON sessions(date);
+CREATE INDEX IF NOT EXISTS idx_trades_session ON trades(session_id, bar_index);
+CREATE INDEX IF NOT EXISTS idx_round_trips_session ON round_trips(session_id, exit_index);
+CREATE INDEX IF NOT EXISTS idx_round_trips_date ON round_trips(date);
+CREATE INDEX IF NOT EXISTS idx_round_trips_minute ON round_trips(entry_minute);
+CREATE INDEX IF NOT EXISTS idx_logs_session ON logs(session_id);
+CREATE INDEX IF NOT EXISTS idx_segments_combination ON segments(combination);
+"""
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+class ReplayJournal:
+    """
+    KReplay練習紀錄（SQLite）
+    寫入由背景執行緒批次處理，GUI執行緒只把指令放進佇列；查詢另開連線，可在任何執行緒呼叫
+    """
+
+    def __init__(self, db_path=JOURNAL_FILE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        # WAL讓查詢與背景寫入互不阻塞
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # ---- 背景寫入 ----
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, name='ReplayJournal', daemon=True)
+        self._thread.start()
+
+    def run(self):
+        with closing(self._connect()) as conn:
+            pending, waiters = [], []
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    if item is None:
+                        stopping = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        pending.append(item)
+                except queue.Empty:
+                    pass
+                if (stopping or waiters or len(pending) >= self.batch_size
+                        or time.monotonic() >= deadline):
+                    self._write_batch(conn, pending)
+                    pending = []
+                    for event in waiters:
+                        event.set()
+                    waiters = []
+                    deadline = time.monotonic() + self.flush_interval
+
+    def _write_batch(self, conn, pending):
+        if not pending:
+            return
+        try:
+            # 同一交易內依序執行，整批只提交一次
+            with conn:
+                for sql, params in pending:
+                    conn.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"寫入練習紀錄時發生錯誤: {e}")
+
+    def _enqueue(self, sql, params):
+        self._queue.put((sql, params))
+
+    def flush(self, timeout=5.0):
+        """等待目前佇列中的指令全部寫入"""
+        if not (self._thread and self._thread.is_alive()):
+            return
+        event = threading.Event()
+        self._queue.put(event)
+        event.wait(timeout)
+
+    def close(self):
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    # ---- 紀錄 ----
+    def start_session(self, date_str, source, bars, speed):
+        """
+        開始一次練習
+        :param date_str: str, 交易日(YYYYMMDD)
+        :return: str, session_id
+        """
+        session_id = uuid.uuid4().hex
+        self._enqueue('INSERT INTO sessions (session_id, date, source, bars, speed, started_at) '
+                      'VALUES (?, ?, ?, ?, ?, ?)',
+                      (session_id, date_str, source, bars, speed, _now()))
+        return session_id
+
+    def end_session(self, session_id, bars_played, speed, trade_count, realized_points):
+        self._enqueue('UPDATE sessions SET ended_at = ?, bars_played = ?, speed = ?, '
+                      'trade_count = ?, realized_points = ? WHERE session_id = ?',
+                      (_now(), bars_played, speed, trade_count, realized_points, session_id))
+
+    def record_trade(self, session_id, trade):
+        """記錄一筆下單（KLinePlayer.trades的元素）"""
+        self._enqueue('INSERT INTO trades (session_id, bar_index, bar_time, action, price, placed_at) '
+                      'VALUES (?, ?, ?, ?, ?, ?)',
+                      (session_id, int(trade['index']), str(trade['time']), trade['action'],
+                       float(trade['price']), _now()))
+
+    def record_round_trip(self, session_id, date_str, record, exit_index):
+        """記錄一筆平倉（KLinePlayer.trade_history的元素）"""
+        import pandas as pd
+        entry_time = pd.Timestamp(record['entry_time'])
+        self._enqueue('INSERT INTO round_trips (session_id, date, side, entry_price, exit_price, '
+                      'entry_time, exit_time, entry_minute, exit_index, profit_points, profit_pct, '
+                      'mae, mfe) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                      (session_id, date_str, record['type'], float(record['entry_price']),
+                       float(record['exit_price']), str(record['entry_time']), str(record['exit_time']),
+                       entry_time.hour * 60 + entry_time.minute, int(exit_index),
+                       float(record['profit_points']), float(record['profit_pct']),
+                       float(record.get('mae', 0.0)), float(record.get('mfe', 0.0))))
+
+    def record_log(self, session_id, message):
+        """記錄一則交易記錄訊息（播放器畫面只保留最近的訊息，完整內容存於此）"""
+        self._enqueue('INSERT INTO logs (session_id, logged_at, message) VALUES (?, ?, ?)',
+                      (session_id, _now(), message))
+
+    def revoke_after(self, session_id, bar_index):
+        """播放器往回跳時，刪除該位置（含）之後的下單與平倉"""
+        self._enqueue('DELETE FROM trades WHERE session_id = ? AND bar_index >= ?',
+                      (session_id, bar_index))
+        self._enqueue('DELETE FROM round_trips WHERE session_id = ? AND exit_index >= ?',
+                      (session_id, bar_index))
+
+    # ---- 查詢 ----
+    def import_segments(self, csv_path=SEGMENT_FILE):
+        """匯入（覆蓋）segment_detailed_dates.csv，供依分段組合統計"""
+        import pandas as pd
+        df = pd.read_csv(csv_path, dtype={'date': str}, usecols=SEGMENT_COLUMNS)
+        rows = df[SEGMENT_COLUMNS].itertuples(index=False, name=None)
+        # 連線的with只負責提交交易，不會關閉連線，外層以closing關閉
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM segments')
+            conn.executemany(f"INSERT INTO segments ({', '.join(SEGMENT_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(SEGMENT_COLUMNS))})", rows)
+        return len(df)
+
+    def query(self, sql, params=()):
+        # pandas只在查詢時載入，播放器啟動時建立紀錄不需要它
+        import pandas as pd
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def session_log(self, session_id):
+        """取出某次練習的完整交易記錄訊息"""
+        return self.query('SELECT logged_at, message FROM logs WHERE session_id = ? ORDER BY rowid',
+                          (session_id,))
+
+    def win_rate_by_segment(self, min_trades=1):
+        """
+        依當日分段組合統計練習勝率
+        :return: DataFrame, combination/trades/wins/win_rate/avg_points
+        """
+        return self.query(
+            'SELECT s.combination AS combination, COUNT(*) AS trades, '
+            'SUM(r.profit_points > 0) AS wins, '
+            'ROUND(100.0 * SUM(r.profit_points > 0) / COUNT(*), 2) AS win_rate, '
+            'ROUND(AVG(r.profit_points), 2) AS avg_points '
+            'FROM round_trips r JOIN segments s ON s.date = r.date '
+            'GROUP BY s.combination HAVING COUNT(*) >= ? ORDER BY trades DESC',
+            (min_trades,))
+
+    def win_rate_by_time_of_day(self, bucket_minutes=15):
+        """
+        依進場時間（每bucket_minutes分鐘一組）統計練習勝率
+        :return: DataFrame, time/trades/wins/win_rate/avg_points
+        """
+        df = self.query(
+            'SELECT (entry_minute / ?) * ? AS minute, COUNT(*) AS trades, '
+            'SUM(profit_points > 0) AS wins, '
+            'ROUND(100.0 * SUM(profit_points > 0) / COUNT(*), 2) AS win_rate, '
+            'ROUND(AVG(profit_points), 2) AS avg_points '
+            'FROM round_trips GROUP BY minute ORDER BY minute',
+            (bucket_minutes, bucket_minutes))
+        df.insert(0, 'time', [f"{m // 60:02d}:{m % 60:02d}" for m in df['minute']])
+        return df.drop(columns=['minute'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='KReplay練習紀錄查詢')
+    parser.add_argument('--db', default=JOURNAL_FILE, help='紀錄檔路徑')
+    parser.add_argument('--import-segments', nargs='?', const=SEGMENT_FILE, default=None,
+                        help='匯入segment_detailed_dates.csv')
+    parser.add_argument('--by-segment', action='store_true', help='依分段組合統計勝率')
+    parser.add_argument('--by-time', type=int, nargs='?', const=15, default=None,
+                        help='依進場時間統計勝率（分鐘分組，預設15）')
+    args = parser.parse_args()
+
+    journal = ReplayJournal(args.db)
+    if args.import_segments:
+        print(f"已匯入 {journal.import_segments(args.import_segments)} 筆分段資料")
+    if args.by_segment:
+        print(journal.win_rate_by_segment().to_string(index=False))
+    if args.by_time:
+        print(journal.win_rate_by_time_of_day(args.by_time).to_string(index=False))
+    if not (args.import_segments or args.by_segment or args.by_time):
+        parser.print_help()
+        sys.exit(1)
@@ -0,0 +1,506 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from Average import atomic_path
+from DataLoader import load_day, list_days, day_path
+from practice import FEATURE_WEIGHTS, extract_features
+
+# 每日路徑、成交量與特徵的快取檔，依CSV修改時間增量更新
+SIMILARITY_CACHE = 'similarity_cache.npz'
+# 路徑長度：開盤後的分鐘數（日盤08:46~13:45）
+PATH_BARS = 300
+# Sakoe-Chiba帶寬，路徑長度的比例
+DEFAULT_BAND = 0.1
+TOP_K = 20
+FEATURE_KEYS = list(FEATURE_WEIGHTS)
+
+def intraday_offsets(df):
+    """
+    每根K棒距第一根的分鐘數（跨午夜取模）
+    :return: tuple, (offsets, 第一根的時間(時*60+分))
+    """
+    minutes = (df.index.hour * 60 + df.index.minute).to_numpy()
+    return (minutes - minutes[0]) % 1440, int(minutes[0])
+
+def intraday_path(df, bars=PATH_BARS):
+    """
+    將單日K線轉為固定長度的路徑，以開盤後分鐘數對齊
+    值為 (Close - 開盤價) / 開盤價 * 100（%），缺少的分鐘沿用前一根
+    :return: tuple, (path, volume)，長度皆為bars
+    """
+    path = np.full(bars, np.nan)
+    volume = np.zeros(bars)
+    if len(df) == 0:
+        return np.zeros(bars), volume
+    offset, _ = intraday_offsets(df)
+    keep = offset < bars
+    open_price = float(df['Open'].iloc[0])
+    close = df['Close'].to_numpy(dtype='float64')
+    path[offset[keep]] = (close[keep] - open_price) / open_price * 100
+    volume[offset[keep]] = df['Volume'].to_numpy(dtype='float64', na_value=0)[keep]
+    # 向前補值；第一根之前沒有值時補0（即開盤價）
+    filled = np.where(np.isnan(path), 0, np.arange(bars))
+    np.maximum.accumulate(filled, out=filled)
+    path = path[filled]
+    return np.where(np.isnan(path), 0.0, path), volume
+
+def feature_vector(features):
+    """extract_features的結果 → 依FEATURE_WEIGHTS順序排列的數值陣列"""
+    return np.array([float(features[key]) for key in FEATURE_KEYS])
+
+def _empty_archive(bars):
+    return {'dates': np.array([], dtype='U8'), 'mtimes': np.array([], dtype='float64'),
+            'paths': np.empty((0, bars)), 'volumes': np.empty((0, bars)),
+            'features': np.empty((0, len(FEATURE_KEYS)))}
+
+def save_archive(archive, folder='.', cache_file=SIMILARITY_CACHE):
+    """寫入快取（先寫暫存檔再取代，中斷時不留下損壞的檔案）"""
+    with atomic_path(os.path.join(folder, cache_file)) as temp_path:
+        np.savez(temp_path, **archive)
+
+def load_archive(folder='.', cache_file=SIMILARITY_CACHE, bars=PATH_BARS, rebuild=False):
+    """
+    讀取相似度比對用的每日資料，只重新讀取新增或修改過的交易日
+    :return: dict, dates(N,)/mtimes/paths(N,bars)/volumes(N,bars)/features(N,特徵數)，
+             以及已計算過的包絡線 upper_<半徑>/lower_<半徑>
+    """
+    cache_path = os.path.join(folder, cache_file)
+    archive = _empty_archive(bars)
+    if not rebuild and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                archive = {key: cached[key] for key in cached.files}
+        except Exception as e:
+            print(f"相似度快取損壞，重新建立: {e}")
+        if archive['paths'].shape[1] != bars:
+            archive = _empty_archive(bars)
+
+    days = list_days(folder)
+    mtimes = {d: os.path.getmtime(day_path(d, folder)) for d in days}
+    cached = dict(zip(archive['dates'].tolist(), archive['mtimes'].tolist()))
+    stale = [d for d in days if cached.get(d) != mtimes[d]]
+    if not stale and len(cached) == len(days):
+        return archive
+
+    rows = {d: i for i, d in enumerate(archive['dates'].tolist())}
+    paths, volumes, features = [], [], []
+    for date_str in days:
+        if date_str in rows and date_str not in stale:
+            i = rows[date_str]
+            paths.append(archive['paths'][i])
+            volumes.append(archive['volumes'][i])
+            features.append(archive['features'][i])
+            continue
+        try:
+            df = load_day(day_path(date_str, folder))
+        except Exception as e:
+            print(f"載入失敗 TX_{date_str}_1K.csv: {str(e)}")
+            mtimes.pop(date_str)
+            continue
+        path, volume = intraday_path(df, bars)
+        paths.append(path)
+        volumes.append(volume)
+        features.append(feature_vector(extract_features(df)))
+    dates = [d for d in days if d in mtimes]
+    # 交易日有變動時包絡線全部作廢，查詢時再重新計算
+    archive = {'dates': np.array(dates, dtype='U8'),
+               'mtimes': np.array([mtimes[d] for d in dates], dtype='float64'),
+               'paths': np.array(paths).reshape(-1, bars),
+               'volumes': np.array(volumes).reshape(-1, bars),
+               'features': np.array(features).reshape(-1, len(FEATURE_KEYS))}
+    save_archive(archive, folder, cache_file)
+    print(f"相似度快取已更新 {len(stale)} 個交易日，共 {len(dates)} 個")
+    return archive
+
+def band_radius(bars, band=DEFAULT_BAND):
+    """帶寬比例 → 半徑（K棒數）"""
+    return max(0, int(round(band * bars)))
+
+def envelopes(paths, radius):
+    """
+    LB_Keogh的上下包絡線：每個位置前後radius根內的最大/最小值
+    :param paths: ndarray, (N, bars)
+    :return: tuple, (upper, lower)
+    """
+    window = 2 * radius + 1
+    upper = np.lib.stride_tricks.sliding_window_view(
+        np.pad(paths, ((0, 0), (radius, radius)), constant_values=-np.inf), window, axis=1).max(axis=2)
+    lower = np.lib.stride_tricks.sliding_window_view(
+        np.pad(paths, ((0, 0), (radius, radius)), constant_values=np.inf), window, axis=1).min(axis=2)
+    return upper, lower
+
+def cached_envelopes(archive, radius, folder='.', cache_file=SIMILARITY_CACHE):
+    """取得（必要時計算並寫回快取）每個交易日在此半徑下的包絡線"""
+    upper_key, lower_key = f'upper_{radius}', f'lower_{radius}'
+    if upper_key not in archive:
+        archive[upper_key], archive[lower_key] = envelopes(archive['paths'], radius)
+        if folder is not None:
+            save_archive(archive, folder, cache_file)
+    return archive[upper_key], archive[lower_key]
+
+def path_weights(volume, volume_weighted=False):
+    """每個位置的距離權重：依成交量加權時為成交量/平均成交量，否則皆為1"""
+    if not volume_weighted or volume.sum() <= 0:
+        return np.ones(len(volume))
+    return volume / volume.mean()
+
+def lb_kim(query, candidates, weights):
+    """
+    LB_Kim（頭尾兩點）：DTW路徑必定對齊兩端，平方距離至少為兩端距離之和
+    :return: ndarray, (M,)
+    """
+    return (weights[0] * (query[0] - candidates[:, 0]) ** 2
+            + weights[-1] * (query[-1] - candidates[:, -1]) ** 2)
+
+def lb_keogh(query, upper, lower, weights):
+    """
+    LB_Keogh：查詢的每一點至少要對上帶內的某一點，距離不小於到候選包絡線的距離
+    :param upper: ndarray, (M, bars) 候選的上包絡線
+    :return: ndarray, (M,)
+    """
+    above = np.maximum(query - upper, 0)
+    below = np.maximum(lower - query, 0)
+    return ((above ** 2 + below ** 2) * weights).sum(axis=1)
+
+def _dtw_row(previous, cost, invalid, radius):
+    """
+    計算DTW的一列（只保存帶內的2*radius+1格，第i列的第p格對應 j = i - radius + p）
+    列內的遞迴 D[i,j] = c[i,j] + min(D[i-1,j-1], D[i-1,j], D[i,j-1])
+    展開為 D[i,j] = S[j] + min_{k<=j}(a[k] - S[k] + c[i,k])，S為c的列內累積和、a為上一列的最小值，
+    因此可用cumsum與minimum.accumulate向量化
+    :param previous: ndarray, (M, 寬度) 上一列，第一列時為None
+    :param cost: ndarray, (M, 寬度) 本列各格的距離（會被修改）
+    :param invalid: ndarray, (寬度,) 超出路徑範圍的格
+    """
+    cost[:, invalid] = 0
+    if previous is None:
+        # 起點 D[0,0] 只能由 (-1,-1) 進入
+        reach = np.full_like(cost, np.inf)
+        reach[:, radius] = 0
+    else:
+        # D[i-1,j-1] 在上一列的第p格，D[i-1,j] 在第p+1格
+        reach = np.minimum(previous, np.pad(previous[:, 1:], ((0, 0), (0, 1)), constant_values=np.inf))
+    reach[:, invalid] = np.inf
+    running = np.cumsum(cost, axis=1)
+    current = running + np.minimum.accumulate(reach - running + cost, axis=1)
+    current[:, invalid] = np.inf
+    return current
+
+def dtw_distance(query, candidates, radius, weights=None):
+    """
+    以Sakoe-Chiba帶限制的DTW（平方距離，可依查詢位置加權），一次計算多個候選，逐列向量化（見_dtw_row）
+    :param query: ndarray, (bars,) 與所有候選比對；或 (M, bars) 與候選逐列配對
+    :param candidates: ndarray, (M, bars)
+    :return: ndarray, (M,) 累積平方距離
+    """
+    query = np.atleast_2d(query)
+    n = query.shape[1]
+    candidates = np.atleast_2d(candidates)
+    if weights is None:
+        weights = np.ones(n)
+    width = 2 * radius + 1
+    padded = np.pad(candidates, ((0, 0), (radius, radius)))
+    positions = np.arange(width) - radius
+    previous = None
+    for i in range(n):
+        invalid = (positions + i < 0) | (positions + i >= n)
+        cost = weights[i] * (query[:, i:i + 1] - padded[:, i:i + width]) ** 2
+        previous = _dtw_row(previous, cost, invalid, radius)
+    return previous[:, radius]
+
+def dtw_search(archive, target_date, top=TOP_K, band=DEFAULT_BAND, volume_weighted=False,
+               folder='.', batch_size=None, candidates=None):
+    """
+    以DTW找出路徑形狀最相似的交易日
+    依 max(LB_Kim, LB_Keogh) 由小到大分批計算精確DTW，下界已超過目前第top名的候選直接略過
+    :param target_date: str, 目標日(YYYYMMDD)，需在archive中
+    :param candidates: list, 只比對這些交易日（例如FeaturePanel.select的結果），None為全部
+    :return: tuple, (results, stats)；results為[(日期, DTW距離)]，由近到遠；
+             stats為candidates/pruned_kim/pruned_keogh/dtw_computed
+    """
+    dates = archive['dates']
+    matches = np.flatnonzero(dates == target_date)
+    if len(matches) == 0:
+        raise ValueError(f"找不到交易日: {target_date}")
+    target = matches[0]
+    paths = archive['paths']
+    bars = paths.shape[1]
+    radius = band_radius(bars, band)
+    upper, lower = cached_envelopes(archive, radius, folder)
+    query = paths[target]
+    weights = path_weights(archive['volumes'][target], volume_weighted)
+
+    allowed = np.arange(len(dates)) != target
+    if candidates is not None:
+        allowed &= np.isin(dates, list(candidates))
+    others = np.flatnonzero(allowed)
+    kim = lb_kim(query, paths[others], weights)
+    keogh = lb_keogh(query, upper[others], lower[others], weights)
+    bound = np.maximum(kim, keogh)
+    order = np.argsort(bound, kind='stable')
+    batch_size = batch_size or max(top, 16)
+
+    best_index = np.empty(0, dtype=int)
+    best_distance = np.empty(0)
+    computed = 0
+    for start in range(0, len(order), batch_size):
+        threshold = best_distance[-1] if len(best_distance) >= top else np.inf
+        batch = order[start:start + batch_size]
+        batch = batch[bound[batch] < threshold]
+        if len(batch) == 0:
+            break
+        distance = dtw_distance(query, paths[others[batch]], radius, weights)
+        computed += len(batch)
+        best_index = np.concatenate([best_index, batch])
+        best_distance = np.concatenate([best_distance, distance])
+        keep = np.argsort(best_distance, kind='stable')[:top]
+        best_index, best_distance = best_index[keep], best_distance[keep]
+
+    threshold = best_distance[-1] if len(best_distance) >= top else np.inf
+    stats = {'candidates': len(others),
+             'pruned_kim': int((kim >= threshold).sum()),
+             'pruned_keogh': int(((keogh >= threshold) & (kim < threshold)).sum()),
+             'dtw_computed': computed}
+    results = [(str(dates[others[i]]), float(np.sqrt(d))) for i, d in zip(best_index, best_distance)]
+    return results, stats
+
+def volume_profile(archive):
+    """歷史平均的日內成交量分布（平均為1），盤中比對時用來加權各分鐘"""
+    profile = archive['volumes'].mean(axis=0)
+    if profile.sum() <= 0:
+        return np.ones(len(profile))
+    return profile / profile.mean()
+
+class PrefixMatcher:
+    """
+    盤中前綴比對：今日開盤後前N分鐘的路徑與每個歷史交易日的同一時段比對
+    每個候選保留累積距離，每根新K棒只做一次O(天數)的向量化更新（dtw為O(天數×帶寬)），
+    隨時可取出目前最相似的交易日與它們之後的走勢
+    """
+
+    def __init__(self, archive, exclude=None, metric='euclidean', band=DEFAULT_BAND,
+                 volume_weighted=False):
+        """
+        :param exclude: str, 不列入候選的交易日（以歷史日模擬盤中時排除該日）
+        :param metric: str, 'euclidean'（同一分鐘逐點比對）或 'dtw'（終點不固定的DTW）
+        :param volume_weighted: bool, 依歷史平均的日內成交量分布加權各分鐘
+        """
+        if metric not in ('euclidean', 'dtw'):
+            raise ValueError(f"不支援的比對方式: {metric}")
+        keep = archive['dates'] != exclude
+        self.dates = archive['dates'][keep]
+        self.paths = archive['paths'][keep]
+        self.bars = self.paths.shape[1]
+        self.metric = metric
+        self.radius = band_radius(self.bars, band) if metric == 'dtw' else 0
+        self.weights = volume_profile(archive) if volume_weighted else np.ones(self.bars)
+        self._padded = np.pad(self.paths, ((0, 0), (self.radius, self.radius)))
+        # 各分鐘之後（含）的最高/最低，查詢後續走勢時不必再掃描
+        self.future_high = np.maximum.accumulate(self.paths[:, ::-1], axis=1)[:, ::-1]
+        self.future_low = np.minimum.accumulate(self.paths[:, ::-1], axis=1)[:, ::-1]
+        self.reset()
+
+    def reset(self):
+        self.values = []          # 今日每分鐘的路徑值（%）
+        self.open_price = None
+        self.state = None         # euclidean為(M,)累積距離，dtw為(M, 帶寬)目前一列
+        self._before_last = None  # 加入最後一分鐘前的狀態，形成中的K棒更新時由此重算
+
+    @property
+    def count(self):
+        """已比對的分鐘數"""
+        return len(self.values)
+
+    def _advance(self, state, i, value):
+        """由state加入第i分鐘的值，回傳新狀態（不修改state）"""
+        weight = self.weights[i]
+        if self.metric == 'dtw':
+            width = 2 * self.radius + 1
+            positions = np.arange(width) - self.radius + i
+            invalid = (positions < 0) | (positions >= self.bars)
+            cost = weight * (value - self._padded[:, i:i + width]) ** 2
+            return _dtw_row(state, cost, invalid, self.radius)
+        contribution = weight * (value - self.paths[:, i]) ** 2
+        return contribution if state is None else state + contribution
+
+    def _push(self, i, value):
+        self._before_last = self.state
+        self.state = self._advance(self.state, i, value)
+        self.values.append(value)
+
+    def update(self, offset, close, open_price=None):
+        """
+        加入（或更新）開盤後第offset分鐘的收盤價
+        新的一分鐘只累加一次；形成中的最後一根更新時由前一狀態重算；更早的K棒被修正時才全部重算
+        中間缺少的分鐘沿用前一分鐘的值
+        :param open_price: float, 今日開盤價，第一次呼叫時必須提供
+        """
+        if offset >= self.bars:
+            return
+        if self.open_price is None:
+            if open_price is None:
+                raise ValueError("第一根K棒需提供開盤價")
+            self.open_price = float(open_price)
+        value = (float(close) - self.open_price) / self.open_price * 100
+        if offset == self.count - 1:
+            self.values[offset] = value
+            self.state = self._advance(self._before_last, offset, value)
+        elif offset < self.count:
+            values = self.values
+            values[offset] = value
+            self.values, self.state, self._before_last = [], None, None
+            for i, v in enumerate(values):
+                self._push(i, v)
+        else:
+            last = self.values[-1] if self.values else value
+            for i in range(self.count, offset):
+                self._push(i, last)
+            self._push(offset, value)
+
+    def distances(self):
+        """每個候選目前的距離（每分鐘的均方根，%）"""
+        if self.state is None:
+            return np.zeros(len(self.dates))
+        total = self.state.min(axis=1) if self.metric == 'dtw' else self.state
+        return np.sqrt(total / self.count)
+
+    def top(self, k=TOP_K):
+        """
+        目前最相似的k個交易日與其之後的走勢（皆為相對該日開盤價的%）
+        :return: list, 每筆dict: date/distance/now（同一分鐘的位置）/rest（到收盤的變化）/
+                 max_rise/max_drop（之後的最高/最低相對now）/close（收盤）
+        """
+        if self.count == 0 or len(self.dates) == 0:
+            return []
+        distance = self.distances()
+        k = min(k, len(distance))
+        best = np.argpartition(distance, k - 1)[:k]
+        best = best[np.argsort(distance[best], kind='stable')]
+        i = self.count - 1
+        now = self.paths[best, i]
+        close = self.paths[best, -1]
+        if i + 1 < self.bars:
+            rise = self.future_high[best, i + 1] - now
+            drop = self.future_low[best, i + 1] - now
+        else:
+            rise = drop = np.zeros(len(best))
+        return [{'date': str(self.dates[j]), 'distance': float(distance[j]), 'now': float(now[n]),
+                 'rest': float(close[n] - now[n]), 'max_rise': float(rise[n]),
+                 'max_drop': float(drop[n]), 'close': float(close[n])}
+                for n, j in enumerate(best)]
+
+def print_prefix_top(label, count, results):
+    """輸出前綴比對的目前排名"""
+    print(f"\n=== {label}（開盤後 {count} 分鐘）===")
+    for rank, r in enumerate(results, 1):
+        print(f"第{rank}名｜{r['date']}｜距離 {r['distance']:.3f}｜當時 {r['now']:+.2f}%｜"
+              f"之後到收盤 {r['rest']:+.2f}%（最高 {r['max_rise']:+.2f}% / 最低 {r['max_drop']:+.2f}%）｜"
+              f"收盤 {r['close']:+.2f}%")
+
+def watch_live(matcher, ingest, top=TOP_K, on_update=print_prefix_top):
+    """
+    訂閱LiveIngest：每次K棒變動都更新比對，新K棒出現時回報目前前top名
+    :param on_update: callable, on_update(最新K棒的Date, 分鐘數, top結果)
+    """
+    from LiveIngest import minute_of
+    session = {}
+
+    def handle(bar, is_update):
+        hour, minute = minute_of(bar['Date']).split(':')
+        minutes = int(hour) * 60 + int(minute)
+        session.setdefault('start', minutes)
+        matcher.update((minutes - session['start']) % 1440, bar['Close'], bar['Open'])
+        if not is_update:
+            on_update(bar['Date'], matcher.count, matcher.top(top))
+
+    ingest.subscribe(handle)
+    return handle
+
+def replay_prefix(archive, date_str, minutes, folder='.', top=TOP_K, **matcher_kwargs):
+    """
+    以歷史交易日模擬盤中：逐分鐘餵入該日前minutes根K棒（該日不列入候選）
+    :return: tuple, (matcher, 每次更新的平均毫秒)
+    """
+    df = load_day(day_path(date_str, folder))
+    matcher = PrefixMatcher(archive, exclude=date_str, **matcher_kwargs)
+    offsets, _ = intraday_offsets(df)
+    open_price = float(df['Open'].iloc[0])
+    closes = df['Close'].to_numpy(dtype='float64')
+    started = time.perf_counter()
+    updates = 0
+    for offset, close in zip(offsets, closes):
+        if offset >= minutes:
+            break
+        matcher.update(int(offset), close, open_price)
+        updates += 1
+    elapsed = (time.perf_counter() - started) * 1000
+    return matcher, elapsed / max(updates, 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='以日內路徑形狀搜尋相似交易日')
+    parser.add_argument('date', nargs='?', help='目標日期(YYYYMMDD)；搭配--live時為盤中交易日')
+    parser.add_argument('--folder', default='.', help='資料存放目錄')
+    parser.add_argument('--top', type=int, default=TOP_K, help='列出的名次數')
+    parser.add_argument('--band', type=float, default=DEFAULT_BAND, help='Sakoe-Chiba帶寬（路徑長度比例）')
+    parser.add_argument('--volume-weighted', action='store_true', help='依成交量加權距離')
+    parser.add_argument('--rebuild', action='store_true', help='忽略快取重新讀取所有交易日')
+    parser.add_argument('--prefix', type=int, help='只比對開盤後前N分鐘（以目標日模擬盤中）')
+    parser.add_argument('--live', action='store_true', help='盤中即時比對（訂閱LiveIngest）')
+    parser.add_argument('--metric', choices=['euclidean', 'dtw'], default='euclidean',
+                        help='前綴比對的距離（--prefix/--live）')
+    parser.add_argument('--where', help='只比對特徵表中符合條件的交易日（pandas query語法，見FeaturePanel）')
+    args = parser.parse_args()
+    if not (args.date or args.live):
+        parser.error('請提供目標日期或使用 --live')
+
+    archive = load_archive(args.folder, rebuild=args.rebuild)
+    matcher_kwargs = {'metric': args.metric, 'band': args.band, 'volume_weighted': args.volume_weighted}
+    if args.live:
+        from LiveIngest import default_ingest
+        ingest = default_ingest(args.date)
+        watch_live(PrefixMatcher(archive, exclude=args.date, **matcher_kwargs), ingest, args.top)
+        print(f"開始盤中比對: {ingest.output_csv}（Ctrl+C 結束）")
+        ingest.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            ingest.stop()
+            sys.exit(0)
+    if args.prefix:
+        try:
+            matcher, per_update = replay_prefix(archive, args.date, args.prefix, args.folder, args.top,
+                                                **matcher_kwargs)
+        except FileNotFoundError as e:
+            print(f"錯誤：{e}")
+            sys.exit(1)
+        print_prefix_top(f"{args.date} 前綴比對", matcher.count, matcher.top(args.top))
+        print(f"\n每根K棒更新平均 {per_update:.3f} ms（{len(matcher.dates)} 個候選）")
+        sys.exit(0)
+
+    candidates = None
+    if args.where:
+        from FeaturePanel import FeaturePanel
+        panel = FeaturePanel(args.folder)
+        panel.update(archive)
+        try:
+            candidates = panel.select(args.where)
+        except Exception as e:
+            print(f"篩選條件錯誤：{e}")
+            sys.exit(1)
+    started = time.perf_counter()
+    try:
+        results, stats = dtw_search(archive, args.date, args.top, args.band, args.volume_weighted,
+                                    args.folder, candidates=candidates)
+    except ValueError as e:
+        print(f"錯誤：{e}")
+        sys.exit(1)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"目標交易日：{args.date}（形狀相似度，DTW距離越小越相似）")
+    for rank, (date, distance) in enumerate(results, 1):
+        print(f"第{rank}名｜{date}｜DTW距離：{distance:.4f}")
+    print(f"\n候選 {stats['candidates']} 日，LB_Kim排除 {stats['pruned_kim']}，"
+          f"LB_Keogh排除 {stats['pruned_keogh']}，計算DTW {stats['dtw_computed']}，耗時 {elapsed:.0f} ms")
@@ -0,0 +1,281 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from Average import atomic_path
+from practice import FEATURE_WEIGHTS
+from Similarity import load_archive, FEATURE_KEYS, TOP_K
+
+# 近似最近鄰索引檔，與K線資料放在同一目錄
+SIMILARITY_INDEX = 'similarity_index.npz'
+# 路徑以PAA降為PAA_SEGMENTS段（每段10分鐘）
+PAA_SEGMENTS = 30
+# 隨機投影LSH：LSH_TABLES張雜湊表；每張的超平面數None時依交易日數決定（約log2(N)+2）
+LSH_TABLES = 12
+LSH_BITS = None
+LSH_SEED = 0
+# 交易日數成長為建立時的這個倍數時重建，讓超平面數跟上資料量
+REBUILD_GROWTH = 4
+# 特徵部分相對於路徑部分的比重
+FEATURE_SCALE = 1.0
+# 互動查詢時交易日數達到這個數目才使用LSH；較少時精確搜尋已夠快（482日每次約0.2 ms）
+INDEX_MIN_DAYS = 2000
+
+def auto_bits(count):
+    """依交易日數決定每張表的超平面數，桶數約為交易日數的4倍"""
+    return int(np.clip(round(np.log2(max(count, 2))) + 2, 8, 20))
+
+def paa(paths, segments=PAA_SEGMENTS):
+    """
+    分段聚合近似（PAA）：將路徑切成segments段並取各段平均
+    各段乘上sqrt(段長/路徑長度)，使向量的歐氏距離不大於原路徑的均方根距離
+    :param paths: ndarray, (N, bars)
+    :return: ndarray, (N, segments)
+    """
+    bars = paths.shape[1]
+    edges = np.linspace(0, bars, segments + 1).astype(int)
+    lengths = np.diff(edges)
+    return np.add.reduceat(paths, edges[:-1], axis=1) / lengths * np.sqrt(lengths / bars)
+
+def embed(paths, features, feature_mean, feature_std):
+    """
+    每日的索引向量：PAA路徑 + 標準化後依FEATURE_WEIGHTS加權的特徵
+    :return: ndarray, (N, PAA_SEGMENTS + 特徵數)
+    """
+    weights = np.sqrt([FEATURE_WEIGHTS[key] for key in FEATURE_KEYS])
+    scaled = (features - feature_mean) / feature_std * weights * FEATURE_SCALE
+    return np.hstack([paa(paths), scaled])
+
+class SimilarityIndex:
+    """
+    以隨機投影LSH建立的相似交易日索引
+    查詢時只取出同一桶（及只差一個位元的相鄰桶）的交易日，再以實際距離排序；
+    新增或修改的交易日直接雜湊進既有的桶，不需重建
+    """
+
+    def __init__(self, folder='.', tables=LSH_TABLES, bits=LSH_BITS, seed=LSH_SEED):
+        self.folder = folder
+        self.tables = tables
+        self.requested_bits = bits
+        self.bits = bits
+        self.seed = seed
+        self.dates = []
+        self.mtimes = []
+        self.vectors = None
+        self.codes = None
+        self.planes = None
+        self.center = None
+        self.feature_mean = None
+        self.feature_std = None
+        self.built_size = 0
+        self._buckets = None
+        index_path = os.path.join(folder, SIMILARITY_INDEX)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with np.load(index_path) as saved:
+                if saved['planes'].shape[0] != tables or bits not in (None, saved['planes'].shape[1]):
+                    return
+                self.dates = saved['dates'].tolist()
+                self.mtimes = saved['mtimes'].tolist()
+                for key in ('vectors', 'codes', 'planes', 'center', 'feature_mean', 'feature_std'):
+                    setattr(self, key, saved[key])
+                self.bits = self.planes.shape[1]
+                self.built_size = int(saved['built_size'])
+        except Exception as e:
+            print(f"相似度索引損壞，重新建立: {e}")
+            self.dates, self.mtimes = [], []
+
+    def save(self):
+        with atomic_path(os.path.join(self.folder, SIMILARITY_INDEX)) as temp_path:
+            np.savez(temp_path, dates=np.array(self.dates, dtype='U8'),
+                     mtimes=np.array(self.mtimes, dtype='float64'), vectors=self.vectors, codes=self.codes,
+                     planes=self.planes, center=self.center, feature_mean=self.feature_mean,
+                     feature_std=self.feature_std, built_size=self.built_size)
+
+    def _hash(self, vectors):
+        """
+        :return: ndarray, (N, tables) 每張表的桶編號（bits個超平面的正負號組成的整數）
+        """
+        signs = np.einsum('nd,tbd->ntb', vectors - self.center, self.planes) > 0
+        return signs.astype('int64') @ (1 << np.arange(self.bits, dtype='int64'))
+
+    def _build(self, archive):
+        """以archive全部交易日重新建立索引（標準化參數與超平面只在此時決定）"""
+        self.feature_mean = archive['features'].mean(axis=0)
+        std = archive['features'].std(axis=0)
+        self.feature_std = np.where(std > 0, std, 1.0)
+        self.vectors = embed(archive['paths'], archive['features'], self.feature_mean, self.feature_std)
+        self.center = self.vectors.mean(axis=0)
+        rng = np.random.default_rng(self.seed)
+        self.built_size = len(self.vectors)
+        self.bits = self.requested_bits or auto_bits(self.built_size)
+        self.planes = rng.standard_normal((self.tables, self.bits, self.vectors.shape[1]))
+        self.codes = self._hash(self.vectors)
+        self.dates = archive['dates'].tolist()
+        self.mtimes = archive['mtimes'].tolist()
+        self._buckets = None
+
+    def buckets(self):
+        """每張表的 桶編號 → 位置清單，載入後第一次查詢時建立"""
+        if self._buckets is None:
+            self._buckets = [{} for _ in range(self.tables)]
+            for pos, row in enumerate(self.codes.tolist()):
+                for table, code in enumerate(row):
+                    self._buckets[table].setdefault(code, []).append(pos)
+        return self._buckets
+
+    def update(self, archive=None, rebuild=False):
+        """
+        加入新交易日、重新雜湊修改過的交易日並寫回索引檔
+        :param archive: dict, Similarity.load_archive的結果，None時自動讀取
+        :return: int, 加入或更新的交易日數
+        """
+        if archive is None:
+            archive = load_archive(self.folder)
+        if (rebuild or not self.dates
+                or len(archive['dates']) >= REBUILD_GROWTH * max(self.built_size, 1)):
+            self._build(archive)
+            self.save()
+            return len(self.dates)
+
+        positions = {d: i for i, d in enumerate(self.dates)}
+        changed = [i for i, (d, mtime) in enumerate(zip(archive['dates'].tolist(),
+                                                         archive['mtimes'].tolist()))
+                   if positions.get(d) is None or self.mtimes[positions[d]] != mtime]
+        if not changed:
+            return 0
+        vectors = embed(archive['paths'][changed], archive['features'][changed],
+                        self.feature_mean, self.feature_std)
+        codes = self._hash(vectors)
+        buckets = self.buckets()
+        new_vectors, new_codes = [], []
+        for row, vector, code in zip(changed, vectors, codes):
+            date_str = str(archive['dates'][row])
+            pos = positions.get(date_str)
+            if pos is None:
+                pos = positions[date_str] = len(self.dates)
+                self.dates.append(date_str)
+                self.mtimes.append(float(archive['mtimes'][row]))
+                new_vectors.append(vector)
+                new_codes.append(code)
+            else:
+                for table, old in enumerate(self.codes[pos].tolist()):
+                    buckets[table][old].remove(pos)
+                self.mtimes[pos] = float(archive['mtimes'][row])
+                self.vectors[pos] = vector
+                self.codes[pos] = code
+            for table, bucket in enumerate(code.tolist()):
+                buckets[table].setdefault(bucket, []).append(pos)
+        if new_vectors:
+            self.vectors = np.vstack([self.vectors, new_vectors])
+            self.codes = np.vstack([self.codes, new_codes])
+        self.save()
+        return len(changed)
+
+    def vector(self, date_str):
+        if date_str not in self.dates:
+            raise ValueError(f"索引中沒有交易日: {date_str}")
+        return self.vectors[self.dates.index(date_str)]
+
+    def candidates(self, vector, probes=1):
+        """
+        取出可能相似的交易日位置
+        :param probes: int, 0只查同一桶，1再查各表只差一個位元的桶
+        """
+        code = self._hash(vector[None, :])[0].tolist()
+        flips = [0] + ([1 << b for b in range(self.bits)] if probes else [])
+        found = set()
+        for table, bucket_map in enumerate(self.buckets()):
+            for flip in flips:
+                found.update(bucket_map.get(code[table] ^ flip, ()))
+        return np.fromiter(found, dtype=int, count=len(found))
+
+    def _rank(self, vector, positions, top, exclude):
+        positions = positions[np.array([self.dates[p] != exclude for p in positions], dtype=bool)] \
+            if exclude is not None and len(positions) else positions
+        distance = np.sqrt(((self.vectors[positions] - vector) ** 2).sum(axis=1))
+        order = np.argsort(distance, kind='stable')[:top]
+        return [(self.dates[positions[i]], float(distance[i])) for i in order]
+
+    def query(self, date_str, top=TOP_K, probes=1):
+        """
+        以LSH查詢與某日最相似的交易日（不含該日）
+        :return: tuple, (results, examined)；results為[(日期, 向量距離)]，examined為實際比對的交易日數
+        """
+        vector = self.vector(date_str)
+        positions = self.candidates(vector, probes)
+        return self._rank(vector, positions, top, date_str), len(positions)
+
+    def search(self, date_str, top=TOP_K, probes=1, min_days=INDEX_MIN_DAYS):
+        """
+        互動查詢用：交易日數達min_days時以LSH查詢，否則（或候選不足top名時）改為精確搜尋
+        :return: tuple, (results, examined)；精確搜尋時examined為全部交易日數
+        """
+        if len(self.dates) >= min_days:
+            results, examined = self.query(date_str, top, probes)
+            if len(results) >= min(top, len(self.dates) - 1):
+                return results, examined
+        return self.exact(date_str, top), len(self.dates)
+
+    def exact(self, date_str, top=TOP_K):
+        """逐一比對所有交易日的精確結果（衡量召回率用）"""
+        return self._rank(self.vector(date_str), np.arange(len(self.dates)), top, date_str)
+
+    def measure_recall(self, top=TOP_K, probes=1, sample=None, seed=0):
+        """
+        以精確搜尋為基準衡量召回率
+        :param sample: int, 抽樣的查詢日數，None為全部交易日
+        :return: dict, recall/examined（平均比對比例）/ann_ms/exact_ms（平均每次查詢）
+        """
+        dates = self.dates
+        if sample and sample < len(dates):
+            dates = list(np.random.default_rng(seed).choice(dates, sample, replace=False))
+        recall, examined, ann_time, exact_time = [], [], 0.0, 0.0
+        for date_str in dates:
+            started = time.perf_counter()
+            results, count = self.query(date_str, top, probes)
+            ann_time += time.perf_counter() - started
+            started = time.perf_counter()
+            truth = self.exact(date_str, top)
+            exact_time += time.perf_counter() - started
+            recall.append(len({d for d, _ in results} & {d for d, _ in truth}) / max(len(truth), 1))
+            examined.append(count / len(self.dates))
+        return {'recall': float(np.mean(recall)), 'examined': float(np.mean(examined)),
+                'ann_ms': ann_time / len(dates) * 1000, 'exact_ms': exact_time / len(dates) * 1000}
+
+def update_similarity_index(folder='.'):
+    """匯入新交易日後呼叫：增量更新相似度快取與索引"""
+    updated = SimilarityIndex(folder).update(load_archive(folder))
+    if updated:
+        print(f"相似度索引已更新 {updated} 個交易日")
+    return updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='建立（增量更新）相似交易日的LSH索引並查詢')
+    parser.add_argument('date', nargs='?', help='查詢與此日最相似的交易日(YYYYMMDD)')
+    parser.add_argument('--folder', default='.', help='資料存放目錄')
+    parser.add_argument('--top', type=int, default=TOP_K, help='列出的名次數')
+    parser.add_argument('--probes', type=int, choices=[0, 1], default=1, help='是否查詢相鄰桶')
+    parser.add_argument('--rebuild', action='store_true', help='重新建立索引')
+    parser.add_argument('--recall', action='store_true', help='以精確搜尋衡量召回率')
+    args = parser.parse_args()
+
+    index = SimilarityIndex(args.folder)
+    updated = index.update(load_archive(args.folder), rebuild=args.rebuild)
+    print(f"相似度索引: {len(index.dates)} 個交易日，本次更新 {updated} 個")
+    if args.recall:
+        stats = index.measure_recall(args.top, args.probes)
+        print(f"前{args.top}名召回率 {stats['recall']:.1%}，平均比對 {stats['examined']:.1%} 的交易日，"
+              f"每次查詢 {stats['ann_ms']:.2f} ms（精確搜尋 {stats['exact_ms']:.2f} ms）")
+    if args.date:
+        try:
+            results, examined = index.query(args.date, args.top, args.probes)
+        except ValueError as e:
+            print(f"錯誤：{e}")
+            sys.exit(1)
+        print(f"目標交易日：{args.date}（比對 {examined} 個交易日）")
+        for rank, (date, distance) in enumerate(results, 1):
+            print(f"第{rank}名｜{date}｜距離：{distance:.4f}")
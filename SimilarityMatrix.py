@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from Average import atomic_path
+from practice import FEATURE_WEIGHTS
+from Similarity import load_archive, dtw_distance, band_radius, DEFAULT_BAND, FEATURE_KEYS, TOP_K
+
+# 矩陣的索引檔（日期順序、修改時間、容量）與兩個記憶體映射矩陣
+MATRIX_INDEX = 'similarity_matrix.json'
+MATRIX_FILES = {'score': 'similarity_matrix_score.npy', 'dtw': 'similarity_matrix_dtw.npy'}
+# 每批計算DTW的日期配對數，暫存陣列大小約為 配對數×帶寬
+BLOCK_PAIRS = 4096
+# 容量不足時加倍，避免每加入一天就重寫整個矩陣
+INITIAL_CAPACITY = 512
+COPY_ROWS = 256
+WEIGHT_VECTOR = np.array([FEATURE_WEIGHTS[key] for key in FEATURE_KEYS])
+CATEGORICAL = np.array([key == 'support_break' for key in FEATURE_KEYS])
+
+def feature_scores(target, candidates):
+    """
+    practice.calculate_similarity總分的向量化版本，target與candidates可互相廣播
+    :param target: ndarray, (..., 特徵數)，欄位順序同FEATURE_KEYS
+    :return: ndarray, (...)
+    """
+    numeric = 1 - np.abs(target - candidates) / (np.abs(target) + np.abs(candidates) + 1e-8)
+    scores = np.where(CATEGORICAL, target == candidates, numeric)
+    return scores @ WEIGHT_VECTOR
+
+class SimilarityMatrix:
+    """
+    所有交易日兩兩之間的特徵相似度（calculate_similarity總分）與形狀距離（DTW），存為記憶體映射矩陣
+    每個交易日的位置依加入順序固定；新增或修改的交易日只計算一列，並同時寫入對應的一行
+    """
+
+    def __init__(self, folder='.', band=DEFAULT_BAND):
+        self.folder = folder
+        self.band = band
+        self.dates = []
+        self.mtimes = []
+        self.capacity = 0
+        self.radius = None
+        self.matrices = {}
+        index_path = os.path.join(folder, MATRIX_INDEX)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            matrices = {kind: np.lib.format.open_memmap(os.path.join(folder, name), mode='r+')
+                        for kind, name in MATRIX_FILES.items()}
+        except Exception as e:
+            print(f"相似度矩陣損壞，重新建立: {e}")
+            return
+        self.dates, self.mtimes = index['dates'], index['mtimes']
+        self.capacity, self.radius = index['capacity'], index['radius']
+        self.matrices = matrices
+
+    def _grow(self, needed):
+        """容量不足時以加倍的容量重建矩陣檔，分段複製既有內容"""
+        capacity = max(self.capacity, INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity and self.matrices:
+            return
+        for kind, name in MATRIX_FILES.items():
+            path = os.path.join(self.folder, name)
+            with atomic_path(path) as temp_path:
+                grown = np.lib.format.open_memmap(temp_path, mode='w+', dtype='float32',
+                                                  shape=(capacity, capacity))
+                grown[:] = np.nan
+                old = self.matrices.get(kind)
+                n = len(old) if old is not None else 0
+                for start in range(0, n, COPY_ROWS):
+                    end = min(start + COPY_ROWS, n)
+                    grown[start:end, :n] = old[start:end, :n]
+                grown.flush()
+                # 取代前先關閉新舊映射（Windows無法取代開啟中的檔案）
+                del grown, old
+                self.matrices.pop(kind, None)
+            self.matrices[kind] = np.lib.format.open_memmap(path, mode='r+')
+        self.capacity = capacity
+
+    def _save_index(self):
+        for matrix in self.matrices.values():
+            matrix.flush()
+        # 索引最後寫入：中斷時尚未記錄的交易日下次會重新計算
+        index = {'dates': self.dates, 'mtimes': self.mtimes, 'capacity': self.capacity,
+                 'radius': self.radius, 'band': self.band}
+        with atomic_path(os.path.join(self.folder, MATRIX_INDEX)) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+
+    def _write_pairs(self, rows, cols, paths):
+        """計算一批配對的DTW距離，寫入(i, j)與(j, i)"""
+        rows, cols = np.array(rows), np.array(cols)
+        distance = np.sqrt(dtw_distance(paths[rows], paths[cols], self.radius)).astype('float32')
+        self.matrices['dtw'][rows, cols] = distance
+        self.matrices['dtw'][cols, rows] = distance
+
+    def update(self, archive=None, block_pairs=BLOCK_PAIRS, verbose=True):
+        """
+        加入新交易日並重算修改過的交易日（帶寬改變時全部重算）
+        特徵相似度每列一次廣播計算；DTW將需要的配對分批（每批block_pairs個）計算，每對只算一次
+        :param archive: dict, Similarity.load_archive的結果，None時自動讀取
+        :return: int, 重新計算的交易日數
+        """
+        if archive is None:
+            archive = load_archive(self.folder)
+        radius = band_radius(archive['paths'].shape[1], self.band)
+        recompute_all = radius != self.radius
+        self.radius = radius
+
+        positions = {d: i for i, d in enumerate(self.dates)}
+        dirty = []
+        for date_str, mtime in zip(archive['dates'].tolist(), archive['mtimes'].tolist()):
+            pos = positions.get(date_str)
+            if pos is None:
+                positions[date_str] = pos = len(self.dates)
+                self.dates.append(date_str)
+                self.mtimes.append(mtime)
+            elif not recompute_all and self.mtimes[pos] == mtime:
+                continue
+            self.mtimes[pos] = mtime
+            dirty.append(pos)
+        if not dirty:
+            return 0
+        self._grow(len(self.dates))
+
+        # 矩陣位置 → archive中的列；已不在archive的交易日保留原值，不參與計算
+        archive_rows = {d: i for i, d in enumerate(archive['dates'].tolist())}
+        source = np.array([archive_rows.get(d, -1) for d in self.dates])
+        available = source >= 0
+        features = archive['features'][np.where(available, source, 0)]
+        paths = archive['paths'][np.where(available, source, 0)]
+        is_dirty = np.zeros(len(self.dates), dtype=bool)
+        is_dirty[dirty] = True
+
+        started = time.perf_counter()
+        pending_rows, pending_cols = [], []
+        for n, pos in enumerate(dirty, 1):
+            # 與其他變動交易日的配對只由位置較大的一方計算
+            others = np.flatnonzero(available & (~is_dirty | (np.arange(len(self.dates)) <= pos)))
+            scores = feature_scores(features[pos], features[others]).astype('float32')
+            self.matrices['score'][pos, others] = scores
+            self.matrices['score'][others, pos] = scores
+            pending_rows.extend([pos] * len(others))
+            pending_cols.extend(others.tolist())
+            while len(pending_rows) >= block_pairs:
+                self._write_pairs(pending_rows[:block_pairs], pending_cols[:block_pairs], paths)
+                del pending_rows[:block_pairs], pending_cols[:block_pairs]
+            if verbose and (n % 50 == 0 or n == len(dirty)):
+                print(f"已計算 {n}/{len(dirty)} 個交易日（{time.perf_counter() - started:.1f} 秒）")
+        if pending_rows:
+            self._write_pairs(pending_rows, pending_cols, paths)
+        self._save_index()
+        return len(dirty)
+
+    def matrix(self, kind='score'):
+        """
+        :param kind: str, 'score'（特徵相似度，越大越相似）或 'dtw'（形狀距離，越小越相似）
+        :return: tuple, (dates, N×N的記憶體映射view)
+        """
+        n = len(self.dates)
+        return self.dates, self.matrices[kind][:n, :n]
+
+    def most_similar(self, date_str, top=TOP_K, kind='score'):
+        """
+        由矩陣直接查出與某日最相似的交易日
+        :return: list, [(日期, 特徵相似度或DTW距離)]
+        """
+        if date_str not in self.dates:
+            raise ValueError(f"矩陣中沒有交易日: {date_str}")
+        dates, matrix = self.matrix(kind)
+        pos = dates.index(date_str)
+        row = np.array(matrix[pos], dtype='float64')
+        row[pos] = np.nan
+        valid = np.flatnonzero(~np.isnan(row))
+        order = valid[np.argsort(-row[valid] if kind == 'score' else row[valid], kind='stable')][:top]
+        return [(dates[i], float(row[i])) for i in order]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='計算（增量更新）所有交易日兩兩之間的相似度矩陣')
+    parser.add_argument('--folder', default='.', help='資料存放目錄')
+    parser.add_argument('--band', type=float, default=DEFAULT_BAND, help='DTW的Sakoe-Chiba帶寬（路徑長度比例）')
+    parser.add_argument('--block-pairs', type=int, default=BLOCK_PAIRS, help='每批計算DTW的配對數')
+    parser.add_argument('--date', help='更新後列出與此日最相似的交易日')
+    parser.add_argument('--kind', choices=['score', 'dtw'], default='score', help='查詢使用的矩陣')
+    parser.add_argument('--top', type=int, default=TOP_K, help='列出的名次數')
+    args = parser.parse_args()
+
+    matrix = SimilarityMatrix(args.folder, args.band)
+    started = time.perf_counter()
+    updated = matrix.update(block_pairs=args.block_pairs)
+    print(f"相似度矩陣: {len(matrix.dates)} 個交易日，本次重算 {updated} 個，"
+          f"耗時 {time.perf_counter() - started:.1f} 秒")
+    if args.date:
+        try:
+            results = matrix.most_similar(args.date, args.top, args.kind)
+        except ValueError as e:
+            print(f"錯誤：{e}")
+            sys.exit(1)
+        label = '特徵相似度' if args.kind == 'score' else 'DTW距離'
+        for rank, (date, value) in enumerate(results, 1):
+            print(f"第{rank}名｜{date}｜{label}：{value:.4f}")
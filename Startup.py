@@ -0,0 +1,166 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+
+# 分析模式下子程序以此環境變數得知要回報啟動事件
+PROFILE_ENV = 'STARTUP_PROFILE'
+MARK_PREFIX = 'startup-mark:'
+# 啟動到第一個視窗出現的目標時間（毫秒）
+FIRST_WINDOW_TARGET_MS = 500
+PROFILE_FLAG = '--profile-startup'
+
+def profiling():
+    """是否在 --profile-startup 的子程序中執行"""
+    return os.environ.get(PROFILE_ENV) == '1'
+
+def current_rss_mb():
+    """目前程序的常駐記憶體(MB)，有psutil時使用psutil，否則讀/proc；都無法取得時回傳None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def mark(event):
+    """
+    回報啟動事件（first_window：視窗已顯示；ready：背景初始化完成），一般執行時不做任何事
+    標記寫入stderr，與 -X importtime 的輸出同一資料流，可據以區分視窗出現前後的import；
+    能取得記憶體用量時一併附上當時的RSS(MB)
+    """
+    if profiling():
+        rss = current_rss_mb()
+        suffix = f" {rss:.1f}" if rss is not None else ''
+        sys.stderr.write(f"{MARK_PREFIX}{event}{suffix}\n")
+        sys.stderr.flush()
+
+def _parse_mark(line):
+    """startup-mark行 → (事件, RSS MB或None)"""
+    parts = line[len(MARK_PREFIX):].split()
+    return parts[0], (float(parts[1]) if len(parts) > 1 else None)
+
+def run_in_background(task, on_done):
+    """
+    以背景執行緒執行task()，完成後在該執行緒呼叫on_done(result, error)
+    GUI程式需在on_done中自行轉回主執行緒（Qt用signal、Tk用佇列）
+    """
+    def run():
+        try:
+            result, error = task(), None
+        except Exception as e:
+            result, error = None, e
+        on_done(result, error)
+    thread = threading.Thread(target=run, name='StartupInit', daemon=True)
+    thread.start()
+    return thread
+
+def parse_importtime(lines):
+    """
+    彙整 -X importtime 的輸出
+    :param lines: list, stderr各行（含startup-mark標記）
+    :return: list, 每個頂層套件一筆dict(package/phase/self_ms/cumulative_ms)，依cumulative_ms由大到小；
+             phase為'window'（第一個視窗出現前）或'background'
+    """
+    totals = {}
+    phase = 'window'
+    for line in lines:
+        if line.startswith(MARK_PREFIX):
+            if _parse_mark(line)[0] == 'first_window':
+                phase = 'background'
+            continue
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line.split('|', 2)
+        if len(parts) != 3:
+            continue
+        self_part, cumulative_us, name = parts
+        self_us = int(self_part.split(':')[-1])
+        depth = (len(name) - len(name.lstrip())) // 2
+        package = name.strip().split('.')[0]
+        entry = totals.setdefault((package, phase), {'package': package, 'phase': phase,
+                                                     'self_ms': 0.0, 'cumulative_ms': 0.0})
+        entry['self_ms'] += self_us / 1000
+        # 只有最外層的import計入累計時間，避免巢狀import重複計算
+        if depth == 0:
+            entry['cumulative_ms'] += int(cumulative_us) / 1000
+    return sorted(totals.values(), key=lambda e: e['cumulative_ms'], reverse=True)
+
+def profile_startup(script, args=(), top=15, timeout=120):
+    """
+    以 python -X importtime 重新啟動script，量測到第一個視窗與背景初始化完成的時間，並列出import耗時
+    子程序在ready後自行結束（見mark/profiling）
+    :param script: str, 要分析的程式路徑
+    :param args: list, 傳給程式的其他參數
+    :return: dict, first_window_ms/ready_ms/first_window_rss_mb/ready_rss_mb/imports
+    """
+    env = dict(os.environ, **{PROFILE_ENV: '1'})
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', script, *args],
+                               stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                               env=env, text=True, encoding='utf-8', errors='replace')
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    lines, marks, rss = [], {}, {}
+    try:
+        for line in process.stderr:
+            if line.startswith(MARK_PREFIX):
+                event, rss[event] = _parse_mark(line)
+                marks[event] = (time.perf_counter() - started) * 1000
+            elif not line.startswith('import time:'):
+                sys.stderr.write(line)
+            lines.append(line.rstrip('\n'))
+        process.wait()
+    finally:
+        timer.cancel()
+
+    imports = parse_importtime(lines)
+    first_window, ready = marks.get('first_window'), marks.get('ready')
+    print(f"=== 啟動分析: {os.path.basename(script)} ===")
+    for phase, title in (('window', '視窗出現前'), ('background', '背景初始化')):
+        rows = [e for e in imports if e['phase'] == phase and e['cumulative_ms'] > 0]
+        print(f"\n{title}的import（前{top}名，累計毫秒 / 自身毫秒）:")
+        if not rows:
+            print("  無")
+        for e in rows[:top]:
+            print(f"  {e['package']:<28}{e['cumulative_ms']:>10.1f}{e['self_ms']:>10.1f}")
+        print(f"  {'合計':<26}{sum(e['cumulative_ms'] for e in rows):>10.1f}")
+    print()
+    if first_window is None:
+        print(f"未收到第一個視窗的標記（結束碼 {process.returncode}）")
+    else:
+        status = '達成' if first_window <= FIRST_WINDOW_TARGET_MS else '未達成'
+        print(f"第一個視窗出現: {first_window:.0f} ms（目標 {FIRST_WINDOW_TARGET_MS} ms，{status}）"
+              + _format_rss(rss.get('first_window')))
+    if ready is not None:
+        print(f"背景初始化完成: {ready:.0f} ms" + _format_rss(rss.get('ready')))
+    for event in marks:
+        if event not in ('first_window', 'ready'):
+            print(f"{event}: {marks[event]:.0f} ms" + _format_rss(rss.get(event)))
+    return {'first_window_ms': first_window, 'ready_ms': ready, 'first_window_rss_mb': rss.get('first_window'),
+            'ready_rss_mb': rss.get('ready'), 'imports': imports}
+
+def _format_rss(rss_mb):
+    return f"，RSS {rss_mb:.0f} MB" if rss_mb is not None else ''
+
+def handle_profile_flag(script):
+    """程式進入點呼叫：命令列含 --profile-startup 時改為分析啟動時間並結束"""
+    if PROFILE_FLAG not in sys.argv[1:]:
+        return
+    args = [a for a in sys.argv[1:] if a != PROFILE_FLAG]
+    result = profile_startup(script, args)
+    sys.exit(0 if result['first_window_ms'] is not None else 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='分析程式的啟動時間與import耗時')
+    parser.add_argument('script', help='要分析的程式，例如 KReplay.py')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='傳給程式的參數')
+    parser.add_argument('--top', type=int, default=15, help='每個階段列出的套件數')
+    args = parser.parse_args()
+    profile_startup(args.script, args.args, top=args.top)
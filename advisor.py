@@ -1,9 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pandas as pd
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import sys
+import queue
+
+from Startup import mark, run_in_background, profiling, handle_profile_flag
+
+# pandas与matplotlib较重，窗口显示后才在后台线程载入（见load_heavy_modules）
+pd = plt = FigureCanvasTkAgg = None
+
+def load_heavy_modules():
+    """载入pandas与matplotlib并设为本模块的全局名称"""
+    global pd, plt, FigureCanvasTkAgg
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+def read_data_files(prob_path, detailed_path):
+    """
+    （后台线程）载入模块并读取两个数据文件
+    :return: tuple, (prob_df, detailed_df)，任一文件不存在时为None
+    """
+    load_heavy_modules()
+    if os.path.exists(prob_path) and os.path.exists(detailed_path):
+        return pd.read_csv(prob_path), pd.read_csv(detailed_path)
+    return None
 
 class IntradayAdvisor:
     def __init__(self, master):
@@ -22,12 +43,73 @@ class IntradayAdvisor:
         self.data_loaded = False
         self.prob_df = None
         self.detailed_df = None
+        self.feature_panel = None
         
         # 创建UI控件
         self.create_controls()
         
-        # 尝试自动加载数据
-        self.try_load_data()
+        # 即时模式：汇入线程送来的K棒先放入队列，由Tk主线程取出
+        self.live_queue = queue.Queue()
+        self.live_ingest = None
+        
+        # 窗口显示后再于后台尝试自动加载数据
+        self.startup_queue = queue.Queue()
+        self.master.after(0, self.start_background_init)
+    
+    def start_background_init(self):
+        self.master.update_idletasks()
+        mark('first_window')
+        self.result_text.insert(tk.END, "正在载入模块与数据...\n")
+        prob_path = self.data_path_var.get()
+        detailed_path = self.detailed_path_var.get()
+        run_in_background(lambda: read_data_files(prob_path, detailed_path),
+                          lambda frames, error: self.startup_queue.put((frames, error)))
+        self.master.after(50, self.check_startup)
+    
+    def check_startup(self):
+        # 与即时模式相同，由Tk主线程轮询后台线程的结果
+        try:
+            frames, error = self.startup_queue.get_nowait()
+        except queue.Empty:
+            self.master.after(50, self.check_startup)
+            return
+        self.try_load_data(frames, error)
+        mark('ready')
+        if profiling():
+            self.master.after(0, self.master.destroy)
+    
+    def attach_live(self, ingest):
+        """订阅LiveIngest，依最新K棒时间自动切换当前交易时段"""
+        self.live_ingest = ingest
+        ingest.subscribe(lambda bar, is_update: self.live_queue.put(bar))
+        ingest.start()
+        self.master.after(250, self.drain_live_queue)
+    
+    def drain_live_queue(self):
+        latest = None
+        while True:
+            try:
+                latest = self.live_queue.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            minute = latest['Date'].split()[-1].zfill(5)
+            # 时段结束后的下一根K棒到达时才切换
+            if minute >= "13:00":
+                checkpoint = "13:00"
+            elif minute >= "10:00":
+                checkpoint = "10:00"
+            elif minute >= "09:46":
+                checkpoint = "9:45"
+            elif minute >= "09:16":
+                checkpoint = "9:15"
+            else:
+                checkpoint = "8:45"
+            if checkpoint != self.time_var.get():
+                self.time_var.set(checkpoint)
+                self.update_selection_ui()
+                self.result_text.insert(tk.END, f"即时K棒 {latest['Date']}，当前交易时段切换为 {checkpoint}\n")
+        self.master.after(250, self.drain_live_queue)
     
     def create_controls(self):
         # 数据加载部分
@@ -58,6 +140,11 @@ class IntradayAdvisor:
         # 初始化选择框
         self.create_selection_ui()
         
+        # 以特征表（FeaturePanel）的条件先筛选交易日，例如 `inst_外資` > 0 and volatility > 0.01
+        ttk.Label(self.setup_frame, text="特征表条件:").grid(row=5, column=0, sticky=tk.W)
+        self.panel_filter_var = tk.StringVar()
+        ttk.Entry(self.setup_frame, textvariable=self.panel_filter_var, width=50).grid(row=5, column=1, sticky=tk.W)
+        
         # 查询按钮
         ttk.Button(self.setup_frame, text="查询概率", command=self.query_probabilities).grid(row=10, column=0, pady=10)
         ttk.Button(self.setup_frame, text="重置选择", command=self.reset_selection).grid(row=10, column=1, pady=10)
@@ -200,22 +287,17 @@ class IntradayAdvisor:
         if isinstance(widget, ttk.Combobox):
             widget.configure(state=state)
     
-    def try_load_data(self):
-        # 尝试加载数据文件
-        prob_path = self.data_path_var.get()
-        detailed_path = self.detailed_path_var.get()
-        
-        if os.path.exists(prob_path) and os.path.exists(detailed_path):
-            try:
-                self.prob_df = pd.read_csv(prob_path)
-                self.detailed_df = pd.read_csv(detailed_path)
-                self.data_loaded = True
-                self.result_text.insert(tk.END, "数据加载成功!\n")
-                self.result_text.insert(tk.END, f"找到 {len(self.prob_df)} 种组合模式\n")
-                self.result_text.insert(tk.END, f"包含 {len(self.detailed_df)} 个交易日数据\n")
-            except Exception as e:
-                self.result_text.insert(tk.END, f"数据加载失败: {str(e)}\n")
-                self.data_loaded = False
+    def try_load_data(self, frames, error):
+        # 套用后台线程读取数据文件的结果（frames为None表示文件不存在）
+        if error is not None:
+            self.result_text.insert(tk.END, f"数据加载失败: {str(error)}\n")
+            self.data_loaded = False
+        elif frames is not None:
+            self.prob_df, self.detailed_df = frames
+            self.data_loaded = True
+            self.result_text.insert(tk.END, "数据加载成功!\n")
+            self.result_text.insert(tk.END, f"找到 {len(self.prob_df)} 种组合模式\n")
+            self.result_text.insert(tk.END, f"包含 {len(self.detailed_df)} 个交易日数据\n")
         else:
             self.result_text.insert(tk.END, "数据文件不存在，请加载数据\n")
             self.data_loaded = False
@@ -232,9 +314,14 @@ class IntradayAdvisor:
             messagebox.showerror("错误", f"文件不存在: {detailed_path}")
             return
         
+        if pd is None:
+            messagebox.showwarning("警告", "模块仍在载入中，请稍候")
+            return
+        
         try:
             self.prob_df = pd.read_csv(prob_path)
             self.detailed_df = pd.read_csv(detailed_path)
+            self.feature_panel = None
             self.data_loaded = True
             
             # 更新结果文本框
@@ -302,18 +389,46 @@ class IntradayAdvisor:
             messagebox.showwarning("警告", "请先加载数据")
             return
         
+        df = self.filtered_detailed_df()
+        if df is None:
+            return
+        
         # 获取当前选择
         current_time = self.time_var.get()
         
         # 根据当前时间执行不同的查询
         if current_time == "9:15":
-            self.query_for_915()
+            self.query_for_915(df)
         elif current_time == "9:45":
-            self.query_for_945()
+            self.query_for_945(df)
         else:
-            self.query_general()
+            self.query_general(df)
+        
+        expr = self.panel_filter_var.get().strip()
+        if expr:
+            self.result_text.insert(tk.END, f"\n特征表条件: {expr}（{len(df)} 个交易日）\n")
+    
+    def filtered_detailed_df(self):
+        """
+        以特征表条件筛选详细数据的交易日，条件留空时为全部交易日
+        特征表（feature_panel.npz）与详细数据文件放在同一目录，第一次使用时才读取
+        :return: DataFrame，条件错误时为None
+        """
+        expr = self.panel_filter_var.get().strip()
+        if not expr:
+            return self.detailed_df
+        try:
+            if self.feature_panel is None:
+                from FeaturePanel import FeaturePanel
+                folder = os.path.dirname(os.path.abspath(self.detailed_path_var.get()))
+                self.feature_panel = FeaturePanel(folder)
+            dates = set(self.feature_panel.select(expr))
+        except Exception as e:
+            messagebox.showerror("错误", f"特征表条件错误: {str(e)}")
+            return None
+        return self.detailed_df[self.detailed_df['date'].astype(str).isin(dates)]
     
-    def query_for_915(self):
+    def query_for_915(self, df):
         """9:15时的查询 - 开盘时段结束"""
         # 获取开盘时段选择
         ft_class = self.ft_class_var.get()
@@ -327,10 +442,10 @@ class IntradayAdvisor:
         ft_desc = f"{ft_class}({ft_change})"
         
         # 筛选数据
-        condition = (self.detailed_df['first_trade_class'] == ft_class) & \
-                   (self.detailed_df['first_trade_change'] == ft_change)
+        condition = (df['first_trade_class'] == ft_class) & \
+                   (df['first_trade_change'] == ft_change)
         
-        subset = self.detailed_df[condition]
+        subset = df[condition]
         
         if subset.empty:
             self.result_text.delete(1.0, tk.END)
@@ -378,7 +493,7 @@ class IntradayAdvisor:
         # 创建图表
         self.create_charts(st_group, tt_group, high_prob, low_prob, "9:15 时段预测")
     
-    def query_for_945(self):
+    def query_for_945(self, df):
         """9:45时的查询 - 中间时段结束"""
         # 获取开盘和中间时段选择
         ft_class = self.ft_class_var.get()
@@ -395,12 +510,12 @@ class IntradayAdvisor:
         st_desc = f"{st_class}({st_change})"
         
         # 筛选数据
-        condition = (self.detailed_df['first_trade_class'] == ft_class) & \
-                   (self.detailed_df['first_trade_change'] == ft_change) & \
-                   (self.detailed_df['second_trade_class'] == st_class) & \
-                   (self.detailed_df['second_trade_change'] == st_change)
+        condition = (df['first_trade_class'] == ft_class) & \
+                   (df['first_trade_change'] == ft_change) & \
+                   (df['second_trade_class'] == st_class) & \
+                   (df['second_trade_change'] == st_change)
         
-        subset = self.detailed_df[condition]
+        subset = df[condition]
         
         if subset.empty:
             self.result_text.delete(1.0, tk.END)
@@ -438,7 +553,7 @@ class IntradayAdvisor:
         # 创建图表
         self.create_charts(None, tt_group, high_prob, low_prob, "9:45 时段预测")
     
-    def query_general(self):
+    def query_general(self, df):
         """通用查询 - 任意时段"""
         # 获取所有选择
         ft_class = self.ft_class_var.get()
@@ -454,35 +569,35 @@ class IntradayAdvisor:
         conditions = []
         
         if ft_class:
-            conditions.append(self.detailed_df['first_trade_class'] == ft_class)
+            conditions.append(df['first_trade_class'] == ft_class)
         if ft_change:
-            conditions.append(self.detailed_df['first_trade_change'] == ft_change)
+            conditions.append(df['first_trade_change'] == ft_change)
         if st_class:
-            conditions.append(self.detailed_df['second_trade_class'] == st_class)
+            conditions.append(df['second_trade_class'] == st_class)
         if st_change:
-            conditions.append(self.detailed_df['second_trade_change'] == st_change)
+            conditions.append(df['second_trade_change'] == st_change)
         if tt_class:
-            conditions.append(self.detailed_df['final_trade_class'] == tt_class)
+            conditions.append(df['final_trade_class'] == tt_class)
         if tt_change:
-            conditions.append(self.detailed_df['final_trade_change'] == tt_change)
+            conditions.append(df['final_trade_change'] == tt_change)
         if high_point:
             # 将中文转换为布尔值
             high_bool = (high_point == "创全日最高")
-            conditions.append(self.detailed_df['final_high_is_daily_high'] == high_bool)
+            conditions.append(df['final_high_is_daily_high'] == high_bool)
         if low_point:
             low_bool = (low_point == "创全日最低")
-            conditions.append(self.detailed_df['final_low_is_daily_low'] == low_bool)
+            conditions.append(df['final_low_is_daily_low'] == low_bool)
         
         if not conditions:
             messagebox.showwarning("警告", "请至少选择一个条件")
             return
         
         # 组合所有条件
-        combined_condition = pd.Series(True, index=self.detailed_df.index)
+        combined_condition = pd.Series(True, index=df.index)
         for cond in conditions:
             combined_condition &= cond
         
-        subset = self.detailed_df[combined_condition]
+        subset = df[combined_condition]
         
         if subset.empty:
             self.result_text.delete(1.0, tk.END)
@@ -490,7 +605,7 @@ class IntradayAdvisor:
             return
         
         total_count = len(subset)
-        total_days = len(self.detailed_df)
+        total_days = len(df)
         probability = total_count / total_days
         
         # 显示结果
@@ -594,6 +709,13 @@ class IntradayAdvisor:
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
 if __name__ == "__main__":
+    # 以 --profile-startup 分析启动时间与import耗时
+    handle_profile_flag(__file__)
     root = tk.Tk()
     app = IntradayAdvisor(root)
-    root.mainloop()
\ No newline at end of file
+    if '--live' in sys.argv:
+        from LiveIngest import default_ingest
+        app.attach_live(default_ingest())
+    root.mainloop()
+    if app.live_ingest is not None:
+        app.live_ingest.stop()
\ No newline at end of file
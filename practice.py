@@ -1,8 +1,8 @@
 import os
 import re
-import pandas as pd
-import numpy as np
-from datetime import datetime
+import argparse
+
+from Startup import mark, run_in_background, profiling, handle_profile_flag
 
 # 設定特徵權重與對應名稱（用於輸出）
 FEATURE_WEIGHTS = {
@@ -29,25 +29,26 @@ def validate_date_input(date_str):
         return False, f"找不到檔案：{target_file}"
     return True, target_file
 
-def load_data(target_date):
-    """讀取目標日與其他歷史數據"""
-    files = [f for f in os.listdir('.') if re.match(r'TX_\d{8}_1K\.csv', f)]
-    
-    # 讀取目標日數據
-    target_file = f"TX_{target_date}_1K.csv"
-    target_df = pd.read_csv(target_file)
-    target_features = extract_features(target_df)
-    
-    # 讀取歷史數據（排除目標日）
-    history = {}
-    for f in files:
-        date_str = f.split('_')[1]
-        if date_str == target_date:
-            continue
-        df = pd.read_csv(f)
-        history[date_str] = extract_features(df)
-        
-    return target_features, history
+def load_all_features(folder='.'):
+    """
+    讀取目錄中所有交易日並提取特徵
+    :return: dict, {日期: 特徵}
+    """
+    # DataLoader會載入pandas，延到實際讀取資料時才import
+    from DataLoader import load_day, list_days, day_path
+    return {date_str: extract_features(load_day(day_path(date_str, folder)))
+            for date_str in list_days(folder)}
+
+def load_data(target_date, all_features=None):
+    """
+    讀取目標日與其他歷史數據
+    :param all_features: dict, load_all_features的結果，None時重新讀取
+    """
+    if all_features is None:
+        all_features = load_all_features()
+    # 歷史數據排除目標日
+    history = {d: f for d, f in all_features.items() if d != target_date}
+    return all_features[target_date], history
 
 def extract_features(df):
     """從單日數據提取關鍵特徵（與原函數相同）"""
@@ -59,9 +60,10 @@ def extract_features(df):
     features['min_low'] = df['Low'].min()
     features['volatility'] = (features['max_high'] - features['min_low']) / features['open']
     
-    # 成交量特徵（修正時間範圍）
-    am_volume = df[df['Date'].str.contains(' 09:| 10:| 11:')]['Volume'].max()
-    pm_volume = df[df['Date'].str.contains(' 13:| 14:')]['Volume'].max()
+    # 成交量特徵（修正時間範圍，df由load_day載入，index為時間）
+    hours = df.index.hour
+    am_volume = df['Volume'][hours.isin([9, 10, 11])].max()
+    pm_volume = df['Volume'][hours.isin([13, 14])].max()
     features['volume_spike_am'] = am_volume / df['Volume'].median() if df['Volume'].median() !=0 else 0
     features['volume_spike_pm'] = pm_volume / df['Volume'].median() if df['Volume'].median() !=0 else 0
     
@@ -91,8 +93,70 @@ def calculate_similarity(target, candidate):
     
     return total_score, score_details  # 返回總分與細節
 
-def find_similar_days():
-    """主函數：輸出包含特徵得分的結果"""
+def load_shape_archive():
+    """讀取形狀比對用的每日路徑（Similarity會載入numpy/pandas，延到背景執行緒才import）"""
+    from Similarity import load_archive
+    return load_archive()
+
+def load_similarity_index():
+    """讀取並增量更新相似交易日索引（同樣延到背景執行緒才import）"""
+    from Similarity import load_archive
+    from SimilarityIndex import SimilarityIndex
+    index = SimilarityIndex()
+    index.update(load_archive())
+    return index
+
+def print_index_results(target_date, index, top=20):
+    """以索引向量（日內路徑PAA＋加權特徵）的距離比對並輸出結果"""
+    import time
+    started = time.perf_counter()
+    results, examined = index.search(target_date, top)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"\n目標交易日：{target_date}")
+    print(f"路徑與特徵綜合相似的歷史交易日（前{top}名，距離越小越相似）：")
+    for rank, (date, distance) in enumerate(results, 1):
+        print(f"第{rank}名｜{date}｜距離：{distance:.4f}")
+    method = 'LSH索引' if examined < len(index.dates) else '精確搜尋'
+    print(f"\n{method}比對 {examined}/{len(index.dates)} 日，耗時 {elapsed:.2f} ms")
+
+def print_shape_results(target_date, archive, top=20, band=None, volume_weighted=False):
+    """以日內路徑形狀（DTW）比對並輸出結果"""
+    import time
+    from Similarity import dtw_search, DEFAULT_BAND
+    started = time.perf_counter()
+    results, stats = dtw_search(archive, target_date, top, DEFAULT_BAND if band is None else band,
+                                volume_weighted)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"\n目標交易日：{target_date}")
+    weighting = '，依成交量加權' if volume_weighted else ''
+    print(f"路徑形狀相似的歷史交易日（前{top}名，DTW距離越小越相似{weighting}）：")
+    for rank, (date, distance) in enumerate(results, 1):
+        print(f"第{rank}名｜{date}｜DTW距離：{distance:.4f}")
+    print(f"\n候選 {stats['candidates']} 日，LB_Kim排除 {stats['pruned_kim']}，"
+          f"LB_Keogh排除 {stats['pruned_keogh']}，計算DTW {stats['dtw_computed']}，耗時 {elapsed:.0f} ms")
+
+def find_similar_days(shape=False, volume_weighted=False, band=None, index=False):
+    """
+    主函數：輸出包含特徵得分的結果
+    :param shape: bool, True時改以日內路徑形狀（DTW）比對
+    :param index: bool, True時改以SimilarityIndex查詢（交易日多時用LSH，否則精確搜尋）
+    :param volume_weighted: bool, 形狀比對時依目標日成交量加權
+    :param band: float, 形狀比對的Sakoe-Chiba帶寬（路徑長度比例），None為預設值
+    """
+    # 使用者輸入日期的同時，於背景讀取所有交易日的特徵
+    loaded = {}
+    if index:
+        load = load_similarity_index
+    else:
+        load = load_shape_archive if shape else load_all_features
+    loader = run_in_background(load,
+                               lambda result, error: loaded.update(result=result, error=error))
+    mark('first_window')
+    if profiling():
+        loader.join()
+        mark('ready')
+        return
+    
     while True:
         target_date = input("請輸入目標日期（YYYYMMDD，例如20250519）：").strip()
         is_valid, msg = validate_date_input(target_date)
@@ -100,7 +164,16 @@ def find_similar_days():
             break
         print(f"錯誤：{msg}\n")
     
-    target_feat, history = load_data(target_date)
+    loader.join()
+    if loaded['error'] is not None:
+        raise loaded['error']
+    if index:
+        print_index_results(target_date, loaded['result'])
+        return
+    if shape:
+        print_shape_results(target_date, loaded['result'], band=band, volume_weighted=volume_weighted)
+        return
+    target_feat, history = load_data(target_date, loaded['result'])
     
     similarities = []
     for date, features in history.items():
@@ -120,4 +193,13 @@ def find_similar_days():
             print(f"  - {FEATURE_NAMES[feature]}：{details[feature]:.2%}")
 
 if __name__ == "__main__":
-    find_similar_days()
\ No newline at end of file
+    # 以 --profile-startup 分析啟動時間與import耗時
+    handle_profile_flag(__file__)
+    parser = argparse.ArgumentParser(description='搜尋相似的歷史交易日')
+    parser.add_argument('--shape', action='store_true', help='以日內路徑形狀（DTW）比對，取代特徵比對')
+    parser.add_argument('--volume-weighted', action='store_true', help='形狀比對時依成交量加權')
+    parser.add_argument('--band', type=float, default=None, help='形狀比對的帶寬（路徑長度比例，預設0.1）')
+    parser.add_argument('--index', action='store_true',
+                        help='以相似度索引（路徑＋特徵）查詢，交易日多時使用LSH')
+    args = parser.parse_args()
+    find_similar_days(args.shape, args.volume_weighted, args.band, args.index)
\ No newline at end of file
@@ -1,277 +1,498 @@
+import os
 import sys
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+import pickle
+import hashlib
+import argparse
+from PyQt5.QtCore import Qt, QTimer, QFileSystemWatcher, pyqtSignal
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QTabWidget, QVBoxLayout, QWidget
+    QApplication, QMainWindow, QTabWidget, QVBoxLayout, QWidget, QLabel
 )
 
+from Startup import run_in_background, mark, profiling, handle_profile_flag
+
+# pandas/numpy/matplotlib由load_heavy_modules在背景线程载入，窗口先显示
+pd = np = Figure = FigureCanvas = None
+
+def load_heavy_modules():
+    """载入数据处理与绘图模块并设为本模块的全局名称"""
+    global pd, np, Figure, FigureCanvas
+    import pandas as pd
+    import numpy as np
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+
+SHEETS_TO_LOAD = [
+    "台指期換倉成本計算", "散戶多空力道", "微台多空力道",
+    "三大法人買賣金額", "大盤多空點位",
+    "期貨大額交易人未沖銷部位", "選擇權買賣權分計"
+]
+# 各标签页：(标题, 需要的工作表, 建立图表的方法, 画出新增行的方法)，图表在第一次切换到该页时才建立
+TAB_SPECS = [
+    ("換倉成本", ["台指期換倉成本計算"], 'build_roll_cost_figure', 'update_roll_cost'),
+    ("散戶/微台力道", ["散戶多空力道", "微台多空力道"], 'build_retail_force_figure', 'update_retail_force'),
+    ("三大法人", ["三大法人買賣金額"], 'build_institutional_figure', 'update_institutional'),
+    ("大盤點位", ["大盤多空點位"], 'build_market_level_figure', 'update_market_level'),
+    ("期貨部位", ["期貨大額交易人未沖銷部位"], 'build_future_position_figure', 'update_future_position'),
+    ("選擇權部位", ["選擇權買賣權分計"], 'build_option_position_figure', 'update_option_position'),
+]
+# 日期栏的格式：(提取用的正则, 日期格式)
+SLASH_DATE = (r'(\d{4}/\d{2}/\d{2})', '%Y/%m/%d')
+CJK_DATE = (r'(\d{4}年\d{2}月\d{2}日)', '%Y年%m月%d日')
+# 每个工作表的存储放在工作簿旁的目录，工作簿变动时只读入新增的行
+STORE_SUFFIX = '.store'
+STORE_META = '_workbook.pkl'
+# 工作簿被改写后等待多久（毫秒）再读取，避免读到存档到一半的文件
+RELOAD_DELAY_MS = 1000
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """工作簿内容的SHA-1"""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_pickle(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"存储文件损坏，重新读取: {path} ({e})")
+        return None
+
+def _write_pickle(data, path):
+    # Average会载入pandas，在后台线程写入时才import
+    from Average import atomic_path
+    with atomic_path(path) as temp_path:
+        with open(temp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def rows_digest(rows, digest=None):
+    """逐行累加的SHA-1，用来确认已存储的行没有被修改"""
+    digest = digest or hashlib.sha1()
+    for row in rows:
+        digest.update(repr(row).encode('utf-8'))
+    return digest
+
+def read_new_rows(file_path, sheets, stored):
+    """
+    以只读模式打开一次工作簿，取出每个工作表在已存储的行之后新增的行
+    已存储的行（以哈希比对）或表头被修改时该表整张重读
+    :param stored: dict, {工作表: (表头, 已存储行数, 已存储行的哈希)}
+    :return: dict, {工作表: (表头, 新增的行, 是否整张重读, 全部行的哈希)}
+    """
+    from openpyxl import load_workbook as open_workbook
+    workbook = open_workbook(file_path, read_only=True, data_only=True)
+    result = {}
+    try:
+        for sheet in sheets:
+            if sheet not in workbook.sheetnames:
+                print(f"警告: 工作表 '{sheet}' 未找到或读取失败")
+                continue
+            worksheet = workbook[sheet]
+            # 部分程序写出的工作簿记录的范围不正确，与pandas相同改为实际读到的范围
+            worksheet.reset_dimensions()
+            header = next(worksheet.iter_rows(max_row=1, values_only=True), None)
+            if header is None:
+                continue
+            header = tuple(name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header))
+            rows = [tuple(row[:len(header)]) for row in worksheet.iter_rows(min_row=2, values_only=True)]
+            # 去掉结尾的空白行
+            while rows and all(value is None for value in rows[-1]):
+                rows.pop()
+            old_header, count, old_digest = stored.get(sheet, (None, 0, None))
+            digest = rows_digest(rows[:count])
+            replaced = not (count and old_header == header and len(rows) >= count
+                            and digest.hexdigest() == old_digest)
+            if replaced:
+                digest, count = hashlib.sha1(), 0
+            new_rows = rows[count:]
+            result[sheet] = (header, new_rows, replaced, rows_digest(new_rows, digest).hexdigest())
+    finally:
+        workbook.close()
+    return result
+
+def update_store(file_path, sheets=SHEETS_TO_LOAD):
+    """
+    读取各工作表的存储，并只把工作簿中新增的行追加进去
+    工作簿的修改时间与大小没变时不打开工作簿；修改时间变了但内容哈希相同时只更新记录
+    :return: tuple, (dfs, changes)；dfs为 {工作表: DataFrame}，
+             changes为 {工作表: 新增行数}，整张重读的工作表为None
+    """
+    store_dir = file_path + STORE_SUFFIX
+    os.makedirs(store_dir, exist_ok=True)
+    meta_path = os.path.join(store_dir, STORE_META)
+    stat = os.stat(file_path)
+    meta = _read_pickle(meta_path)
+    stores = {sheet: _read_pickle(os.path.join(store_dir, f"{sheet}.pkl")) for sheet in sheets}
+    valid = (meta is not None and meta.get('requested') == list(sheets)
+             and all(stores[sheet] is not None for sheet in meta['sheets']))
+    changes = {}
+    if not (valid and (meta['mtime'], meta['size']) == (stat.st_mtime, stat.st_size)):
+        digest = file_digest(file_path)
+        if valid and meta['sha1'] == digest:
+            present = meta['sheets']
+        else:
+            stored = {sheet: (store['header'], store['rows'], store['digest'])
+                      for sheet, store in stores.items() if store is not None}
+            present = []
+            for sheet, (header, rows, replaced, rows_sha1) in read_new_rows(file_path, sheets, stored).items():
+                present.append(sheet)
+                store = stores.get(sheet)
+                if not replaced and not rows:
+                    changes[sheet] = 0
+                    continue
+                new_frame = pd.DataFrame(rows, columns=list(header))
+                if replaced:
+                    frame = new_frame
+                    changes[sheet] = None
+                else:
+                    frame = pd.concat([store['frame'], new_frame], ignore_index=True)
+                    changes[sheet] = len(rows)
+                stores[sheet] = {'header': header, 'rows': len(frame), 'digest': rows_sha1, 'frame': frame}
+                _write_pickle(stores[sheet], os.path.join(store_dir, f"{sheet}.pkl"))
+        meta = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': digest,
+                'requested': list(sheets), 'sheets': present}
+        _write_pickle(meta, meta_path)
+    return {sheet: stores[sheet]['frame'] for sheet in meta['sheets']}, changes
+
+def sheet_dates(column, date_format=SLASH_DATE):
+    """从日期栏提取日期，例如 '2025/05/19 (一)' 或 '2025年05月19日'"""
+    pattern, fmt = date_format
+    return pd.to_datetime(column.str.extract(pattern)[0], format=fmt)
+
+def signed_colors(values):
+    """正值红色、负值绿色"""
+    return np.where(np.asarray(values, dtype=float) >= 0, 'r', 'g')
+
+def draw_grouped_bars(ax, columns, labels, width, start, tick_labels):
+    """
+    以列序号为x画分组直方图，只画第start行之后的部分，并更新全部刻度
+    :param columns: list, 每组一个Series
+    """
+    count = len(columns[0])
+    x = np.arange(start, count)
+    for n, (values, label) in enumerate(zip(columns, labels)):
+        offset = (n - (len(columns) - 1) / 2) * width
+        ax.bar(x + offset, values.iloc[start:], width, label=label if start == 0 else '_nolegend_',
+               color=signed_colors(values.iloc[start:]))
+    ax.set_xticks(np.arange(count))
+    ax.set_xticklabels(tick_labels, rotation=45, ha='right')
+
 class ExcelVisualizer(QMainWindow):
-    def __init__(self, file_path):
+    # 背景读取完成后回到主线程：((dfs, changes), error)
+    workbook_loaded = pyqtSignal(object, object)
+    store_updated = pyqtSignal(object, object)
+
+    def __init__(self, file_path, prerender=False, watch=True):
+        """
+        :param prerender: bool, 第一个标签页显示后，在空闲时逐一建立其余标签页的图表
+        :param watch: bool, 工作簿被改写时自动读入新增的行并追加到图表
+        """
         super().__init__()
         self.setWindowTitle("台股期貨數據分析")
         self.setGeometry(100, 100, 1200, 800)
-        
-        # 读取 Excel 文件
-        self.dfs = self.read_excel(file_path)
-        
-        # 创建标签页
+        self.file_path = file_path
+        self.prerender = prerender
+        self.dfs = {}
+        self.pending_tabs = {}  # 尚未建立图表的标签页 → (建立方法, 更新方法)
+        self.views = {}         # 已建立的标签页 → 图表状态（artist与已画的行数）
+        self.reloading = False
+        self.reload_again = False
+
+        # 工作簿在背景读取，窗口先显示载入提示
         self.tabs = QTabWidget()
+        self.status_label = QLabel("正在读取工作簿...")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self.setCentralWidget(self.status_label)
+        self.workbook_loaded.connect(self.on_workbook_loaded)
+        self.store_updated.connect(self.on_store_updated)
+        run_in_background(self._load_in_background,
+                          lambda result, error: self.workbook_loaded.emit(result, error))
+
+        self.watcher = None
+        if watch:
+            self.reload_timer = QTimer(self)
+            self.reload_timer.setSingleShot(True)
+            self.reload_timer.timeout.connect(self.reload_workbook)
+            self.watcher = QFileSystemWatcher([file_path], self)
+            self.watcher.fileChanged.connect(lambda _: self.reload_timer.start(RELOAD_DELAY_MS))
+
+    def _load_in_background(self):
+        """（后台线程）载入pandas/matplotlib后读取工作簿存储"""
+        load_heavy_modules()
+        return update_store(self.file_path)
+
+    def on_workbook_loaded(self, result, error):
+        if error is not None:
+            self.status_label.setText(f"读取工作簿失败: {error}")
+            print(f"读取工作簿失败: {error}")
+            return
+        self.dfs = result[0]
         self.setCentralWidget(self.tabs)
-        
-        # 创建各工作表的可视化
-        self.create_roll_cost_tab()
-        self.create_retail_force_tab()
-        self.create_institutional_tab()
-        self.create_market_level_tab()
-        self.create_future_position_tab()
-        self.create_option_position_tab()
-
-    def read_excel(self, file_path):
-        """读取 Excel 文件中的所有工作表"""
-        sheets_to_load = [
-            "台指期換倉成本計算", "散戶多空力道", "微台多空力道",
-            "三大法人買賣金額", "大盤多空點位",
-            "期貨大額交易人未沖銷部位", "選擇權買賣權分計"
-        ]
-        
-        dfs = {}
-        for sheet in sheets_to_load:
-            try:
-                df = pd.read_excel(file_path, sheet_name=sheet)
-                dfs[sheet] = df
-            except:
-                print(f"警告: 工作表 '{sheet}' 未找到或读取失败")
-        return dfs
+        self.create_tabs()
+        self.tabs.currentChanged.connect(self.ensure_tab_built)
+        self.ensure_tab_built(self.tabs.currentIndex())
+        mark('ready')
+        if self.prerender:
+            # 等第一个标签页画完再开始，每次事件循环只建立一页，界面保持可操作
+            QTimer.singleShot(0, self.prerender_next)
+        elif profiling():
+            self.close()
 
-    def create_roll_cost_tab(self):
-        """创建换仓成本图表"""
-        if "台指期換倉成本計算" not in self.dfs:
+    def create_tabs(self):
+        """为每个有数据的工作表建立空白标签页，图表留待第一次切换过去时建立"""
+        for title, sheets, builder, updater in TAB_SPECS:
+            if not all(sheet in self.dfs for sheet in sheets):
+                continue
+            tab = QWidget()
+            tab.setLayout(QVBoxLayout())
+            tab.setProperty('sheets', sheets)
+            self.tabs.addTab(tab, title)
+            self.pending_tabs[tab] = (getattr(self, builder), getattr(self, updater))
+
+    def ensure_tab_built(self, index):
+        """建立该标签页的图表（已建立时不做任何事）"""
+        tab = self.tabs.widget(index)
+        methods = self.pending_tabs.pop(tab, None)
+        if methods is None:
             return
-            
-        df = self.dfs["台指期換倉成本計算"]
-        tab = QWidget()
-        layout = QVBoxLayout()
-        
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # 提取日期和成本数据
-        dates = pd.to_datetime(df["日期"].str.extract(r'(\d{4}/\d{2}/\d{2})')[0])
-        cost = df["成本"]
-        
-        # 绘制折线图
-        ax.plot(dates, cost, 'b-o', linewidth=2, markersize=6)
+        builder, updater = methods
+        view = {}
+        fig = builder(view)
+        sheets = tab.property('sheets')
+        updater(view, {sheet: 0 for sheet in sheets})
+        view['rows'] = {sheet: len(self.dfs[sheet]) for sheet in sheets}
+        view['updater'], view['builder'] = updater, builder
+        view['canvas'] = FigureCanvas(fig)
+        tab.layout().addWidget(view['canvas'])
+        self.views[tab] = view
+
+    def prerender_next(self):
+        """在空闲时建立下一个尚未建立的标签页"""
+        for index in range(self.tabs.count()):
+            if self.tabs.widget(index) in self.pending_tabs:
+                self.ensure_tab_built(index)
+                QTimer.singleShot(0, self.prerender_next)
+                return
+        mark('prerendered')
+        if profiling():
+            self.close()
+
+    # ---- 工作簿更新 ----
+    def reload_workbook(self):
+        """在背景读入工作簿新增的行"""
+        # 存档时常以新文件取代原文件，监视会失效，需重新加入
+        if self.file_path not in self.watcher.files() and os.path.exists(self.file_path):
+            self.watcher.addPath(self.file_path)
+        if self.reloading:
+            self.reload_again = True
+            return
+        self.reloading = True
+        run_in_background(lambda: update_store(self.file_path),
+                          lambda result, error: self.store_updated.emit(result, error))
+
+    def on_store_updated(self, result, error):
+        self.reloading = False
+        if error is not None:
+            print(f"更新工作簿数据失败: {error}")
+        else:
+            self.apply_changes(*result)
+        if self.reload_again:
+            self.reload_again = False
+            self.reload_workbook()
+
+    def apply_changes(self, dfs, changes):
+        """
+        新增的行追加到已建立的图表；整张重读的工作表所在的标签页重新建立
+        尚未建立的标签页之后建立时直接使用新数据
+        """
+        self.dfs = dfs
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            view = self.views.get(tab)
+            sheets = tab.property('sheets')
+            if view is None or not any(changes.get(sheet) != 0 for sheet in sheets if sheet in changes):
+                continue
+            if any(sheet in changes and changes[sheet] is None for sheet in sheets):
+                self.rebuild_tab(index)
+                continue
+            view['updater'](view, view['rows'])
+            view['rows'] = {sheet: len(self.dfs[sheet]) for sheet in sheets}
+            for ax in view['canvas'].figure.axes:
+                ax.relim()
+                ax.autoscale_view()
+            view['canvas'].draw_idle()
+
+    def rebuild_tab(self, index):
+        tab = self.tabs.widget(index)
+        view = self.views.pop(tab)
+        view['canvas'].setParent(None)
+        view['canvas'].deleteLater()
+        self.pending_tabs[tab] = (view['builder'], view['updater'])
+        if index == self.tabs.currentIndex():
+            self.ensure_tab_built(index)
+
+    # ---- 各标签页：build_*建立图表与固定的装饰，update_*只画出start之后的行 ----
+    def build_roll_cost_figure(self, view):
+        """创建换仓成本图表"""
+        fig = Figure(figsize=(12, 6))
+        view['ax'] = ax = fig.subplots()
         ax.set_title("台指期換倉成本趨勢", fontsize=14)
         ax.set_ylabel("成本", fontsize=12)
         ax.grid(True, linestyle='--', alpha=0.7)
-        fig.autofmt_xdate()
-        
-        canvas = FigureCanvas(fig)
-        layout.addWidget(canvas)
-        tab.setLayout(layout)
-        self.tabs.addTab(tab, "換倉成本")
-
-    def create_retail_force_tab(self):
-        """创建散户和微台多空力道图表"""
-        if "散戶多空力道" not in self.dfs or "微台多空力道" not in self.dfs:
+        return fig
+
+    def update_roll_cost(self, view, start):
+        df = self.dfs["台指期換倉成本計算"]
+        # 提取日期和成本数据
+        dates = sheet_dates(df["日期"])
+        cost = df["成本"]
+
+        # 绘制折线图（之后只更新同一条线的数据）
+        if 'line' in view:
+            view['line'].set_data(dates, cost)
             return
-            
-        retail_df = self.dfs["散戶多空力道"]
-        micro_df = self.dfs["微台多空力道"]
-        tab = QWidget()
-        layout = QVBoxLayout()
-        
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-        
-        # 提取散户数据
-        retail_dates = pd.to_datetime(retail_df["日期"].str.extract(r'(\d{4}/\d{2}/\d{2})')[0])
-        retail_force = retail_df["散戶多空力道"]
-        
-        # 提取微台数据
-        micro_dates = pd.to_datetime(micro_df["日期"].str.extract(r'(\d{4}/\d{2}/\d{2})')[0])
-        micro_force = micro_df["微台多空力道"]
-        
-        # 绘制散户力道直方图
-        colors_retail = ['r' if x >= 0 else 'g' for x in retail_force]
-        ax1.bar(retail_dates, retail_force, color=colors_retail, width=0.8)
+        view['line'], = view['ax'].plot(dates, cost, 'b-o', linewidth=2, markersize=6)
+        view['ax'].figure.autofmt_xdate()
+
+    def build_retail_force_figure(self, view):
+        """创建散户和微台多空力道图表"""
+        fig = Figure(figsize=(12, 10))
+        view['ax1'], view['ax2'] = ax1, ax2 = fig.subplots(2, 1)
         ax1.set_title("散戶多空力道", fontsize=12)
         ax1.grid(True, linestyle='--', alpha=0.7)
-        fig.autofmt_xdate()
-        
-        # 绘制微台力道直方图
-        colors_micro = ['r' if x >= 0 else 'g' for x in micro_force]
-        ax2.bar(micro_dates, micro_force, color=colors_micro, width=0.8)
         ax2.set_title("微台多空力道", fontsize=12)
         ax2.grid(True, linestyle='--', alpha=0.7)
-        fig.autofmt_xdate()
-        
         fig.suptitle("散戶與微台多空力道分析", fontsize=16)
-        plt.tight_layout(rect=[0, 0, 1, 0.96])
-        
-        canvas = FigureCanvas(fig)
-        layout.addWidget(canvas)
-        tab.setLayout(layout)
-        self.tabs.addTab(tab, "散戶/微台力道")
-
-    def create_institutional_tab(self):
+        return fig
+
+    def update_retail_force(self, view, start):
+        # 散户与微台力道直方图，只画新增的柱
+        for ax, sheet in ((view['ax1'], "散戶多空力道"), (view['ax2'], "微台多空力道")):
+            df = self.dfs[sheet].iloc[start[sheet]:]
+            if df.empty:
+                continue
+            force = df[sheet]
+            ax.bar(sheet_dates(df["日期"]), force, color=signed_colors(force), width=0.8)
+        if not any(start.values()):
+            view['ax1'].figure.autofmt_xdate()
+            view['ax1'].figure.tight_layout(rect=[0, 0, 1, 0.96])
+
+    def build_institutional_figure(self, view):
         """创建三大法人买卖金额图表"""
-        if "三大法人買賣金額" not in self.dfs:
-            return
-            
-        df = self.dfs["三大法人買賣金額"]
-        tab = QWidget()
-        layout = QVBoxLayout()
-        
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # 提取数据
-        dates = df["日期"].str.extract(r'(\d{4}年\d{2}月\d{2}日)')[0]
-        foreign = df["外資"]
-        domestic = df["內資"]
-        dealer = df["自營商(避險)"]
-        
-        # 设置位置和宽度
-        x = np.arange(len(dates))
-        width = 0.25
-        
-        # 绘制分组直方图
-        rects1 = ax.bar(x - width, foreign, width, label='外資', 
-                       color=['r' if val >= 0 else 'g' for val in foreign])
-        rects2 = ax.bar(x, domestic, width, label='內資',
-                       color=['r' if val >= 0 else 'g' for val in domestic])
-        rects3 = ax.bar(x + width, dealer, width, label='自營商(避險)',
-                       color=['r' if val >= 0 else 'g' for val in dealer])
-        
+        fig = Figure(figsize=(12, 6))
+        view['ax'] = ax = fig.subplots()
         ax.set_title("三大法人買賣金額", fontsize=14)
         ax.set_ylabel("金額", fontsize=12)
-        ax.set_xticks(x)
-        ax.set_xticklabels(dates, rotation=45, ha='right')
-        ax.legend()
         ax.grid(True, linestyle='--', alpha=0.7)
-        
-        canvas = FigureCanvas(fig)
-        layout.addWidget(canvas)
-        tab.setLayout(layout)
-        self.tabs.addTab(tab, "三大法人")
+        return fig
+
+    def update_institutional(self, view, start):
+        df = self.dfs["三大法人買賣金額"]
+        first = start["三大法人買賣金額"]
+        dates = df["日期"].str.extract(CJK_DATE[0])[0]
+        draw_grouped_bars(view['ax'], [df["外資"], df["內資"], df["自營商(避險)"]],
+                          ['外資', '內資', '自營商(避險)'], 0.25, first, dates)
+        if first == 0:
+            view['ax'].legend()
 
-    def create_market_level_tab(self):
+    def build_market_level_figure(self, view):
         """创建大盤多空點位图表"""
-        if "大盤多空點位" not in self.dfs:
-            return
-            
-        df = self.dfs["大盤多空點位"]
-        tab = QWidget()
-        layout = QVBoxLayout()
-        
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # 提取数据
-        dates = pd.to_datetime(df["日期"].str.extract(r'(\d{4}年\d{2}月\d{2}日)')[0])
-        levels = df["隔日多空點位"]
-        
-        # 绘制折线图
-        ax.plot(dates, levels, 'm-', linewidth=2)
-        ax.fill_between(dates, levels.min(), levels, alpha=0.2, color='purple')
+        fig = Figure(figsize=(12, 6))
+        view['ax'] = ax = fig.subplots()
         ax.set_title("大盤多空點位趨勢", fontsize=14)
         ax.set_ylabel("點位", fontsize=12)
         ax.grid(True, linestyle='--', alpha=0.7)
-        fig.autofmt_xdate()
-        
-        canvas = FigureCanvas(fig)
-        layout.addWidget(canvas)
-        tab.setLayout(layout)
-        self.tabs.addTab(tab, "大盤點位")
-
-    def create_future_position_tab(self):
+        return fig
+
+    def update_market_level(self, view, start):
+        df = self.dfs["大盤多空點位"]
+        dates = sheet_dates(df["日期"], CJK_DATE)
+        levels = df["隔日多空點位"]
+        ax = view['ax']
+        first = start["大盤多空點位"]
+        if 'line' not in view:
+            view['line'], = ax.plot(dates, levels, 'm-', linewidth=2)
+            ax.figure.autofmt_xdate()
+        else:
+            view['line'].set_data(dates, levels)
+        # 填色以最低点为底；新数据没有创新低时只补上新增的一段，否则整段重画
+        if 'baseline' in view and levels.min() >= view['baseline']:
+            first = max(first - 1, 0)
+        else:
+            for fill in view.get('fills', []):
+                fill.remove()
+            view['fills'], view['baseline'], first = [], levels.min(), 0
+        if first < len(df) - 1 or first == 0:
+            view['fills'].append(ax.fill_between(dates.iloc[first:], view['baseline'], levels.iloc[first:],
+                                                 alpha=0.2, color='purple'))
+
+    def build_future_position_figure(self, view):
         """创建期貨大額交易人部位图表"""
-        if "期貨大額交易人未沖銷部位" not in self.dfs:
+        fig = Figure(figsize=(12, 6))
+        view['ax'] = ax = fig.subplots()
+        # 检查列是否存在
+        df = self.dfs["期貨大額交易人未沖銷部位"]
+        if "九大多空淨額增減" not in df.columns or "外資交易多空淨額" not in df.columns:
+            ax.text(0.5, 0.5, "缺少所需數據列", ha='center', va='center', fontsize=16)
+            view['missing'] = True
+            return fig
+        ax.set_title("期貨大額交易人未沖銷部位", fontsize=14)
+        ax.set_ylabel("部位", fontsize=12)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        return fig
+
+    def update_future_position(self, view, start):
+        if view.get('missing'):
             return
-            
         df = self.dfs["期貨大額交易人未沖銷部位"]
-        tab = QWidget()
-        layout = QVBoxLayout()
-        
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # 提取数据
-        dates = pd.to_datetime(df["日期"].str.extract(r'(\d{4}/\d{2}/\d{2})')[0])
-        
+        first = start["期貨大額交易人未沖銷部位"]
+        dates = sheet_dates(df["日期"])
+        draw_grouped_bars(view['ax'], [df["九大多空淨額增減"], df["外資交易多空淨額"]],
+                          ['九大多空淨額增減', '外資交易多空淨額'], 0.35, first,
+                          dates.dt.strftime('%Y-%m-%d'))
+        if first == 0:
+            view['ax'].legend()
+
+    def build_option_position_figure(self, view):
+        """创建选择权买卖权分计图表"""
+        fig = Figure(figsize=(12, 6))
+        view['ax'] = ax = fig.subplots()
         # 检查列是否存在
-        if "九大多空淨額增減" in df.columns and "外資交易多空淨額" in df.columns:
-            top9 = df["九大多空淨額增減"]
-            foreign = df["外資交易多空淨額"]
-            
-            # 设置位置和宽度
-            x = np.arange(len(dates))
-            width = 0.35
-            
-            # 绘制分组直方图
-            rects1 = ax.bar(x - width/2, top9, width, label='九大多空淨額增減',
-                           color=['r' if val >= 0 else 'g' for val in top9])
-            rects2 = ax.bar(x + width/2, foreign, width, label='外資交易多空淨額',
-                           color=['r' if val >= 0 else 'g' for val in foreign])
-            
-            ax.set_title("期貨大額交易人未沖銷部位", fontsize=14)
-            ax.set_ylabel("部位", fontsize=12)
-            ax.set_xticks(x)
-            ax.set_xticklabels(dates.dt.strftime('%Y-%m-%d'), rotation=45, ha='right')
-            ax.legend()
-            ax.grid(True, linestyle='--', alpha=0.7)
-        else:
+        df = self.dfs["選擇權買賣權分計"]
+        if "外資" not in df.columns or "自營商" not in df.columns:
             ax.text(0.5, 0.5, "缺少所需數據列", ha='center', va='center', fontsize=16)
-        
-        canvas = FigureCanvas(fig)
-        layout.addWidget(canvas)
-        tab.setLayout(layout)
-        self.tabs.addTab(tab, "期貨部位")
+            view['missing'] = True
+            return fig
+        ax.set_title("選擇權買賣權分計", fontsize=14)
+        ax.set_ylabel("金額", fontsize=12)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        return fig
 
-    def create_option_position_tab(self):
-        """创建选择权买卖权分计图表"""
-        if "選擇權買賣權分計" not in self.dfs:
+    def update_option_position(self, view, start):
+        if view.get('missing'):
             return
-            
         df = self.dfs["選擇權買賣權分計"]
-        tab = QWidget()
-        layout = QVBoxLayout()
-        
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # 提取数据
-        dates = pd.to_datetime(df["日期"].str.extract(r'(\d{4}/\d{2}/\d{2})')[0])
-        
-        # 检查列是否存在
-        if "外資" in df.columns and "自營商" in df.columns:
-            foreign = df["外資"]
-            dealer = df["自營商"]
-            
-            # 设置位置和宽度
-            x = np.arange(len(dates))
-            width = 0.35
-            
-            # 绘制分组直方图
-            rects1 = ax.bar(x - width/2, foreign, width, label='外資',
-                           color=['r' if val >= 0 else 'g' for val in foreign])
-            rects2 = ax.bar(x + width/2, dealer, width, label='自營商',
-                           color=['r' if val >= 0 else 'g' for val in dealer])
-            
-            ax.set_title("選擇權買賣權分計", fontsize=14)
-            ax.set_ylabel("金額", fontsize=12)
-            ax.set_xticks(x)
-            ax.set_xticklabels(dates.dt.strftime('%Y-%m-%d'), rotation=45, ha='right')
-            ax.legend()
-            ax.grid(True, linestyle='--', alpha=0.7)
-        else:
-            ax.text(0.5, 0.5, "缺少所需數據列", ha='center', va='center', fontsize=16)
-        
-        canvas = FigureCanvas(fig)
-        layout.addWidget(canvas)
-        tab.setLayout(layout)
-        self.tabs.addTab(tab, "選擇權部位")
+        first = start["選擇權買賣權分計"]
+        dates = sheet_dates(df["日期"])
+        draw_grouped_bars(view['ax'], [df["外資"], df["自營商"]], ['外資', '自營商'], 0.35, first,
+                          dates.dt.strftime('%Y-%m-%d'))
+        if first == 0:
+            view['ax'].legend()
 
 if __name__ == "__main__":
+    # 以 --profile-startup 分析启动时间与import耗时
+    handle_profile_flag(__file__)
+    parser = argparse.ArgumentParser(description='台股期货筹码数据可视化')
+    parser.add_argument('file_path', nargs='?', default="everyday_ver2.xlsx", help='工作簿路径')
+    parser.add_argument('--prerender', action='store_true', help='显示第一页后在空闲时建立其余标签页')
+    parser.add_argument('--no-watch', action='store_true', help='不监视工作簿的变动')
+    args = parser.parse_args()
     app = QApplication(sys.argv)
-    file_path = "everyday_ver2.xlsx"  # 更改为实际文件路径
-    window = ExcelVisualizer(file_path)
+    window = ExcelVisualizer(args.file_path, args.prerender, watch=not args.no_watch)
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    mark('first_window')
+    sys.exit(app.exec_())
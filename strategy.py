@@ -3,6 +3,23 @@ import pandas as pd
 from datetime import datetime, timedelta, time
 import numpy as np
 
+from DataLoader import load_day
+
+# 單K棒條件配置
+INTRADAY_CONFIG = [
+    {'name': 'long_red_candle', 'params': {'min_body': 15}},
+    {'name': 'volume_spike', 'params': {'window': 5, 'multiplier': 2.5}},
+    {'name': 'breakout', 'params': {'lookback': 30}}
+]
+
+# 整日條件配置（含時段分析條件）
+DAILY_CONFIG = [
+    {'name': 'day_high_volatility', 'params': {'min_range': 200}},
+    {'name': 'day_strong_trend', 'params': {'min_body_ratio': 0.6}},
+    {'name': 'day_reversal', 'params': {'min_body_ratio': 0.5}},
+    {'name': 'day_time_segment_ratio'}
+]
+
 # 模組1: 資料載入函數 (保持不變)
 def load_data(start_date, end_date, data_folder='.'):
     """
@@ -23,9 +40,9 @@ def load_data(start_date, end_date, data_folder='.'):
         
         if os.path.exists(filepath):
             try:
-                df = pd.read_csv(filepath)
-                # 確保DateTime是時間格式
-                df['DateTime'] = pd.to_datetime(df['Date'])
+                # 統一欄位格式，Date已解析為時間
+                df = load_day(filepath, index=False)
+                df['DateTime'] = df['Date']
                 data_dict[date_str] = df
                 print(f"已載入: {filename}")
             except Exception as e:
@@ -302,7 +319,8 @@ def scan_conditions(data_dict, intraday_config=None, daily_config=None):
                 
                 for config in intraday_config:
                     condition_func = getattr(ConditionChecker, config['name'])
-                    kwargs = config.get('params', {})
+                    # 複製一份，避免把df寫回共用的條件配置
+                    kwargs = dict(config.get('params', {}))
                     
                     # 根據條件需求傳遞不同參數
                     if 'df' in condition_func.__code__.co_varnames:
@@ -522,19 +540,8 @@ def main():
     end_date = str(today_date)
     
     # 條件配置
-    intraday_config = [
-        {'name': 'long_red_candle', 'params': {'min_body': 15}},
-        {'name': 'volume_spike', 'params': {'window': 5, 'multiplier': 2.5}},
-        {'name': 'breakout', 'params': {'lookback': 30}}
-    ]
-    
-    # 新增時段分析條件
-    daily_config = [
-        {'name': 'day_high_volatility', 'params': {'min_range': 200}},
-        {'name': 'day_strong_trend', 'params': {'min_body_ratio': 0.6}},
-        {'name': 'day_reversal', 'params': {'min_body_ratio': 0.5}},
-        {'name': 'day_time_segment_ratio'}
-    ]
+    intraday_config = INTRADAY_CONFIG
+    daily_config = DAILY_CONFIG
     
     # 執行流程
     print("開始載入資料...")